@@ -1,11 +1,17 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
-from pymongo import GEOSPHERE
+
+from app.db.indexes import ensure_indexes
+from app.db.memory import MemoryClient
 
 # MongoDB connection settings
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 MONGODB_DB = os.getenv("MONGODB_DB", "railway_geofence")
 
+# Storage backend: "mongodb" or "memory" (in-process, nothing persisted)
+DB_BACKEND = os.getenv("DB_BACKEND", "mongodb")
+DB_BACKENDS = ("mongodb", "memory")
+
 # Global database connection
 client = None
 db = None
@@ -14,22 +20,24 @@ async def connect_to_mongo():
     """Connect to MongoDB"""
     global client, db
     
-    client = AsyncIOMotorClient(MONGODB_URL)
-    db = client[MONGODB_DB]
+    if DB_BACKEND not in DB_BACKENDS:
+        raise ValueError(f"Unknown DB_BACKEND {DB_BACKEND!r}, expected one of {', '.join(DB_BACKENDS)}")
     
-    # Create geospatial indexes
-    await db.stations.create_index([("location", GEOSPHERE)])
-    await db.trains.create_index([("location", GEOSPHERE)])
-    await db.objects.create_index([("location", GEOSPHERE)])
+    if DB_BACKEND == "memory":
+        # Reconnecting keeps the data, which lives as long as the process
+        if not isinstance(client, MemoryClient):
+            client = MemoryClient()
+    else:
+        client = AsyncIOMotorClient(MONGODB_URL)
+    db = client[MONGODB_DB]
     
-    # Create other indexes
-    await db.trains.create_index("number", unique=True)
-    await db.stations.create_index("code", unique=True)
-    await db.objects.create_index("id", unique=True)
-    await db.users.create_index("email", unique=True)
-    await db.users.create_index("phone", unique=True)
+    # Create every index the queries need
+    await ensure_indexes(db)
     
-    print(f"Connected to MongoDB at {MONGODB_URL}, database: {MONGODB_DB}")
+    if DB_BACKEND == "memory":
+        print(f"Using in-memory database: {MONGODB_DB}")
+    else:
+        print(f"Connected to MongoDB at {MONGODB_URL}, database: {MONGODB_DB}")
     
     return db
 
@@ -0,0 +1,234 @@
+"""
+Generate a large synthetic fleet for load and scale testing
+
+Stations, trains, users and objects are spread across India's bounding
+box and streamed into MongoDB with batched insert_many calls, so memory
+stays bounded by the batch size. The same --seed always produces the same
+dataset.
+
+    python -m app.db.generate --stations 5000 --trains 20000 --users 1000000 --objects 2000000 --seed 42
+
+Restart the API afterwards so it loads the new stations into its index.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+# Generate a synthetic fleet at startup (skipped if one already exists)
+GENERATE_ON_STARTUP = os.getenv("GENERATE_ON_STARTUP", "false").lower() == "true"
+GENERATE_STATIONS = int(os.getenv("GENERATE_STATIONS", 2000))
+GENERATE_TRAINS = int(os.getenv("GENERATE_TRAINS", 10000))
+GENERATE_USERS = int(os.getenv("GENERATE_USERS", 100000))
+GENERATE_OBJECTS = int(os.getenv("GENERATE_OBJECTS", 200000))
+GENERATE_SEED = int(os.getenv("GENERATE_SEED", 42))
+GENERATE_BATCH_SIZE = int(os.getenv("GENERATE_BATCH_SIZE", 5000))
+
+# India's bounding box: [min_lon, min_lat], [max_lon, max_lat]
+INDIA_BOUNDS = ([68.1, 6.5], [97.4, 35.5])
+
+# Coach classes with the range of coaches a train carries of each
+COACH_CLASSES = [("H", 0, 1), ("A", 1, 3), ("B", 2, 6), ("S", 4, 12), ("GS", 1, 3)]
+
+TRAIN_TYPES = ["Rajdhani", "Shatabdi", "Duronto", "Garib Rath", "Superfast", "Jan Shatabdi", "Intercity", "Mail"]
+OBJECT_TYPES = ["Luggage", "Laptop Bag", "Suitcase", "Backpack", "Camera Bag", "Travel Bag", "Briefcase"]
+FIRST_NAMES = ["Rahul", "Priya", "Amit", "Sneha", "Vikram", "Anjali", "Arjun", "Kavya", "Rohan", "Meera"]
+LAST_NAMES = ["Sharma", "Patel", "Kumar", "Gupta", "Singh", "Reddy", "Iyer", "Das", "Nair", "Joshi"]
+
+# Key formats keep generated documents clear of the hand-written seed data
+def station_code(i):
+    return f"G{i:05d}"
+
+def train_number(i):
+    return f"T{i:06d}"
+
+def object_id(i):
+    return f"GOBJ{i:08d}"
+
+def _point(coordinates):
+    return {"type": "Point", "coordinates": [round(coordinates[0], 6), round(coordinates[1], 6)]}
+
+
+class SyntheticFleet:
+    """
+    A reproducible synthetic dataset, generated one batch at a time
+
+    Only small per-entity arrays are kept (coordinates, coach lists and
+    each user's name, train and coach) so that users and objects can
+    reference each other and trains consistently without holding any
+    documents in memory. Object i belongs to user i % users and travels in
+    that user's coach.
+    """
+
+    def __init__(self, stations, trains, users, objects, seed=GENERATE_SEED):
+        self.stations = stations
+        self.trains = max(trains, 1) if users or objects else trains
+        self.users = max(users, 1) if objects else users
+        self.objects = objects
+
+        # Independent streams per collection, so each one is reproducible alone
+        streams = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(3)]
+        plan, self._train_rng, self._object_rng = streams
+
+        low, high = INDIA_BOUNDS
+        self.station_coordinates = plan.uniform(low, high, size=(max(stations, 1), 2))
+
+        # Trains start near a random station
+        starts = plan.integers(len(self.station_coordinates), size=self.trains)
+        self.train_coordinates = np.clip(
+            self.station_coordinates[starts] + plan.normal(0, 0.05, size=(self.trains, 2)), low, high
+        )
+        self.train_coaches = [
+            [f"{prefix}{n}" for prefix, least, most in COACH_CLASSES for n in range(1, plan.integers(least, most + 1) + 1)]
+            for _ in range(self.trains)
+        ]
+
+        self.user_trains = plan.integers(self.trains, size=self.users) if self.trains else np.zeros(0, dtype=int)
+        self.user_coaches = (plan.random(self.users) * [len(self.train_coaches[t]) for t in self.user_trains]).astype(int)
+
+        # Objects name their owner, so names are planned rather than drawn per batch
+        self.user_names = plan.integers(len(FIRST_NAMES) * len(LAST_NAMES), size=self.users)
+
+    def user_name(self, i):
+        first, last = divmod(int(self.user_names[i]), len(LAST_NAMES))
+        return f"{FIRST_NAMES[first]} {LAST_NAMES[last]}"
+
+    def _batches(self, count, batch_size, build):
+        for start in range(0, count, batch_size):
+            yield build(range(start, min(start + batch_size, count)))
+
+    def station_batches(self, batch_size=GENERATE_BATCH_SIZE):
+        def build(indices):
+            return [
+                {
+                    "name": f"Station {station_code(i)}",
+                    "code": station_code(i),
+                    "location": _point(self.station_coordinates[i])
+                }
+                for i in indices
+            ]
+        return self._batches(self.stations, batch_size, build)
+
+    def train_batches(self, batch_size=GENERATE_BATCH_SIZE):
+        rng = self._train_rng
+
+        def build(indices):
+            types = rng.integers(len(TRAIN_TYPES), size=len(indices))
+            speeds = rng.uniform(40, 130, size=len(indices))
+            directions = rng.uniform(0, 360, size=len(indices))
+            return [
+                {
+                    "name": f"{TRAIN_TYPES[kind]} Express {train_number(i)}",
+                    "number": train_number(i),
+                    "location": _point(self.train_coordinates[i]),
+                    "speed": round(float(speed), 1),
+                    "direction": round(float(direction), 1),
+                    "coaches": [{"id": coach, "geofenceRadius": 0.05} for coach in self.train_coaches[i]]
+                }
+                for i, kind, speed, direction in zip(indices, types, speeds, directions)
+            ]
+        return self._batches(self.trains, batch_size, build)
+
+    def user_batches(self, batch_size=GENERATE_BATCH_SIZE):
+        def build(indices):
+            users = []
+            for i in indices:
+                train = self.user_trains[i]
+                users.append({
+                    "name": self.user_name(i),
+                    "phone": f"+91{7000000000 + i}",
+                    "email": f"user{i}@example.com",
+                    "currentTrain": train_number(train),
+                    "currentCoach": self.train_coaches[train][self.user_coaches[i]],
+                    "registeredObjects": [object_id(j) for j in range(i, self.objects, self.users)]
+                })
+            return users
+        return self._batches(self.users, batch_size, build)
+
+    def object_batches(self, batch_size=GENERATE_BATCH_SIZE):
+        rng = self._object_rng
+
+        def build(indices):
+            types = rng.integers(len(OBJECT_TYPES), size=len(indices))
+            objects = []
+            for i, kind in zip(indices, types):
+                owner = i % self.users
+                train = self.user_trains[owner]
+                objects.append({
+                    "id": object_id(i),
+                    "type": OBJECT_TYPES[kind],
+                    # Owners are referred to by name, as in the seed data
+                    "ownerId": self.user_name(owner),
+                    "trainNumber": train_number(train),
+                    "coachId": self.train_coaches[train][self.user_coaches[owner]],
+                    "location": _point(self.train_coordinates[train])
+                })
+            return objects
+        return self._batches(self.objects, batch_size, build)
+
+
+async def _insert(collection, batches):
+    inserted = 0
+    for batch in batches:
+        await collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+    return inserted
+
+async def generate_dataset(db, stations=GENERATE_STATIONS, trains=GENERATE_TRAINS, users=GENERATE_USERS,
+                           objects=GENERATE_OBJECTS, seed=GENERATE_SEED, batch_size=GENERATE_BATCH_SIZE):
+    """Stream a synthetic fleet into the database, returns the inserted counts"""
+    fleet = SyntheticFleet(stations, trains, users, objects, seed)
+    started = time.perf_counter()
+
+    counts = {}
+    for name, batches in [
+        ("stations", fleet.station_batches(batch_size)),
+        ("trains", fleet.train_batches(batch_size)),
+        ("users", fleet.user_batches(batch_size)),
+        ("objects", fleet.object_batches(batch_size)),
+    ]:
+        counts[name] = await _insert(db[name], batches)
+        print(f"Generated {counts[name]} {name}")
+
+    elapsed = time.perf_counter() - started
+    print(f"Generated {sum(counts.values())} documents in {elapsed:.1f}s")
+    return counts
+
+async def generate_on_startup(db):
+    """Generate the configured fleet unless a generated fleet already exists"""
+    if await db.trains.find_one({"number": train_number(0)}):
+        return None
+    return await generate_dataset(
+        db, GENERATE_STATIONS, GENERATE_TRAINS, GENERATE_USERS, GENERATE_OBJECTS, GENERATE_SEED, GENERATE_BATCH_SIZE
+    )
+
+async def main():
+    from app.db.connection import connect_to_mongo, close_mongo_connection
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stations", type=int, default=GENERATE_STATIONS)
+    parser.add_argument("--trains", type=int, default=GENERATE_TRAINS)
+    parser.add_argument("--users", type=int, default=GENERATE_USERS)
+    parser.add_argument("--objects", type=int, default=GENERATE_OBJECTS)
+    parser.add_argument("--seed", type=int, default=GENERATE_SEED)
+    parser.add_argument("--batch-size", type=int, default=GENERATE_BATCH_SIZE)
+    parser.add_argument("--drop", action="store_true", help="Delete previously generated documents first")
+    args = parser.parse_args()
+
+    db = await connect_to_mongo()
+    try:
+        if args.drop:
+            await asyncio.gather(
+                db.stations.delete_many({"code": {"$regex": "^G[0-9]{5}$"}}),
+                db.trains.delete_many({"number": {"$regex": "^T[0-9]{6}$"}}),
+                db.users.delete_many({"email": {"$regex": "^user[0-9]+@example\\.com$"}}),
+                db.objects.delete_many({"id": {"$regex": "^GOBJ[0-9]{8}$"}})
+            )
+        await generate_dataset(db, args.stations, args.trains, args.users, args.objects, args.seed, args.batch_size)
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
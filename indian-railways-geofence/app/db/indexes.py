@@ -0,0 +1,176 @@
+import asyncio
+import os
+from datetime import datetime
+
+from pymongo import IndexModel, ASCENDING, DESCENDING, GEOSPHERE
+
+# Explain the hot queries at startup and warn about collection scans
+INDEX_REPORT_ON_STARTUP = os.getenv("INDEX_REPORT_ON_STARTUP", "true").lower() == "true"
+
+# Resolved alerts are deleted this many days after being resolved (0 keeps them).
+# The archiver moves them to disk well before that, so this is a backstop.
+# ensure_indexes applies a changed value to an existing database with collMod.
+ALERT_RESOLVED_TTL_DAYS = float(os.getenv("ALERT_RESOLVED_TTL_DAYS", 30))
+
+# Partial indexes only cover open alerts, which is what the hot paths query
+UNRESOLVED = {"resolved": False}
+RESOLVED = {"resolved": True}
+
+# Every index the application's queries rely on, by collection
+INDEXES = {
+    "stations": [
+        IndexModel([("location", GEOSPHERE)]),
+        IndexModel([("code", ASCENDING)], unique=True),
+    ],
+    "trains": [
+        IndexModel([("location", GEOSPHERE)]),
+        IndexModel([("number", ASCENDING)], unique=True),
+    ],
+    "objects": [
+        IndexModel([("location", GEOSPHERE)]),
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Objects moved with their train, batch theft checks
+        IndexModel([("trainNumber", ASCENDING)]),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("phone", ASCENDING)], unique=True),
+        # Owner lookups by name
+        IndexModel([("name", ASCENDING)]),
+    ],
+    "alerts": [
+        # Recent alerts, stats windows and keyset pages on (timestamp, _id)
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("trainNumber", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        # Open alert lookups and resolves
+        IndexModel(
+            [("type", ASCENDING), ("trainNumber", ASCENDING), ("stationCode", ASCENDING), ("resolved", ASCENDING)],
+            name="open_station_alerts",
+            partialFilterExpression=UNRESOLVED
+        ),
+        IndexModel(
+            [("type", ASCENDING), ("objectId", ASCENDING), ("resolved", ASCENDING)],
+            name="open_theft_alerts",
+            partialFilterExpression=UNRESOLVED
+        ),
+        IndexModel(
+            [("resolved", ASCENDING)],
+            name="open_alerts",
+            partialFilterExpression=UNRESOLVED
+        ),
+        # Archiving and expiry of resolved alerts
+        IndexModel(
+            [("resolvedAt", ASCENDING)],
+            name="resolved_alerts",
+            partialFilterExpression=RESOLVED,
+            **({"expireAfterSeconds": int(ALERT_RESOLVED_TTL_DAYS * 86400)} if ALERT_RESOLVED_TTL_DAYS > 0 else {})
+        ),
+    ],
+    "position_history": [
+        # One bucket per entity and time window, read back in time order
+        IndexModel([("kind", ASCENDING), ("entityId", ASCENDING), ("start", ASCENDING)], unique=True),
+        # Closed buckets waiting for their simplified levels
+        IndexModel([("start", ASCENDING)], name="uncompacted_buckets", partialFilterExpression={"compacted": False}),
+    ],
+    "alert_rollups": [
+        IndexModel(
+            [("hour", ASCENDING), ("type", ASCENDING), ("trainNumber", ASCENDING),
+             ("stationCode", ASCENDING), ("resolved", ASCENDING)],
+            unique=True
+        ),
+    ],
+}
+
+# Representative hot queries: (name, collection, filter, sort)
+HOT_QUERIES = [
+    ("open station alerts for a train", "alerts",
+     {"type": "station_proximity", "trainNumber": "12301", "stationCode": {"$in": ["NDLS"]}, "resolved": False}, None),
+    ("open theft alerts for objects", "alerts",
+     {"type": "theft", "objectId": {"$in": ["OBJ001"]}, "resolved": False}, None),
+    ("all open alerts", "alerts", {"resolved": False}, None),
+    ("recent alerts", "alerts", {"timestamp": {"$gte": datetime(2000, 1, 1)}}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ("recent alerts for a train", "alerts", {"trainNumber": "12301"}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ("archivable resolved alerts", "alerts",
+     {"resolved": True, "resolvedAt": {"$lt": datetime(2000, 1, 1)}}, None),
+    ("objects on a train", "objects", {"trainNumber": "12301"}, None),
+    ("object by id", "objects", {"id": "OBJ001"}, None),
+    ("owner by name", "users", {"name": "Rahul Sharma"}, None),
+    ("train by number", "trains", {"number": "12301"}, None),
+    ("station by code", "stations", {"code": "NDLS"}, None),
+    ("track of a train", "position_history",
+     {"kind": "train", "entityId": "12301", "start": {"$gte": datetime(2000, 1, 1), "$lte": datetime(2000, 1, 2)}},
+     [("start", ASCENDING)]),
+    ("rollups since an hour", "alert_rollups", {"hour": {"$gte": datetime(2000, 1, 1)}}, None),
+]
+
+async def _sync_ttls(db, collection, models):
+    """
+    Bring the expiry of existing TTL indexes in line with their models
+
+    create_indexes rejects an index whose options differ from the existing
+    one of the same name, so a changed expireAfterSeconds is applied with
+    collMod first. collMod cannot remove a TTL, so an index that should no
+    longer expire is dropped and created again.
+    """
+    existing = await db[collection].index_information()
+
+    for model in models:
+        name = model.document["name"]
+        if name not in existing:
+            continue
+
+        ttl = model.document.get("expireAfterSeconds")
+        if existing[name].get("expireAfterSeconds") == ttl:
+            continue
+
+        if ttl is None:
+            await db[collection].drop_index(name)
+        else:
+            await db.command("collMod", collection, index={"name": name, "expireAfterSeconds": ttl})
+        print(f"Changed expiry of index {name} on {collection} to {ttl} seconds")
+
+async def _ensure_collection_indexes(db, collection, models):
+    await _sync_ttls(db, collection, models)
+    await db[collection].create_indexes(models)
+
+async def ensure_indexes(db):
+    """Create every declared index, one collection per concurrent request"""
+    await asyncio.gather(*(
+        _ensure_collection_indexes(db, collection, models)
+        for collection, models in INDEXES.items()
+    ))
+
+def _has_collection_scan(plan):
+    """Check if a query plan (or any of its inputs) is a collection scan"""
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collection_scan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collection_scan(value) for value in plan)
+    return False
+
+async def _explain(db, collection, query, sort):
+    cursor = db[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    return await cursor.explain()
+
+async def report_collection_scans(db):
+    """
+    Explain every hot query and report the ones that scan a whole collection
+
+    Returns the names of the offending queries.
+    """
+    plans = await asyncio.gather(*(
+        _explain(db, collection, query, sort)
+        for _, collection, query, sort in HOT_QUERIES
+    ))
+
+    scans = []
+    for (name, collection, _, _), plan in zip(HOT_QUERIES, plans):
+        if _has_collection_scan(plan.get("queryPlanner", {}).get("winningPlan")):
+            scans.append(name)
+            print(f"WARNING: hot query '{name}' on {collection} uses a collection scan")
+
+    return scans
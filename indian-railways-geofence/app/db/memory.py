@@ -0,0 +1,1034 @@
+"""
+In-process storage backend with the subset of the Motor API the app uses
+
+Selected with DB_BACKEND=memory. Routes and services keep using the same
+db handle (db.trains.find(...), bulk_write, aggregate, ...), so the whole
+application runs without a MongoDB server, which makes the API tests and
+benchmarks run in milliseconds.
+
+Documents live in a dict keyed by _id. The indexes created through
+create_indexes are maintained as hash maps for equality and $in lookups
+and as a lon/lat grid for 2dsphere queries; unique indexes are enforced.
+Other queries scan the collection. Data is not persisted and TTL indexes
+do not expire documents.
+"""
+import math
+import re
+from datetime import datetime, timezone
+from itertools import product
+
+from bson import ObjectId
+from pymongo import UpdateOne, UpdateMany, InsertOne, DeleteOne, DeleteMany, ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError, BulkWriteError, OperationFailure
+from pymongo.results import InsertOneResult, InsertManyResult, UpdateResult, DeleteResult, BulkWriteResult
+
+from app.utils.distance import haversine_distance, EARTH_RADIUS_KM
+
+# Size of a geo index grid cell in degrees
+GEO_CELL_SIZE = 0.25
+
+# Largest number of key combinations an index lookup expands $in into
+MAX_INDEX_LOOKUPS = 1000
+
+_MISSING = object()
+
+
+def _normalize(value):
+    """
+    Copy a value the way a BSON round-trip would
+
+    Tuples become lists, and datetimes become naive UTC truncated to
+    milliseconds, so stored documents compare like the ones MongoDB
+    returns. Copying also keeps callers from mutating stored documents.
+    """
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, datetime):
+        if value.tzinfo:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return value
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return tuple((key, _hashable(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+def _get(doc, path):
+    """Get a dotted path from a document; arrays of subdocuments give a list of values"""
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list):
+            if part.isdigit():
+                value = value[int(part)] if int(part) < len(value) else _MISSING
+            else:
+                values = [item.get(part, _MISSING) for item in value if isinstance(item, dict)]
+                value = [item for item in values if item is not _MISSING] or _MISSING
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+def _parent(doc, path, create=True):
+    """Get the container and final key of a dotted path"""
+    parts = path.split(".")
+    container = doc
+    for part in parts[:-1]:
+        if isinstance(container, list):
+            container = container[int(part)]
+            continue
+        if part not in container or container[part] is None:
+            if not create:
+                return None, parts[-1]
+            container[part] = {}
+        container = container[part]
+    return container, parts[-1]
+
+def _set(doc, path, value):
+    container, key = _parent(doc, path)
+    if isinstance(container, list):
+        container[int(key)] = value
+    else:
+        container[key] = value
+
+def _unset(doc, path):
+    container, key = _parent(doc, path, create=False)
+    if isinstance(container, dict):
+        container.pop(key, None)
+
+
+# BSON comparison order of the types the app stores
+def _type_rank(value):
+    if value is None or value is _MISSING:
+        return 0
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    if isinstance(value, dict):
+        return 3
+    if isinstance(value, list):
+        return 4
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+def _sort_key(value):
+    rank = _type_rank(value)
+    if rank == 0:
+        return (0, 0)
+    if rank in (3, 4):
+        return (rank, repr(_hashable(value)))
+    return (rank, value)
+
+def _compare(value, operand, op):
+    """Compare like MongoDB: values of different types never match"""
+    if _type_rank(value) != _type_rank(operand) or value is _MISSING:
+        return False
+    try:
+        return op(value, operand)
+    except TypeError:
+        return False
+
+def _candidates(value):
+    """Values a condition is tested against: the field itself, plus array elements"""
+    if isinstance(value, list):
+        return [value] + value
+    return [value]
+
+def _equals(value, operand):
+    if operand is None:
+        return value is _MISSING or value is None or (isinstance(value, list) and None in value)
+    if value is _MISSING:
+        return False
+    operand = _normalize(operand)
+    return any(candidate == operand and _type_rank(candidate) == _type_rank(operand) for candidate in _candidates(value))
+
+def _point(geometry):
+    if isinstance(geometry, dict):
+        geometry = geometry.get("coordinates")
+    if isinstance(geometry, list) and len(geometry) == 2 and all(isinstance(c, (int, float)) for c in geometry):
+        return geometry
+    return None
+
+def _near_distance(value, near):
+    """Distance in meters from a document's point to a $near/$nearSphere center"""
+    point = _point(value) if value is not _MISSING else None
+    if point is None:
+        return None
+    center = _point(near.get("$geometry", near))
+    return haversine_distance(center[1], center[0], point[1], point[0]) * 1000
+
+def _near_spec(condition):
+    near = condition.get("$nearSphere", condition.get("$near"))
+    if "$geometry" not in near and "$maxDistance" in condition:
+        # Legacy form: {"$nearSphere": [lon, lat], "$maxDistance": radians}
+        return {"$geometry": {"coordinates": near}, "$maxDistance": condition["$maxDistance"] * EARTH_RADIUS_KM * 1000}
+    return near
+
+def _matches_operator(value, op, operand, condition):
+    if op == "$eq":
+        return _equals(value, operand)
+    if op == "$ne":
+        return not _equals(value, operand)
+    if op == "$in":
+        return any(_equals(value, item) for item in operand)
+    if op == "$nin":
+        return not any(_equals(value, item) for item in operand)
+    if op == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if op in ("$gt", "$gte", "$lt", "$lte"):
+        operand = _normalize(operand)
+        compare = {
+            "$gt": lambda a, b: a > b, "$gte": lambda a, b: a >= b,
+            "$lt": lambda a, b: a < b, "$lte": lambda a, b: a <= b
+        }[op]
+        return any(_compare(candidate, operand, compare) for candidate in _candidates(value))
+    if op == "$regex":
+        flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+        pattern = re.compile(operand, flags) if isinstance(operand, str) else operand
+        return any(isinstance(candidate, str) and pattern.search(candidate) for candidate in _candidates(value))
+    if op == "$options":
+        return True
+    if op == "$not":
+        return not _matches_condition(value, operand)
+    if op == "$size":
+        return isinstance(value, list) and len(value) == operand
+    if op in ("$near", "$nearSphere"):
+        near = _near_spec(condition)
+        distance = _near_distance(value, near)
+        return distance is not None and \
+            near.get("$minDistance", 0) <= distance <= near.get("$maxDistance", math.inf)
+    if op in ("$maxDistance", "$minDistance"):
+        return True
+    raise NotImplementedError(f"Query operator {op} is not supported by the memory backend")
+
+def _is_operator_dict(condition):
+    return isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition)
+
+def _matches_condition(value, condition):
+    if _is_operator_dict(condition):
+        return all(_matches_operator(value, op, operand, condition) for op, operand in condition.items())
+    if isinstance(condition, re.Pattern):
+        return _matches_operator(value, "$regex", condition, {})
+    return _equals(value, condition)
+
+def matches(doc, query):
+    """Check if a document matches a MongoDB query filter"""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, clause) for clause in condition):
+                return False
+        elif not _matches_condition(_get(doc, key), condition):
+            return False
+    return True
+
+def _near_query(query):
+    """Find the (field, spec) of a $near/$nearSphere condition in a query"""
+    for key, condition in query.items():
+        if isinstance(condition, dict) and ("$nearSphere" in condition or "$near" in condition):
+            return key, _near_spec(condition)
+    return None, None
+
+def sort_documents(docs, sort):
+    """Sort documents by a list of (field, direction) pairs"""
+    docs = list(docs)
+    for field, direction in reversed(sort):
+        docs.sort(key=lambda doc: _sort_key(_get(doc, field)), reverse=direction < 0)
+    return docs
+
+def project(doc, projection):
+    """Apply a find() projection"""
+    if not projection:
+        return _copy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+
+    include = [field for field, flag in projection.items() if flag and field != "_id"]
+    if not include:
+        result = _copy(doc)
+        for field, flag in projection.items():
+            if not flag:
+                _unset(result, field)
+        return result
+
+    result = {}
+    if projection.get("_id", 1) and "_id" in doc:
+        result["_id"] = doc["_id"]
+    for field in include:
+        value = _get(doc, field)
+        if value is not _MISSING:
+            _set(result, field, _copy(value))
+    return result
+
+
+def _apply_update(doc, update, inserting=False):
+    """Apply update operators to a document in place"""
+    if not update or not all(key.startswith("$") for key in update):
+        raise ValueError("update only works with $ operators")
+
+    for op, fields in update.items():
+        for path, operand in fields.items():
+            operand = _normalize(operand)
+            current = _get(doc, path)
+            if op == "$set":
+                _set(doc, path, operand)
+            elif op == "$setOnInsert":
+                if inserting:
+                    _set(doc, path, operand)
+            elif op == "$unset":
+                _unset(doc, path)
+            elif op == "$inc":
+                _set(doc, path, (0 if current in (_MISSING, None) else current) + operand)
+            elif op == "$min":
+                if current is _MISSING or _sort_key(operand) < _sort_key(current):
+                    _set(doc, path, operand)
+            elif op == "$max":
+                if current is _MISSING or _sort_key(operand) > _sort_key(current):
+                    _set(doc, path, operand)
+            elif op in ("$push", "$addToSet"):
+                items = operand["$each"] if isinstance(operand, dict) and "$each" in operand else [operand]
+                values = [] if current is _MISSING else current
+                for item in items:
+                    if op == "$push" or item not in values:
+                        values.append(item)
+                _set(doc, path, values)
+            elif op == "$pull":
+                if isinstance(current, list):
+                    _set(doc, path, [item for item in current if not _matches_condition(item, operand)])
+            else:
+                raise NotImplementedError(f"Update operator {op} is not supported by the memory backend")
+
+def _upsert_document(query):
+    """Seed an upserted document with the equality fields of its filter"""
+    doc = {}
+    for key, condition in query.items():
+        if key.startswith("$"):
+            continue
+        if _is_operator_dict(condition):
+            if "$eq" in condition:
+                _set(doc, key, _normalize(condition["$eq"]))
+        else:
+            _set(doc, key, _normalize(condition))
+    return doc
+
+
+class _Index:
+    """A hash index over one or more fields, or a 2dsphere grid over one field"""
+
+    def __init__(self, document):
+        self.name = document["name"]
+        self.keys = list(document["key"].items())
+        self.fields = [field for field, _ in self.keys]
+        self.unique = document.get("unique", False)
+        self.partial = document.get("partialFilterExpression")
+        self.expire_after = document.get("expireAfterSeconds")  # recorded only, nothing expires
+        self.geo = any(kind == "2dsphere" for _, kind in self.keys)
+        self.lon_cells = math.ceil(360 / GEO_CELL_SIZE)
+        self._entries = {}  # key or cell -> set of _ids
+
+    def info(self):
+        info = {"key": self.keys}
+        if self.unique:
+            info["unique"] = True
+        if self.partial:
+            info["partialFilterExpression"] = self.partial
+        if self.expire_after is not None:
+            info["expireAfterSeconds"] = self.expire_after
+        return info
+
+    def _cell(self, lon, lat):
+        return (math.floor((lon + 180) / GEO_CELL_SIZE) % self.lon_cells, math.floor((lat + 90) / GEO_CELL_SIZE))
+
+    def entry_keys(self, doc):
+        """Keys a document is stored under; arrays are indexed by element"""
+        if self.partial and not matches(doc, self.partial):
+            return []
+        if self.geo:
+            point = _point(_get(doc, self.fields[0]))
+            return [self._cell(*point)] if point else []
+
+        per_field = []
+        for field in self.fields:
+            value = _get(doc, field)
+            value = None if value is _MISSING else value
+            per_field.append({_hashable(item) for item in _candidates(value)})
+        return list(product(*per_field))
+
+    def add(self, doc):
+        for key in self.entry_keys(doc):
+            self._entries.setdefault(key, set()).add(doc["_id"])
+
+    def remove(self, doc):
+        for key in self.entry_keys(doc):
+            ids = self._entries.get(key)
+            if ids is not None:
+                ids.discard(doc["_id"])
+                if not ids:
+                    del self._entries[key]
+
+    def conflict(self, doc):
+        """Get the _id of another document holding the same unique key"""
+        if not self.unique:
+            return None
+        for key in self.entry_keys(doc):
+            for other in self._entries.get(key, ()):
+                if other != doc["_id"]:
+                    return other
+        return None
+
+    def usable_for(self, query):
+        """Check if a query only touches documents this index covers"""
+        if self.partial:
+            return all(key in query and _equals(_normalize(query[key]), value) for key, value in self.partial.items())
+        return True
+
+    def lookup(self, query):
+        """Get candidate _ids for a query, or None if the index cannot serve it"""
+        if not self.usable_for(query):
+            return None
+
+        if self.geo:
+            near = query.get(self.fields[0])
+            if not (isinstance(near, dict) and ("$nearSphere" in near or "$near" in near)):
+                return None
+            return self._lookup_near(_near_spec(near))
+
+        per_field = []
+        for field in self.fields:
+            condition = query.get(field, _MISSING)
+            if _is_operator_dict(condition):
+                if set(condition) == {"$in"}:
+                    values = condition["$in"]
+                elif set(condition) == {"$eq"}:
+                    values = [condition["$eq"]]
+                else:
+                    return None
+            elif condition is _MISSING or isinstance(condition, (dict, list, re.Pattern)):
+                return None
+            else:
+                values = [condition]
+            per_field.append([_hashable(_normalize(value)) for value in values])
+
+        if math.prod(len(values) for values in per_field) > MAX_INDEX_LOOKUPS:
+            return None
+
+        ids = set()
+        for key in product(*per_field):
+            ids.update(self._entries.get(key, ()))
+        return ids
+
+    def _lookup_near(self, near):
+        max_distance = near.get("$maxDistance")
+        if max_distance is None:
+            return None
+
+        lon, lat = _point(near["$geometry"])
+        dlat = math.degrees(max_distance / 1000 / EARTH_RADIUS_KM)
+        max_lat = min(abs(lat) + dlat, 90)
+        dlon = 180 if max_lat >= 89.9 else min(dlat / math.cos(math.radians(max_lat)), 180)
+
+        min_x = math.floor((lon - dlon + 180) / GEO_CELL_SIZE)
+        max_x = math.floor((lon + dlon + 180) / GEO_CELL_SIZE)
+        if max_x - min_x + 1 >= self.lon_cells:
+            min_x, max_x = 0, self.lon_cells - 1
+        min_y = math.floor((lat - dlat + 90) / GEO_CELL_SIZE)
+        max_y = math.floor((lat + dlat + 90) / GEO_CELL_SIZE)
+
+        ids = set()
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                ids.update(self._entries.get((x % self.lon_cells, y), ()))
+        return ids
+
+    def leads_with(self, query):
+        """Check if the query constrains this index's leading field, as MongoDB's planner requires"""
+        if not self.usable_for(query):
+            return False
+        return self.fields[0] in query or self.fields[0] in (self.partial or {})
+
+
+class MemoryCursor:
+    """A lazily evaluated find() cursor"""
+
+    def __init__(self, collection, query=None, projection=None):
+        self._collection = collection
+        self._query = _normalize(query or {})
+        self._projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+        self._results = None
+
+    def sort(self, key_or_list, direction=1):
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction)]
+        else:
+            self._sort = list(key_or_list)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def _evaluate(self):
+        if self._results is None:
+            docs = self._collection._select(self._query, self._sort)
+            docs = docs[self._skip:]
+            if self._limit:
+                docs = docs[:self._limit]
+            self._results = [project(doc, self._projection) for doc in docs]
+        return self._results
+
+    async def to_list(self, length=None):
+        results = self._evaluate()
+        return results if length is None else results[:length]
+
+    def __aiter__(self):
+        self._position = 0
+        return self
+
+    async def __anext__(self):
+        results = self._evaluate()
+        if self._position >= len(results):
+            raise StopAsyncIteration
+        self._position += 1
+        return results[self._position - 1]
+
+    async def explain(self):
+        index = self._collection._planned_index(self._query)
+        if index is None:
+            plan = {"stage": "COLLSCAN", "filter": self._query}
+        else:
+            plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": index.name}}
+        return {"queryPlanner": {"winningPlan": plan}}
+
+
+class MemoryCommandCursor:
+    """Results of an aggregation"""
+
+    def __init__(self, results):
+        self._results = results
+
+    async def to_list(self, length=None):
+        return self._results if length is None else self._results[:length]
+
+    def __aiter__(self):
+        self._iterator = iter(self._results)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+# Aggregation expressions
+def _evaluate(expression, doc):
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = _get(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, list):
+        return [_evaluate(item, doc) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if not _is_operator_dict(expression):
+        return {key: _evaluate(value, doc) for key, value in expression.items()}
+
+    (op, operand), = expression.items()
+    if op == "$ifNull":
+        for item in operand:
+            value = _evaluate(item, doc)
+            if value is not None:
+                return value
+        return None
+    if op in ("$year", "$month", "$dayOfMonth", "$hour", "$minute"):
+        value = _evaluate(operand, doc)
+        attribute = {"$year": "year", "$month": "month", "$dayOfMonth": "day", "$hour": "hour", "$minute": "minute"}[op]
+        return getattr(value, attribute) if isinstance(value, datetime) else None
+    if op == "$dateFromParts":
+        parts = {key: _evaluate(value, doc) for key, value in operand.items()}
+        return datetime(parts["year"], parts.get("month", 1), parts.get("day", 1), parts.get("hour", 0),
+                        parts.get("minute", 0), parts.get("second", 0))
+    if op == "$literal":
+        return operand
+    raise NotImplementedError(f"Expression operator {op} is not supported by the memory backend")
+
+def _group(docs, spec):
+    groups = {}
+    for doc in docs:
+        key = _evaluate(spec["_id"], doc)
+        group = groups.setdefault(_hashable(key), {"_id": key, "_docs": []})
+        group["_docs"].append(doc)
+
+    results = []
+    for group in groups.values():
+        result = {"_id": group["_id"]}
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (op, operand), = accumulator.items()
+            values = [_evaluate(operand, doc) for doc in group["_docs"]]
+            if op == "$sum":
+                result[field] = sum(value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool))
+            elif op == "$avg":
+                numbers = [value for value in values if isinstance(value, (int, float))]
+                result[field] = sum(numbers) / len(numbers) if numbers else None
+            elif op == "$first":
+                result[field] = values[0]
+            elif op == "$last":
+                result[field] = values[-1]
+            elif op == "$min":
+                result[field] = min(values, key=_sort_key)
+            elif op == "$max":
+                result[field] = max(values, key=_sort_key)
+            elif op == "$push":
+                result[field] = values
+            else:
+                raise NotImplementedError(f"Accumulator {op} is not supported by the memory backend")
+        results.append(result)
+    return results
+
+def _project_stage(doc, spec):
+    exclusions = [field for field, value in spec.items() if value in (0, False)]
+    if len(exclusions) == len(spec):
+        return project(doc, spec)
+
+    result = {}
+    if spec.get("_id", 1) not in (0, False) and "_id" in doc:
+        result["_id"] = doc["_id"]
+    for field, value in spec.items():
+        if field == "_id" and value in (0, False, 1, True):
+            continue
+        if value in (1, True):
+            found = _get(doc, field)
+            if found is not _MISSING:
+                _set(result, field, _copy(found))
+        else:
+            _set(result, field, _evaluate(value, doc))
+    return result
+
+
+class MemoryCollection:
+    """An in-memory collection mimicking AsyncIOMotorCollection"""
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self._docs = {}  # _id -> document, in insertion order
+        self._indexes = {}  # name -> _Index
+
+    # Reads
+    def find(self, filter=None, projection=None, sort=None, limit=0):
+        cursor = MemoryCursor(self, filter, projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.limit(limit)
+
+    async def find_one(self, filter=None, projection=None, sort=None):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        results = await self.find(filter, projection, sort=sort, limit=1).to_list(1)
+        return results[0] if results else None
+
+    async def count_documents(self, filter):
+        return len(self._select(_normalize(filter)))
+
+    async def estimated_document_count(self):
+        return len(self._docs)
+
+    async def distinct(self, key, filter=None):
+        values = []
+        for doc in self._select(_normalize(filter or {})):
+            value = _get(doc, key)
+            for item in (value if isinstance(value, list) else [value]):
+                if item is not _MISSING and item not in values:
+                    values.append(item)
+        return values
+
+    def aggregate(self, pipeline):
+        docs = [_copy(doc) for doc in self._docs.values()]
+        return MemoryCommandCursor(self._run_pipeline(docs, pipeline))
+
+    def _run_pipeline(self, docs, pipeline):
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == "$match":
+                docs = [doc for doc in docs if matches(doc, _normalize(spec))]
+            elif name == "$group":
+                docs = _group(docs, spec)
+            elif name == "$project":
+                docs = [_project_stage(doc, spec) for doc in docs]
+            elif name == "$sort":
+                docs = sort_documents(docs, list(spec.items()))
+            elif name == "$skip":
+                docs = docs[spec:]
+            elif name == "$limit":
+                docs = docs[:spec]
+            elif name == "$count":
+                docs = [{spec: len(docs)}] if docs else []
+            elif name == "$unwind":
+                path = spec if isinstance(spec, str) else spec["path"]
+                unwound = []
+                for doc in docs:
+                    for item in _get(doc, path[1:]) or []:
+                        copy = _copy(doc)
+                        _set(copy, path[1:], item)
+                        unwound.append(copy)
+                docs = unwound
+            elif name == "$facet":
+                docs = [{field: self._run_pipeline([_copy(doc) for doc in docs], stages) for field, stages in spec.items()}]
+            elif name == "$out":
+                self.database[spec]._replace_all(docs)
+                docs = []
+            else:
+                raise NotImplementedError(f"Aggregation stage {name} is not supported by the memory backend")
+        return docs
+
+    def _select(self, query, sort=None):
+        """Get the stored documents matching a query, in sort order"""
+        ids = self._candidate_ids(query)
+        docs = self._docs.values() if ids is None else [self._docs[_id] for _id in ids if _id in self._docs]
+        docs = [doc for doc in docs if matches(doc, query)]
+
+        field, near = _near_query(query)
+        if near and not sort:
+            docs.sort(key=lambda doc: _near_distance(_get(doc, field), near))
+        elif sort:
+            docs = sort_documents(docs, sort)
+        elif ids is not None:
+            # Index lookups come back unordered; ObjectIds sort in insertion order
+            docs.sort(key=lambda doc: _sort_key(doc["_id"]))
+        return docs
+
+    def _candidate_ids(self, query):
+        if "_id" in query and not _is_operator_dict(query["_id"]):
+            return [query["_id"]]
+        if "_id" in query and set(query["_id"]) == {"$in"}:
+            return list(query["_id"]["$in"])
+
+        best = None
+        for index in self._indexes.values():
+            ids = index.lookup(query)
+            if ids is not None and (best is None or len(ids) < len(best)):
+                best = ids
+        return best
+
+    def _planned_index(self, query):
+        for index in self._indexes.values():
+            if index.leads_with(query):
+                return index
+        return None
+
+    # Writes
+    def _index(self, doc):
+        for index in self._indexes.values():
+            index.add(doc)
+
+    def _unindex(self, doc):
+        for index in self._indexes.values():
+            index.remove(doc)
+
+    def _check_unique(self, doc):
+        for index in self._indexes.values():
+            other = index.conflict(doc)
+            if other is not None:
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.name} index: {index.name}",
+                    11000
+                )
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_", 11000)
+
+    def _store(self, document):
+        doc = _normalize(document)
+        doc.setdefault("_id", ObjectId())
+        self._check_unique(doc)
+        self._docs[doc["_id"]] = doc
+        self._index(doc)
+        return doc["_id"]
+
+    def _replace(self, old, new):
+        """Swap a stored document for its updated copy, enforcing unique indexes"""
+        self._unindex(old)
+        try:
+            for index in self._indexes.values():
+                if index.conflict(new) is not None:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.name} index: {index.name}",
+                        11000
+                    )
+        except DuplicateKeyError:
+            self._index(old)
+            raise
+        self._docs[new["_id"]] = new
+        self._index(new)
+
+    def _replace_all(self, documents):
+        for index in self._indexes.values():
+            index._entries = {}
+        self._docs = {}
+        for document in documents:
+            self._store(document)
+
+    async def insert_one(self, document):
+        document.setdefault("_id", ObjectId())
+        return InsertOneResult(self._store(document), True)
+
+    async def insert_many(self, documents, ordered=True):
+        ids = []
+        errors = []
+        for position, document in enumerate(documents):
+            document.setdefault("_id", ObjectId())
+            try:
+                ids.append(self._store(document))
+            except DuplicateKeyError as e:
+                errors.append({"index": position, "code": 11000, "errmsg": str(e), "op": document})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors, "writeConcernErrors": [], "nInserted": len(ids), "nUpserted": 0,
+                "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []
+            })
+        return InsertManyResult(ids, True)
+
+    def _update(self, filter, update, upsert=False, many=False):
+        """Apply an update, returns (matched, modified, upserted _id, the old and new first document)"""
+        filter = _normalize(filter)
+        docs = self._select(filter)
+        if not many:
+            docs = docs[:1]
+
+        modified = 0
+        first = None
+        for doc in docs:
+            new = _copy(doc)
+            _apply_update(new, update)
+            if new != doc:
+                self._replace(doc, new)
+                modified += 1
+            if first is None:
+                first = (doc, new)
+
+        if docs or not upsert:
+            return len(docs), modified, None, first
+
+        doc = _upsert_document(filter)
+        _apply_update(doc, update, inserting=True)
+        _id = self._store(doc)
+        return 0, 0, _id, (None, self._docs[_id])
+
+    def _update_result(self, matched, modified, upserted_id):
+        raw = {"n": matched + (1 if upserted_id is not None else 0), "nModified": modified, "ok": 1.0}
+        if upserted_id is not None:
+            raw["upserted"] = upserted_id
+        return UpdateResult(raw, True)
+
+    async def update_one(self, filter, update, upsert=False):
+        return self._update_result(*self._update(filter, update, upsert)[:3])
+
+    async def update_many(self, filter, update, upsert=False):
+        return self._update_result(*self._update(filter, update, upsert, many=True)[:3])
+
+    async def replace_one(self, filter, replacement, upsert=False):
+        docs = self._select(_normalize(filter))[:1]
+        if not docs:
+            if not upsert:
+                return self._update_result(0, 0, None)
+            return self._update_result(0, 0, self._store(dict(replacement)))
+
+        new = _normalize(replacement)
+        new["_id"] = docs[0]["_id"]
+        self._replace(docs[0], new)
+        return self._update_result(1, int(new != docs[0]), None)
+
+    async def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                                  return_document=ReturnDocument.BEFORE):
+        if sort:
+            docs = self._select(_normalize(filter), sort)
+            if docs:
+                filter = {"_id": docs[0]["_id"]}
+        _, _, _, first = self._update(filter, update, upsert)
+        if first is None:
+            return None
+        doc = first[1] if return_document == ReturnDocument.AFTER else first[0]
+        return project(doc, projection) if doc is not None else None
+
+    async def delete_one(self, filter):
+        return DeleteResult({"n": self._delete(filter, many=False), "ok": 1.0}, True)
+
+    async def delete_many(self, filter):
+        return DeleteResult({"n": self._delete(filter, many=True), "ok": 1.0}, True)
+
+    def _delete(self, filter, many):
+        docs = self._select(_normalize(filter))
+        if not many:
+            docs = docs[:1]
+        for doc in docs:
+            self._unindex(doc)
+            del self._docs[doc["_id"]]
+        return len(docs)
+
+    async def bulk_write(self, requests, ordered=True):
+        result = {
+            "writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+            "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []
+        }
+        for position, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    request._doc.setdefault("_id", ObjectId())
+                    self._store(request._doc)
+                    result["nInserted"] += 1
+                elif isinstance(request, (UpdateOne, UpdateMany)):
+                    matched, modified, upserted_id, _ = self._update(
+                        request._filter, request._doc, request._upsert, many=isinstance(request, UpdateMany)
+                    )
+                    result["nMatched"] += matched
+                    result["nModified"] += modified
+                    if upserted_id is not None:
+                        result["nUpserted"] += 1
+                        result["upserted"].append({"index": position, "_id": upserted_id})
+                elif isinstance(request, ReplaceOne):
+                    update = await self.replace_one(request._filter, request._doc, request._upsert)
+                    result["nMatched"] += update.matched_count
+                    result["nModified"] += update.modified_count
+                elif isinstance(request, (DeleteOne, DeleteMany)):
+                    result["nRemoved"] += self._delete(request._filter, many=isinstance(request, DeleteMany))
+                else:
+                    raise NotImplementedError(f"{type(request).__name__} is not supported by the memory backend")
+            except DuplicateKeyError as e:
+                result["writeErrors"].append({"index": position, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    # Indexes
+    async def create_indexes(self, indexes):
+        names = []
+        for model in indexes:
+            names.append(self._create_index(model.document))
+        return names
+
+    async def create_index(self, keys, **kwargs):
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        name = kwargs.pop("name", "_".join(f"{field}_{kind}" for field, kind in keys))
+        return self._create_index({"key": dict(keys), "name": name, **kwargs})
+
+    def _create_index(self, document):
+        index = _Index(document)
+        existing = self._indexes.get(index.name)
+        if existing is not None:
+            if existing.info() != index.info():
+                raise OperationFailure(
+                    f"An existing index has the same name as the requested index: {index.name}", 85
+                )
+            return index.name
+
+        for doc in self._docs.values():
+            if index.conflict(doc) is not None:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {index.name}", 11000)
+            index.add(doc)
+        self._indexes[index.name] = index
+        return index.name
+
+    async def index_information(self):
+        return {"_id_": {"key": [("_id", 1)]}, **{name: index.info() for name, index in self._indexes.items()}}
+
+    async def drop_index(self, name):
+        self._indexes.pop(name, None)
+
+    async def drop(self):
+        self._docs = {}
+        self._indexes = {}
+
+
+class MemoryDatabase:
+    """An in-memory database; collections are created on first use"""
+
+    def __init__(self, name):
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name):
+        return self[name]
+
+    async def list_collection_names(self):
+        return [name for name, collection in self._collections.items() if collection._docs]
+
+    async def drop_collection(self, name):
+        self._collections.pop(name, None)
+
+    async def command(self, command, value=None, **kwargs):
+        if command == "collMod" and "index" in kwargs:
+            spec = kwargs["index"]
+            index = self[value]._indexes.get(spec["name"])
+            if index is None:
+                raise OperationFailure(f"cannot find index {spec['name']} for ns {self.name}.{value}", 27)
+            index.expire_after = spec["expireAfterSeconds"]
+        return {"ok": 1.0}
+
+
+class MemoryClient:
+    """Stand-in for AsyncIOMotorClient holding in-memory databases"""
+
+    def __init__(self):
+        self._databases = {}
+
+    def __getitem__(self, name):
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(name)
+        return self._databases[name]
+
+    def get_database(self, name):
+        return self[name]
+
+    def close(self):
+        pass
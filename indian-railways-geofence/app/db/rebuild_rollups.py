@@ -0,0 +1,20 @@
+"""
+Rebuild the hourly alert rollups from the raw alerts collection
+
+    python -m app.db.rebuild_rollups
+"""
+import asyncio
+
+from app.db.connection import connect_to_mongo, close_mongo_connection
+from app.services.alert_rollups import rebuild_rollups
+
+async def main():
+    db = await connect_to_mongo()
+    try:
+        buckets = await rebuild_rollups(db)
+        print(f"Alert rollups rebuilt with {buckets} buckets")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
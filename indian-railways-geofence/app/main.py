@@ -10,8 +10,18 @@ import uvicorn
 import os
 
 from app.db.connection import connect_to_mongo, close_mongo_connection
-from app.routes import trains, stations, objects, users, alerts, simulation
+from app.routes import trains, stations, objects, users, alerts, simulation, metrics, telemetry, stream
 from app.db.seed import seed_initial_data
+from app.db.generate import GENERATE_ON_STARTUP, generate_on_startup
+from app.db.indexes import INDEX_REPORT_ON_STARTUP, report_collection_scans
+from app.services.station_index import station_index
+from app.services.alert_state import alert_state
+from app.services.geo_fencing import STATION_PROXIMITY_MODE
+from app.services.geofence_queue import geofence_queue
+from app.services.alert_rollups import ensure_rollups
+from app.services.alert_retention import alert_archiver
+from app.services.position_history import position_history
+from app.services.journeys import journey_scheduler
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -36,15 +46,34 @@ app.include_router(objects.router, prefix="/objects", tags=["Objects"])
 app.include_router(users.router, prefix="/users", tags=["Users"])
 app.include_router(alerts.router, prefix="/alerts", tags=["Alerts"])
 app.include_router(simulation.router, prefix="/simulate", tags=["Simulation"])
+app.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
+app.include_router(telemetry.router, prefix="/telemetry", tags=["Telemetry"])
+app.include_router(stream.router, prefix="/stream", tags=["Stream"])
 
 # Startup and shutdown events
 @app.on_event("startup")
 async def startup_db_client():
-    await connect_to_mongo()
+    db = await connect_to_mongo()
     await seed_initial_data()
+    if GENERATE_ON_STARTUP:
+        await generate_on_startup(db)
+    if INDEX_REPORT_ON_STARTUP:
+        await report_collection_scans(db)
+    if STATION_PROXIMITY_MODE == "index":
+        await station_index.load(db)
+    await alert_state.load(db)
+    await ensure_rollups(db)
+    await geofence_queue.start(db)
+    await alert_archiver.start(db)
+    await position_history.start(db)
+    await journey_scheduler.start(db)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await journey_scheduler.stop()
+    await position_history.stop()
+    await alert_archiver.stop()
+    await geofence_queue.stop()
     await close_mongo_connection()
 
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from app.models.geo import GeoPoint
+from app.models.geo import GeoPoint, LocationFix
 from app.models.station import Station, StationCreate, StationUpdate
 from app.models.train import Train, TrainCreate, TrainUpdate, Coach
 from app.models.object import Object, ObjectCreate, ObjectUpdate
@@ -6,7 +6,7 @@ from app.models.user import User, UserCreate, UserUpdate
 from app.models.alert import Alert, AlertCreate, AlertUpdate
 
 __all__ = [
-    "GeoPoint",
+    "GeoPoint", "LocationFix",
     "Station", "StationCreate", "StationUpdate",
     "Train", "TrainCreate", "TrainUpdate", "Coach",
     "Object", "ObjectCreate", "ObjectUpdate",
@@ -45,6 +45,7 @@ class AlertUpdate(BaseModel):
 class Alert(AlertBase):
     id: str
     timestamp: datetime
+    resolvedAt: Optional[datetime] = None
     # For station alerts
     stationCode: Optional[str] = None
     stationName: Optional[str] = None
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 from typing import List, Literal
+from datetime import datetime, timezone
 
 class GeoPoint(BaseModel):
     type: Literal["Point"] = "Point"
@@ -11,4 +12,27 @@ class GeoPoint(BaseModel):
                 "type": "Point",
                 "coordinates": [77.2207, 28.6425]
             }
-        }
\ No newline at end of file
+        }
+
+class LocationFix(BaseModel):
+    id: str  # train number or object ID
+    timestamp: datetime
+    lon: float
+    lat: float
+    
+    @validator("timestamp")
+    def naive_utc(cls, timestamp):
+        """Convert aware timestamps to naive UTC, as MongoDB stores them"""
+        if timestamp.tzinfo:
+            return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        return timestamp
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "id": "12301",
+                "timestamp": "2023-05-08T10:30:00Z",
+                "lon": 77.1500,
+                "lat": 28.6000
+            }
+        }
@@ -1,24 +1,41 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import List, Optional
 from bson.objectid import ObjectId
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from app.models import Alert, AlertCreate, AlertUpdate
 from app.db.connection import get_database
+from app.services import alerts as alert_service
+from app.services.alert_state import alert_state
+from app.services.movement_budget import movement_budget
+from app.services.broadcaster import broadcaster
+from app.services.alert_rollups import record_alert_changes
+from app.services.alert_retention import alert_archiver
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, find_page, ndjson_response, parse_fields, projected_response, set_next_cursor
+from app.utils.serialization import DocumentEncoder, FastJSONResponse
 
 router = APIRouter()
 
+alert_encoder = DocumentEncoder(Alert)
+
 @router.get("/", response_model=List[Alert])
 async def get_alerts(
+    response: Response,
     alert_type: Optional[str] = Query(None, description="Filter by alert type: 'station_proximity' or 'theft'"),
     resolved: Optional[bool] = Query(None, description="Filter by resolved status"),
     train_number: Optional[str] = Query(None, description="Filter by train number"),
     object_id: Optional[str] = Query(None, description="Filter by object ID"),
     station_code: Optional[str] = Query(None, description="Filter by station code"),
     since: Optional[datetime] = Query(None, description="Filter alerts since timestamp"),
+    include_archived: bool = Query(False, description="Also return archived alerts (requires since)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of results"),
+    cursor: Optional[str] = Query(None, description="Continuation token from the X-Next-Cursor header"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    stream: bool = Query(False, description="Stream every result from the cursor on as NDJSON instead of one page"),
+    fast: bool = Query(False, description="Skip model validation and encode documents directly"),
     db=Depends(get_database)
 ):
-    """Get alerts with optional filters"""
+    """Get alerts with optional filters, newest first, one page at a time"""
     query = {}
     
     if alert_type:
@@ -39,8 +56,29 @@ async def get_alerts(
     if since:
         query["timestamp"] = {"$gte": since}
     
-    alerts = await db.alerts.find(query).sort("timestamp", -1).to_list(1000)
-    
+    fields = parse_fields(fields)
+    sort = [("timestamp", -1), ("_id", -1)]
+    
+    if include_archived:
+        if not since:
+            raise HTTPException(status_code=400, detail="include_archived requires since")
+        if stream:
+            raise HTTPException(status_code=400, detail="include_archived cannot be streamed")
+        alerts, next_cursor = await alert_archiver.find_page(db, query, since, limit, cursor, fields)
+    elif stream:
+        return ndjson_response(db.alerts, query, sort, cursor, fields, expose_id=True)
+    else:
+        alerts, next_cursor = await find_page(db.alerts, query, sort, limit, cursor, fields)
+    
+    if fields:
+        return projected_response(alerts, fields, next_cursor, expose_id=True)
+    
+    if fast:
+        response = FastJSONResponse(alert_encoder.encode_many(alerts))
+        set_next_cursor(response, next_cursor)
+        return response
+    
+    set_next_cursor(response, next_cursor)
     return [Alert(id=str(alert["_id"]), **{k: v for k, v in alert.items() if k != "_id"}) for alert in alerts]
 
 @router.get("/{alert_id}", response_model=Alert)
@@ -60,6 +98,8 @@ async def get_alert(alert_id: str, db=Depends(get_database)):
 async def create_alert(alert: AlertCreate, db=Depends(get_database)):
     """Create a new alert (usually done by the system)"""
     alert_dict = alert.dict()
+    if alert_dict["resolved"]:
+        alert_dict["resolvedAt"] = datetime.now()
     
     # Validate alert data based on type
     if alert.type == "station_proximity":
@@ -72,6 +112,15 @@ async def create_alert(alert: AlertCreate, db=Depends(get_database)):
     result = await db.alerts.insert_one(alert_dict)
     created_alert = await db.alerts.find_one({"_id": result.inserted_id})
     
+    # Keep the open alert table in sync
+    if not created_alert["resolved"]:
+        alert_state.add(created_alert)
+    await record_alert_changes(db, opened=[created_alert])
+    broadcaster.publish_alert(created_alert)
+    
+    # Make sure the next proximity check re-evaluates this train
+    movement_budget.invalidate(created_alert["trainNumber"])
+    
     return Alert(id=str(created_alert["_id"]), **{k: v for k, v in created_alert.items() if k != "_id"})
 
 @router.put("/{alert_id}/resolve")
@@ -82,14 +131,23 @@ async def resolve_alert(alert_id: str, db=Depends(get_database)):
     except:
         raise HTTPException(status_code=400, detail="Invalid alert ID format")
     
-    result = await db.alerts.update_one(
+    alert = await db.alerts.find_one_and_update(
         {"_id": object_id},
-        {"$set": {"resolved": True}}
+        {"$set": {"resolved": True, "resolvedAt": datetime.now()}}
     )
     
-    if result.matched_count == 0:
+    if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
+    # Keep the open alert table in sync
+    if not alert["resolved"]:
+        alert_state.discard(alert)
+        await record_alert_changes(db, resolved=[alert])
+        broadcaster.publish_alert(dict(alert, resolved=True))
+    
+    # Make sure the next proximity check re-evaluates this train
+    movement_budget.invalidate(alert["trainNumber"])
+    
     return {"message": "Alert resolved successfully"}
 
 @router.get("/stats/summary")
@@ -98,39 +156,4 @@ async def get_alert_stats(
     db=Depends(get_database)
 ):
     """Get alert statistics summary"""
-    since_date = datetime.now() - timedelta(days=days)
-    
-    # Get counts by type
-    station_alerts = await db.alerts.count_documents({
-        "type": "station_proximity",
-        "timestamp": {"$gte": since_date}
-    })
-    
-    theft_alerts = await db.alerts.count_documents({
-        "type": "theft",
-        "timestamp": {"$gte": since_date}
-    })
-    
-    # Get counts by resolved status
-    resolved = await db.alerts.count_documents({
-        "resolved": True,
-        "timestamp": {"$gte": since_date}
-    })
-    
-    unresolved = await db.alerts.count_documents({
-        "resolved": False,
-        "timestamp": {"$gte": since_date}
-    })
-    
-    return {
-        "total": station_alerts + theft_alerts,
-        "by_type": {
-            "station_proximity": station_alerts,
-            "theft": theft_alerts
-        },
-        "by_status": {
-            "resolved": resolved,
-            "unresolved": unresolved
-        },
-        "period_days": days
-    }
\ No newline at end of file
+    return await alert_service.get_alert_stats(db, days)
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends
+
+from app.db.connection import get_database
+from app.db.indexes import report_collection_scans
+
+from app.services.movement_budget import movement_budget
+from app.services.geofence_queue import geofence_queue
+from app.services.broadcaster import broadcaster
+from app.services.reference_cache import reference_cache
+from app.services.alert_retention import alert_archiver
+from app.services.position_history import position_history
+from app.services.simulation import tick_stats
+from app.services.journeys import journey_scheduler
+
+router = APIRouter()
+
+@router.get("/")
+async def get_metrics():
+    """Get in-process performance counters"""
+    return {
+        "geofence": movement_budget.stats(),
+        "geofence_queue": geofence_queue.stats(),
+        "broadcaster": broadcaster.stats(),
+        "reference_cache": reference_cache.stats(),
+        "alert_archiver": alert_archiver.stats(),
+        "position_history": position_history.stats(),
+        "simulation": tick_stats,
+        "journeys": journey_scheduler.stats()
+    }
+
+@router.get("/collection-scans")
+async def get_collection_scans(db=Depends(get_database)):
+    """Explain the hot queries and list the ones that scan a whole collection"""
+    return {"collection_scans": await report_collection_scans(db)}
@@ -1,17 +1,39 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import List, Optional
 from bson.objectid import ObjectId
 
-from app.models import Object, ObjectCreate, ObjectUpdate, GeoPoint
+from app.models import Object, ObjectCreate, ObjectUpdate, GeoPoint, LocationFix
 from app.db.connection import get_database
-from app.services.geo_fencing import check_object_theft
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, find_page, ndjson_response, parse_fields, projected_response, set_next_cursor
+from app.services.geofence_queue import geofence_queue
+from app.services.reference_cache import reference_cache
+from app.services.position_history import position_history
+from app.services.broadcaster import broadcaster
+from app.services.ingestion import ingest_object_fixes
 
 router = APIRouter()
 
 @router.get("/", response_model=List[Object])
-async def get_objects(db=Depends(get_database)):
-    """Get all objects"""
-    objects = await db.objects.find().to_list(1000)
+async def get_objects(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of results"),
+    cursor: Optional[str] = Query(None, description="Continuation token from the X-Next-Cursor header"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    stream: bool = Query(False, description="Stream every result from the cursor on as NDJSON instead of one page"),
+    db=Depends(get_database)
+):
+    """Get objects ordered by id, one page at a time"""
+    fields = parse_fields(fields)
+    
+    if stream:
+        return ndjson_response(db.objects, {}, [("id", 1)], cursor, fields)
+    
+    objects, next_cursor = await find_page(db.objects, {}, [("id", 1)], limit, cursor, fields)
+    
+    if fields:
+        return projected_response(objects, fields, next_cursor)
+    
+    set_next_cursor(response, next_cursor)
     return objects
 
 @router.get("/{object_id}", response_model=Object)
@@ -33,12 +55,11 @@ async def create_object(obj: ObjectCreate, db=Depends(get_database)):
         raise HTTPException(status_code=400, detail="Object with this ID already exists")
     
     # Verify train and coach exist
-    train = await db.trains.find_one({"number": obj.trainNumber})
+    train = await reference_cache.get_train(db, obj.trainNumber)
     if not train:
         raise HTTPException(status_code=404, detail="Train not found")
     
-    coach_exists = any(coach["id"] == obj.coachId for coach in train["coaches"])
-    if not coach_exists:
+    if obj.coachId not in train["coaches"]:
         raise HTTPException(status_code=404, detail="Coach not found in train")
     
     result = await db.objects.insert_one(obj_dict)
@@ -55,14 +76,13 @@ async def update_object(object_id: str, obj_update: ObjectUpdate, db=Depends(get
     
     # If updating train or coach, verify they exist
     if "trainNumber" in update_data:
-        train = await db.trains.find_one({"number": update_data["trainNumber"]})
+        train = await reference_cache.get_train(db, update_data["trainNumber"])
         if not train:
             raise HTTPException(status_code=404, detail="Train not found")
         
         # If updating coach, verify it exists in the train
         if "coachId" in update_data:
-            coach_exists = any(coach["id"] == update_data["coachId"] for coach in train["coaches"])
-            if not coach_exists:
+            if update_data["coachId"] not in train["coaches"]:
                 raise HTTPException(status_code=404, detail="Coach not found in train")
     
     result = await db.objects.update_one(
@@ -77,7 +97,9 @@ async def update_object(object_id: str, obj_update: ObjectUpdate, db=Depends(get
     
     # If location was updated, check for theft
     if "location" in update_data:
-        await check_object_theft(object_id, db)
+        broadcaster.publish_position("object", object_id, updated_obj["location"], updated_obj["trainNumber"])
+        position_history.record("object", object_id, updated_obj["location"]["coordinates"])
+        await geofence_queue.submit("object", object_id, db)
     
     return updated_obj
 
@@ -94,11 +116,24 @@ async def update_object_location(object_id: str, location: GeoPoint, db=Depends(
     
     updated_obj = await db.objects.find_one({"id": object_id})
     
-    # Check for theft alerts
-    await check_object_theft(object_id, db)
+    broadcaster.publish_position("object", object_id, updated_obj["location"], updated_obj["trainNumber"])
+    position_history.record("object", object_id, updated_obj["location"]["coordinates"])
+    
+    # Check for theft alerts in the background
+    await geofence_queue.submit("object", object_id, db)
     
     return updated_obj
 
+@router.post("/locations/batch")
+async def update_object_locations(fixes: List[LocationFix], db=Depends(get_database)):
+    """Update many objects' locations from a batch of GPS fixes"""
+    results, _ = await ingest_object_fixes(db, fixes)
+    
+    return {
+        "accepted": sum(1 for result in results if result["status"] == "updated"),
+        "results": results
+    }
+
 @router.delete("/{object_id}")
 async def delete_object(object_id: str, db=Depends(get_database)):
     """Delete an object"""
@@ -7,55 +7,26 @@ from datetime import datetime
 from app.models import Train, Object
 from app.db.connection import get_database
 from app.services.geo_fencing import check_station_proximity, check_object_theft
-from app.utils.distance import haversine_distance
+from app.utils.distance import haversine_distance, bearing_between_points
+from app.services.broadcaster import broadcaster
+from app.services.reference_cache import reference_cache
+from app.services.position_history import position_history
+from app.services import simulation as simulation_service
+from app.services.journeys import journey_scheduler
 
 router = APIRouter()
 
 @router.post("/train-movement")
-async def simulate_train_movement(db=Depends(get_database)):
-    """Simulate train movement for testing purposes"""
-    trains = await db.trains.find().to_list(1000)
-    
-    updated_trains = []
-    
-    for train in trains:
-        # Calculate new position based on speed and direction
-        # Speed is in km/h, convert to degrees per interval
-        # Approximate conversion: 1 degree ≈ 111 km at the equator
-        speed_in_degrees = (train["speed"] / 3600) * 5 / 111
-        
-        # Calculate new coordinates based on direction
-        direction_radians = (train["direction"] * math.pi) / 180
-        new_lon = train["location"]["coordinates"][0] + speed_in_degrees * math.cos(direction_radians)
-        new_lat = train["location"]["coordinates"][1] + speed_in_degrees * math.sin(direction_radians)
-        
-        # Update train location
-        await db.trains.update_one(
-            {"number": train["number"]},
-            {
-                "$set": {
-                    "location.coordinates": [new_lon, new_lat],
-                    # Randomly change direction slightly to simulate realistic movement
-                    "direction": (train["direction"] + (10 * (0.5 - random.random()))) % 360
-                }
-            }
-        )
-        
-        # Update objects that should move with the train
-        await db.objects.update_many(
-            {"trainNumber": train["number"]},
-            {"$set": {"location.coordinates": [new_lon, new_lat]}}
-        )
-        
-        # Check for station proximity
-        await check_station_proximity(train["number"], db)
-        
-        updated_train = await db.trains.find_one({"number": train["number"]})
-        updated_trains.append(updated_train)
+async def simulate_train_movement(
+    interval_seconds: int = Query(5, ge=1, description="Seconds of movement to simulate"),
+    db=Depends(get_database)
+):
+    """Move every train by one simulation tick"""
+    result = await simulation_service.simulate_train_movement(db, interval_seconds=interval_seconds)
     
     return {
         "message": "Train movement simulated successfully",
-        "updated_trains": len(updated_trains)
+        **result
     }
 
 @router.post("/object-theft/{object_id}")
@@ -85,6 +56,8 @@ async def simulate_object_theft(
         {"id": object_id},
         {"$set": {"location.coordinates": [new_lon, new_lat]}}
     )
+    broadcaster.publish_position("object", object_id, {"type": "Point", "coordinates": [new_lon, new_lat]}, obj["trainNumber"])
+    position_history.record("object", object_id, [new_lon, new_lat])
     
     # Check for theft alert
     await check_object_theft(object_id, db)
@@ -113,54 +86,75 @@ async def simulate_object_theft(
 async def simulate_full_journey(
     train_number: str,
     destination_station: str,
-    duration_minutes: int = Query(30, description="Duration of journey simulation in minutes"),
-    interval_seconds: int = Query(30, description="Interval between updates in seconds"),
+    duration_minutes: int = Query(30, ge=1, description="Duration of journey simulation in minutes"),
+    interval_seconds: int = Query(30, ge=1, description="Interval between updates in seconds"),
     db=Depends(get_database)
 ):
-    """Simulate a full journey from current location to destination station"""
+    """Start a server-side journey from the train's current location to a destination station"""
     train = await db.trains.find_one({"number": train_number})
     if not train:
         raise HTTPException(status_code=404, detail="Train not found")
     
-    destination = await db.stations.find_one({"code": destination_station})
+    destination = await reference_cache.get_station(db, destination_station)
     if not destination:
         raise HTTPException(status_code=404, detail="Destination station not found")
     
-    # Calculate total distance and bearing to destination
+    journey = await journey_scheduler.start_journey(db, train, destination, duration_minutes, interval_seconds)
+    
     start_coords = train["location"]["coordinates"]
     dest_coords = destination["location"]["coordinates"]
     
-    total_distance = haversine_distance(
-        start_coords[1], start_coords[0],
-        dest_coords[1], dest_coords[0]
-    )
-    
-    # Calculate required speed to reach destination in given time
-    required_speed = (total_distance / duration_minutes) * 60  # km/h
-    
-    # Calculate bearing to destination
-    y = math.sin(dest_coords[0] - start_coords[0]) * math.cos(dest_coords[1])
-    x = math.cos(start_coords[1]) * math.sin(dest_coords[1]) - \
-        math.sin(start_coords[1]) * math.cos(dest_coords[1]) * math.cos(dest_coords[0] - start_coords[0])
-    bearing = (math.atan2(y, x) * 180 / math.pi + 360) % 360
-    
-    # Update train with new speed and direction
-    await db.trains.update_one(
-        {"number": train_number},
-        {"$set": {"speed": required_speed, "direction": bearing}}
-    )
-    
     return {
         "message": f"Journey simulation started",
+        "journey_id": journey["id"],
         "train": train_number,
         "destination": destination["name"],
-        "distance_km": total_distance,
+        "distance_km": journey["distanceKm"],
         "duration_minutes": duration_minutes,
-        "speed_kmh": required_speed,
-        "direction_degrees": bearing,
-        "updates_count": duration_minutes * 60 // interval_seconds
+        "speed_kmh": journey["speedKmh"],
+        "direction_degrees": bearing_between_points(start_coords[1], start_coords[0], dest_coords[1], dest_coords[0]),
+        "updates_count": journey["totalSteps"]
     }
 
+@router.get("/journeys")
+async def get_journeys(
+    status: Optional[str] = Query(None, description="Filter by status: running, paused, completed or cancelled")
+):
+    """List running, paused and recently finished journeys"""
+    return journey_scheduler.list(status)
+
+@router.get("/journeys/{journey_id}")
+async def get_journey(journey_id: str):
+    """Get a journey by ID"""
+    journey = journey_scheduler.get(journey_id)
+    if not journey:
+        raise HTTPException(status_code=404, detail="Journey not found")
+    return journey
+
+@router.post("/journeys/{journey_id}/pause")
+async def pause_journey(journey_id: str):
+    """Pause a running journey"""
+    journey = journey_scheduler.pause(journey_id)
+    if not journey:
+        raise HTTPException(status_code=409, detail="Journey is not running")
+    return journey
+
+@router.post("/journeys/{journey_id}/resume")
+async def resume_journey(journey_id: str):
+    """Resume a paused journey"""
+    journey = journey_scheduler.resume(journey_id)
+    if not journey:
+        raise HTTPException(status_code=409, detail="Journey is not paused")
+    return journey
+
+@router.post("/journeys/{journey_id}/cancel")
+async def cancel_journey(journey_id: str):
+    """Cancel a running or paused journey, leaving the train where it is"""
+    journey = journey_scheduler.cancel(journey_id)
+    if not journey:
+        raise HTTPException(status_code=409, detail="Journey is not active")
+    return journey
+
 @router.post("/random-events")
 async def simulate_random_events(
     theft_probability: float = Query(0.2, description="Probability of theft event (0-1)"),
@@ -192,6 +186,8 @@ async def simulate_random_events(
                     {"id": random_object["id"]},
                     {"$set": {"location.coordinates": [new_lon, new_lat]}}
                 )
+                broadcaster.publish_position("object", random_object["id"], {"type": "Point", "coordinates": [new_lon, new_lat]}, random_object["trainNumber"])
+                position_history.record("object", random_object["id"], [new_lon, new_lat])
                 
                 await check_object_theft(random_object["id"], db)
                 
@@ -228,6 +224,8 @@ async def simulate_random_events(
                     {"trainNumber": random_train["number"]},
                     {"$set": {"location.coordinates": [new_lon, new_lat]}}
                 )
+                broadcaster.publish_position("train", random_train["number"], {"type": "Point", "coordinates": [new_lon, new_lat]}, random_train["number"])
+                position_history.record("train", random_train["number"], [new_lon, new_lat])
                 
                 await check_station_proximity(random_train["number"], db)
                 
@@ -1,22 +1,37 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import List, Optional
 from bson.objectid import ObjectId
 
 from app.models import Station, StationCreate, StationUpdate
 from app.db.connection import get_database
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, find_page, parse_fields, projected_response, set_next_cursor
+from app.services.station_index import station_index
+from app.services.reference_cache import reference_cache
 
 router = APIRouter()
 
 @router.get("/", response_model=List[Station])
-async def get_stations(db=Depends(get_database)):
-    """Get all stations"""
-    stations = await db.stations.find().to_list(1000)
+async def get_stations(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of results"),
+    cursor: Optional[str] = Query(None, description="Continuation token from the X-Next-Cursor header"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    db=Depends(get_database)
+):
+    """Get stations ordered by code, one page at a time"""
+    fields = parse_fields(fields)
+    stations, next_cursor = await find_page(db.stations, {}, [("code", 1)], limit, cursor, fields)
+    
+    if fields:
+        return projected_response(stations, fields, next_cursor)
+    
+    set_next_cursor(response, next_cursor)
     return stations
 
 @router.get("/{station_code}", response_model=Station)
 async def get_station(station_code: str, db=Depends(get_database)):
     """Get a specific station by code"""
-    station = await db.stations.find_one({"code": station_code})
+    station = await reference_cache.get_station(db, station_code)
     if not station:
         raise HTTPException(status_code=404, detail="Station not found")
     return station
@@ -32,7 +47,12 @@ async def create_station(station: StationCreate, db=Depends(get_database)):
         raise HTTPException(status_code=400, detail="Station with this code already exists")
     
     result = await db.stations.insert_one(station_dict)
+    reference_cache.invalidate_station(station.code)
     created_station = await db.stations.find_one({"_id": result.inserted_id})
+    
+    # Keep the proximity index in sync
+    station_index.upsert(created_station)
+    
     return created_station
 
 @router.put("/{station_code}", response_model=Station)
@@ -47,19 +67,28 @@ async def update_station(station_code: str, station_update: StationUpdate, db=De
         {"code": station_code},
         {"$set": update_data}
     )
+    reference_cache.invalidate_station(station_code)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Station not found")
     
     updated_station = await db.stations.find_one({"code": station_code})
+    
+    # Keep the proximity index in sync
+    station_index.upsert(updated_station)
+    
     return updated_station
 
 @router.delete("/{station_code}")
 async def delete_station(station_code: str, db=Depends(get_database)):
     """Delete a station"""
     result = await db.stations.delete_one({"code": station_code})
+    reference_cache.invalidate_station(station_code)
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Station not found")
     
+    # Keep the proximity index in sync
+    station_index.remove(station_code)
+    
     return {"message": "Station deleted successfully"}
\ No newline at end of file
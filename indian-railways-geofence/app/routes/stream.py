@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
+import json
+
+from app.services.broadcaster import broadcaster
+from app.utils.db import format_mongo_doc
+
+# Seconds between keep-alive comments on an idle stream
+STREAM_KEEPALIVE_SECONDS = 15
+
+router = APIRouter()
+
+def _encode_event(event):
+    """Encode an event in Server-Sent Events format"""
+    data = format_mongo_doc(dict(event["data"]))
+    return f"event: {event['event']}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    train_number: Optional[str] = Query(None, description="Only events for this train"),
+    station_code: Optional[str] = Query(None, description="Only alerts for this station"),
+    alert_type: Optional[str] = Query(None, description="Only alerts of this type: 'station_proximity' or 'theft'")
+):
+    """
+    Stream alert and position changes as Server-Sent Events
+
+    Event types are alert_opened, alert_resolved, train_position,
+    object_position and resync (events were dropped, reload via the REST
+    endpoints).
+    """
+    subscription = broadcaster.subscribe(train_number, station_code, alert_type)
+
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _encode_event(event)
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
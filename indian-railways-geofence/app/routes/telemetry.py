@@ -0,0 +1,147 @@
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+import asyncio
+import json
+import os
+
+from app.models import LocationFix
+from app.db.connection import get_database
+from app.services.ingestion import ingest_train_fixes, ingest_object_fixes
+from app.utils.db import format_mongo_doc
+
+# Telemetry stream settings
+TELEMETRY_MAX_BATCH = int(os.getenv("TELEMETRY_MAX_BATCH", 500))  # messages per ingestion batch
+TELEMETRY_QUEUE_SIZE = int(os.getenv("TELEMETRY_QUEUE_SIZE", 5000))  # buffered messages per connection
+
+router = APIRouter()
+
+def _parse_message(message):
+    """
+    Parse one position message
+
+    Returns (kind, seq, fix) or raises ValueError
+    """
+    if not isinstance(message, dict):
+        raise ValueError("Message must be a JSON object")
+
+    kind = message.get("kind")
+    if kind not in ("train", "object"):
+        raise ValueError("kind must be 'train' or 'object'")
+
+    try:
+        fix = LocationFix(**{k: v for k, v in message.items() if k not in ("kind", "seq")})
+    except ValidationError as e:
+        raise ValueError(str(e))
+
+    return kind, message.get("seq"), fix
+
+async def _process_batch(websocket, db, frames):
+    """Ingest a batch of received frames and send acks and alerts back"""
+    replies = []
+    parsed = {"train": [], "object": []}
+
+    for frame in frames:
+        try:
+            messages = json.loads(frame)
+        except json.JSONDecodeError:
+            replies.append({"type": "error", "detail": "Invalid JSON"})
+            continue
+
+        # A frame can carry a single message or a list of them
+        if not isinstance(messages, list):
+            messages = [messages]
+
+        for message in messages:
+            try:
+                kind, seq, fix = _parse_message(message)
+            except ValueError as e:
+                seq = message.get("seq") if isinstance(message, dict) else None
+                replies.append({"type": "error", "seq": seq, "detail": str(e)})
+                continue
+            parsed[kind].append((seq, fix))
+
+    acks = []
+    alerts = []
+
+    for kind, ingest in (("train", ingest_train_fixes), ("object", ingest_object_fixes)):
+        if not parsed[kind]:
+            continue
+
+        try:
+            results, opened = await ingest(db, [fix for _, fix in parsed[kind]])
+        except Exception as e:
+            # Nothing in the batch is acknowledged, so the client can resend it
+            print(f"Telemetry ingestion failed: {e!r}")
+            replies.append({
+                "type": "error",
+                "kind": kind,
+                "seqs": [seq for seq, _ in parsed[kind]],
+                "detail": "Ingestion failed, resend these fixes"
+            })
+            continue
+        for (seq, _), result in zip(parsed[kind], results):
+            acks.append({"seq": seq, "kind": kind, "id": result["id"], "status": result["status"]})
+        alerts.extend(opened)
+
+    if acks:
+        replies.append({"type": "ack", "results": acks})
+
+    for alert in alerts:
+        alert = format_mongo_doc(dict(alert))
+        replies.append({"type": "alert", "alert": alert})
+
+    for reply in replies:
+        await websocket.send_json(reply)
+
+@router.websocket("/ws")
+async def telemetry_stream(websocket: WebSocket, db=Depends(get_database)):
+    """
+    Stream position fixes over a persistent connection
+
+    Each message is a JSON object {"kind": "train" | "object", "id",
+    "timestamp", "lon", "lat", "seq"} or a list of them. Messages that
+    arrive while a batch is being processed are ingested together. Replies
+    are "ack" messages with per-fix outcomes, "alert" messages for every
+    alert the fixes opened and "error" messages; an error listing "seqs"
+    means those fixes were not ingested and should be resent.
+    """
+    await websocket.accept()
+
+    queue = asyncio.Queue(maxsize=TELEMETRY_QUEUE_SIZE)
+
+    async def receive_frames():
+        try:
+            while True:
+                await queue.put(await websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            # e.g. a binary frame, which receive_text cannot read
+            print(f"Telemetry stream receive failed: {e!r}")
+
+        # Wake the batching loop however receiving stopped
+        await queue.put(None)
+
+    receiver = asyncio.create_task(receive_frames())
+
+    try:
+        closed = False
+        while not closed:
+            frame = await queue.get()
+            if frame is None:
+                break
+
+            # Drain whatever else has arrived into the same batch
+            frames = [frame]
+            while len(frames) < TELEMETRY_MAX_BATCH and not queue.empty():
+                frame = queue.get_nowait()
+                if frame is None:
+                    closed = True
+                    break
+                frames.append(frame)
+
+            await _process_batch(websocket, db, frames)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
@@ -1,17 +1,36 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import List, Optional
 from bson.objectid import ObjectId
+from datetime import datetime, timedelta
 
-from app.models import Train, TrainCreate, TrainUpdate, GeoPoint
+from app.models import Train, TrainCreate, TrainUpdate, GeoPoint, LocationFix
 from app.db.connection import get_database
-from app.services.geo_fencing import check_station_proximity
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, find_page, parse_fields, projected_response, set_next_cursor
+from app.services.geofence_queue import geofence_queue
+from app.services.broadcaster import broadcaster
+from app.services.reference_cache import reference_cache
+from app.services.position_history import position_history, naive_utc
+from app.utils.trajectory import zoom_tolerance
+from app.services.ingestion import ingest_train_fixes
 
 router = APIRouter()
 
 @router.get("/", response_model=List[Train])
-async def get_trains(db=Depends(get_database)):
-    """Get all trains"""
-    trains = await db.trains.find().to_list(1000)
+async def get_trains(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of results"),
+    cursor: Optional[str] = Query(None, description="Continuation token from the X-Next-Cursor header"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    db=Depends(get_database)
+):
+    """Get trains ordered by number, one page at a time"""
+    fields = parse_fields(fields)
+    trains, next_cursor = await find_page(db.trains, {}, [("number", 1)], limit, cursor, fields)
+    
+    if fields:
+        return projected_response(trains, fields, next_cursor)
+    
+    set_next_cursor(response, next_cursor)
     return trains
 
 @router.get("/{train_number}", response_model=Train)
@@ -22,6 +41,45 @@ async def get_train(train_number: str, db=Depends(get_database)):
         raise HTTPException(status_code=404, detail="Train not found")
     return train
 
+@router.get("/{train_number}/track")
+async def get_train_track(
+    train_number: str,
+    start: Optional[datetime] = Query(None, description="Start of the time range (default: one hour before end)"),
+    end: Optional[datetime] = Query(None, description="End of the time range (default: now)"),
+    tolerance_m: Optional[float] = Query(None, gt=0, description="Simplify the track to within this many metres"),
+    zoom: Optional[int] = Query(None, ge=0, le=24, description="Simplify the track for display at this map zoom level"),
+    db=Depends(get_database)
+):
+    """
+    Get a train's recorded positions over a time range, oldest first
+    
+    With tolerance_m or zoom the track is simplified with Douglas-Peucker;
+    zoom picks a tolerance of one screen pixel at the train's latitude.
+    """
+    train = await reference_cache.get_train(db, train_number)
+    if not train:
+        raise HTTPException(status_code=404, detail="Train not found")
+    
+    end = naive_utc(end) if end else datetime.now()
+    start = naive_utc(start) if start else end - timedelta(hours=1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    if tolerance_m is None and zoom is not None:
+        position = await db.trains.find_one({"number": train_number}, {"_id": 0, "location": 1})
+        tolerance_m = zoom_tolerance(zoom, position["location"]["coordinates"][1]) * 1000
+    
+    tolerance_km = tolerance_m / 1000 if tolerance_m else None
+    fixes = await position_history.get_track(db, "train", train_number, start, end, tolerance_km)
+    
+    return {
+        "trainNumber": train_number,
+        "start": start,
+        "end": end,
+        "tolerance_m": tolerance_m,
+        "points": [{"timestamp": timestamp, "coordinates": [lon, lat]} for timestamp, lon, lat in fixes]
+    }
+
 @router.post("/", response_model=Train)
 async def create_train(train: TrainCreate, db=Depends(get_database)):
     """Create a new train"""
@@ -33,6 +91,7 @@ async def create_train(train: TrainCreate, db=Depends(get_database)):
         raise HTTPException(status_code=400, detail="Train with this number already exists")
     
     result = await db.trains.insert_one(train_dict)
+    reference_cache.invalidate_train(train.number)
     created_train = await db.trains.find_one({"_id": result.inserted_id})
     return created_train
 
@@ -48,6 +107,7 @@ async def update_train(train_number: str, train_update: TrainUpdate, db=Depends(
         {"number": train_number},
         {"$set": update_data}
     )
+    reference_cache.invalidate_train(train_number)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Train not found")
@@ -73,16 +133,29 @@ async def update_train_location(train_number: str, location: GeoPoint, db=Depend
     )
     
     updated_train = await db.trains.find_one({"number": train_number})
+    broadcaster.publish_position("train", train_number, location.dict(), train_number)
+    position_history.record("train", train_number, location.coordinates)
     
-    # Check for station proximity
-    await check_station_proximity(train_number, db)
+    # Check for station proximity in the background
+    await geofence_queue.submit("train", train_number, db)
     
     return updated_train
 
+@router.post("/locations/batch")
+async def update_train_locations(fixes: List[LocationFix], db=Depends(get_database)):
+    """Update many trains' locations from a batch of GPS fixes"""
+    results, _ = await ingest_train_fixes(db, fixes)
+    
+    return {
+        "accepted": sum(1 for result in results if result["status"] == "updated"),
+        "results": results
+    }
+
 @router.delete("/{train_number}")
 async def delete_train(train_number: str, db=Depends(get_database)):
     """Delete a train"""
     result = await db.trains.delete_one({"number": train_number})
+    reference_cache.invalidate_train(train_number)
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Train not found")
@@ -1,16 +1,39 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import List, Optional
 from bson.objectid import ObjectId
 
 from app.models import User, UserCreate, UserUpdate
 from app.db.connection import get_database
+from app.services.reference_cache import reference_cache
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, find_page, parse_fields, projected_response, set_next_cursor
+from app.utils.serialization import DocumentEncoder, FastJSONResponse
 
 router = APIRouter()
 
+user_encoder = DocumentEncoder(User)
+
 @router.get("/", response_model=List[User])
-async def get_users(db=Depends(get_database)):
-    """Get all users"""
-    users = await db.users.find().to_list(1000)
+async def get_users(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of results"),
+    cursor: Optional[str] = Query(None, description="Continuation token from the X-Next-Cursor header"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    fast: bool = Query(False, description="Skip model validation and encode documents directly"),
+    db=Depends(get_database)
+):
+    """Get users in creation order, one page at a time"""
+    fields = parse_fields(fields)
+    users, next_cursor = await find_page(db.users, {}, [("_id", 1)], limit, cursor, fields)
+    
+    if fields:
+        return projected_response(users, fields, next_cursor, expose_id=True)
+    
+    if fast:
+        response = FastJSONResponse(user_encoder.encode_many(users))
+        set_next_cursor(response, next_cursor)
+        return response
+    
+    set_next_cursor(response, next_cursor)
     return [User(id=str(user["_id"]), **{k: v for k, v in user.items() if k != "_id"}) for user in users]
 
 @router.get("/{user_id}", response_model=User)
@@ -38,13 +61,12 @@ async def create_user(user: UserCreate, db=Depends(get_database)):
     
     # Verify train and coach if provided
     if user.currentTrain:
-        train = await db.trains.find_one({"number": user.currentTrain})
+        train = await reference_cache.get_train(db, user.currentTrain)
         if not train:
             raise HTTPException(status_code=404, detail="Train not found")
         
         if user.currentCoach:
-            coach_exists = any(coach["id"] == user.currentCoach for coach in train["coaches"])
-            if not coach_exists:
+            if user.currentCoach not in train["coaches"]:
                 raise HTTPException(status_code=404, detail="Coach not found in train")
     
     result = await db.users.insert_one(user_dict)
@@ -84,13 +106,12 @@ async def update_user(user_id: str, user_update: UserUpdate, db=Depends(get_data
     
     # Verify train and coach if provided
     if "currentTrain" in update_data:
-        train = await db.trains.find_one({"number": update_data["currentTrain"]})
+        train = await reference_cache.get_train(db, update_data["currentTrain"])
         if not train:
             raise HTTPException(status_code=404, detail="Train not found")
         
         if "currentCoach" in update_data:
-            coach_exists = any(coach["id"] == update_data["currentCoach"] for coach in train["coaches"])
-            if not coach_exists:
+            if update_data["currentCoach"] not in train["coaches"]:
                 raise HTTPException(status_code=404, detail="Coach not found in train")
     
     result = await db.users.update_one(
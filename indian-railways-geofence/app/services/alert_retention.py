@@ -0,0 +1,213 @@
+import asyncio
+import gzip
+import os
+from datetime import date, datetime, timedelta, timezone
+
+from bson import json_util
+from bson.objectid import ObjectId
+from fastapi import HTTPException
+
+from app.utils.pagination import decode_cursor, encode_cursor, find_page
+
+# Archive settings
+ALERT_ARCHIVE_AFTER_DAYS = float(os.getenv("ALERT_ARCHIVE_AFTER_DAYS", 7))  # 0 disables archiving
+ALERT_ARCHIVE_DIR = os.getenv("ALERT_ARCHIVE_DIR", "data/alert_archive")
+ALERT_ARCHIVE_INTERVAL = float(os.getenv("ALERT_ARCHIVE_INTERVAL", 3600))  # seconds
+ALERT_ARCHIVE_BATCH_SIZE = int(os.getenv("ALERT_ARCHIVE_BATCH_SIZE", 5000))
+
+ALERT_SORT = [("timestamp", -1), ("_id", -1)]
+
+def archivable_query(cutoff):
+    """Filter for resolved alerts that were resolved before the cutoff"""
+    return {"$or": [
+        {"resolved": True, "resolvedAt": {"$lt": cutoff}},
+        # Alerts resolved before resolvedAt was recorded
+        {"resolved": True, "resolvedAt": None, "timestamp": {"$lt": cutoff}}
+    ]}
+
+def partition_path(directory, day):
+    return os.path.join(directory, f"alerts-{day.isoformat()}.jsonl.gz")
+
+def _partition_day(name):
+    """Get the day a partition file covers, or None for other files"""
+    if not (name.startswith("alerts-") and name.endswith(".jsonl.gz")):
+        return None
+    try:
+        return date.fromisoformat(name[len("alerts-"):-len(".jsonl.gz")])
+    except ValueError:
+        return None
+
+def write_partitions(directory, alerts):
+    """
+    Append alerts to the gzip JSONL partition of the day they were raised
+
+    Returns the days that were written.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    by_day = {}
+    for alert in alerts:
+        by_day.setdefault(alert["timestamp"].date(), []).append(alert)
+
+    for day, day_alerts in by_day.items():
+        with gzip.open(partition_path(directory, day), "at", encoding="utf-8") as f:
+            f.writelines(json_util.dumps(alert) + "\n" for alert in day_alerts)
+
+    return sorted(by_day)
+
+def read_partitions(directory, since, filters=None, before=None, limit=None):
+    """
+    Read archived alerts raised at or after since, newest first
+
+    filters are matched by equality. before is a (timestamp, _id) key;
+    only alerts that come after it in newest-first order are returned.
+    Partitions are read from the newest day back, and with a limit no
+    older partition is opened once that many alerts have been found.
+    """
+    if not os.path.isdir(directory):
+        return []
+
+    # Stored timestamps are naive UTC, as MongoDB returns them
+    if since.tzinfo:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+    alerts = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        day = _partition_day(name)
+        if day is None or (before and day > before[0].date()):
+            continue
+        # Every older partition is outside the window too
+        if day < since.date() or (limit and len(alerts) >= limit):
+            break
+
+        with gzip.open(os.path.join(directory, name), "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    try:
+                        alert = json_util.loads(line)
+                    except ValueError:
+                        # Partially written line from an append in progress
+                        continue
+                    if alert["timestamp"] < since:
+                        continue
+                    if filters and any(alert.get(key) != value for key, value in filters.items()):
+                        continue
+                    if before and (alert["timestamp"], alert["_id"]) >= before:
+                        continue
+                    alerts.append(alert)
+            except EOFError:
+                # Partially written gzip member from an append in progress
+                pass
+
+    alerts.sort(key=lambda alert: (alert["timestamp"], alert["_id"]), reverse=True)
+    return alerts[:limit] if limit else alerts
+
+
+class AlertArchiver:
+    """
+    Moves old resolved alerts out of MongoDB into compressed daily files
+
+    Alerts are written to disk before they are deleted, so a crash can
+    only leave an alert in both places, never in neither; readers drop the
+    duplicates. Alert rollups are left alone, so rollup-based stats still
+    count archived alerts.
+    """
+
+    def __init__(self, directory=ALERT_ARCHIVE_DIR, after_days=ALERT_ARCHIVE_AFTER_DAYS,
+                 interval=ALERT_ARCHIVE_INTERVAL, batch_size=ALERT_ARCHIVE_BATCH_SIZE):
+        self.directory = directory
+        self.after_days = after_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = None
+        self.runs = 0
+        self.archived = 0
+        self.last_run = None
+
+    async def start(self, db):
+        """Start archiving in the background"""
+        if self._task or self.after_days <= 0:
+            return
+        self._task = asyncio.create_task(self._loop(db))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self, db):
+        while True:
+            try:
+                await self.archive(db)
+            except Exception as e:
+                print(f"Alert archiving failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def archive(self, db, now=None):
+        """Archive every resolved alert past the retention window, returns the count"""
+        cutoff = (now or datetime.now()) - timedelta(days=self.after_days)
+        query = archivable_query(cutoff)
+
+        total = 0
+        while True:
+            alerts = await db.alerts.find(query).sort("timestamp", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not alerts:
+                break
+
+            await asyncio.to_thread(write_partitions, self.directory, alerts)
+            await db.alerts.delete_many({"_id": {"$in": [alert["_id"] for alert in alerts]}})
+            total += len(alerts)
+
+            if len(alerts) < self.batch_size:
+                break
+
+        self.runs += 1
+        self.archived += total
+        self.last_run = datetime.now()
+        if total:
+            print(f"Archived {total} resolved alerts to {self.directory}")
+
+        return total
+
+    async def find_page(self, db, query, since, limit, cursor=None, fields=None):
+        """
+        Page through hot and archived alerts together, newest first
+
+        query may only hold equality filters besides the since bound on
+        timestamp, which is what GET /alerts builds.
+        """
+        hot, hot_cursor = await find_page(db.alerts, query, ALERT_SORT, limit, cursor, fields)
+
+        filters = {key: value for key, value in query.items() if key != "timestamp"}
+        before = tuple(decode_cursor(cursor)) if cursor else None
+        # Archived partitions are keyed by day, so the cursor must be an alert key
+        if before and not (isinstance(before[0], datetime) and isinstance(before[1], ObjectId)):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # One more than a page tells the merge whether older archived alerts remain
+        archived = await asyncio.to_thread(read_partitions, self.directory, since, filters, before, limit + 1)
+
+        merged = {}
+        for alert in hot + archived:
+            merged.setdefault(alert["_id"], alert)
+        alerts = sorted(merged.values(), key=lambda alert: (alert["timestamp"], alert["_id"]), reverse=True)
+
+        # More remain if the merge overflowed or the hot page was not the last
+        next_cursor = None
+        if len(alerts) > limit or hot_cursor:
+            alerts = alerts[:limit]
+            next_cursor = encode_cursor([alerts[-1]["timestamp"], alerts[-1]["_id"]])
+
+        return alerts, next_cursor
+
+    def stats(self):
+        return {
+            "running": self._task is not None,
+            "runs": self.runs,
+            "archived": self.archived,
+            "last_run": self.last_run
+        }
+
+
+# Shared archiver started with the application
+alert_archiver = AlertArchiver()
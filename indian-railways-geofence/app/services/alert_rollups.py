@@ -0,0 +1,129 @@
+import os
+
+from pymongo import UpdateOne
+
+from app.db.indexes import INDEXES
+
+# Where alert stats are computed from: "rollups" (hourly buckets) or "raw" (alerts)
+ALERT_STATS_SOURCE = os.getenv("ALERT_STATS_SOURCE", "rollups")
+
+ROLLUP_KEY_FIELDS = ["hour", "type", "trainNumber", "stationCode", "resolved"]
+
+def _hour(timestamp):
+    """Truncate a timestamp to the start of its hour"""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def _bucket(alert, resolved):
+    """Get the rollup bucket key an alert is counted in"""
+    return {
+        "hour": _hour(alert["timestamp"]),
+        "type": alert["type"],
+        "trainNumber": alert["trainNumber"],
+        "stationCode": alert.get("stationCode"),
+        "resolved": resolved
+    }
+
+def rollup_operations(opened=(), resolved=()):
+    """
+    Build the rollup updates for alerts that were opened or resolved
+
+    Alerts are bucketed by the hour they were raised in, so resolving one
+    moves a count from its unresolved bucket to its resolved bucket.
+    """
+    operations = []
+
+    for alert in opened:
+        operations.append(UpdateOne(
+            _bucket(alert, alert["resolved"]),
+            {"$inc": {"count": 1}, "$setOnInsert": {"trainName": alert["trainName"]}},
+            upsert=True
+        ))
+
+    for alert in resolved:
+        operations.append(UpdateOne(
+            _bucket(alert, False),
+            {"$inc": {"count": -1}}
+        ))
+        operations.append(UpdateOne(
+            _bucket(alert, True),
+            {"$inc": {"count": 1}, "$setOnInsert": {"trainName": alert["trainName"]}},
+            upsert=True
+        ))
+
+    return operations
+
+async def record_alert_changes(db, opened=(), resolved=()):
+    """Apply the rollup updates for opened and resolved alerts"""
+    operations = rollup_operations(opened, resolved)
+    if operations:
+        await db.alert_rollups.bulk_write(operations, ordered=False)
+
+async def get_rollup_stats(db, since_date):
+    """
+    Get alert counts since a date by summing hourly rollup buckets
+
+    The window starts at the beginning of the hour containing since_date.
+    """
+    pipeline = [
+        {"$match": {"hour": {"$gte": _hour(since_date)}}},
+        {"$facet": {
+            "by_type": [
+                {"$group": {"_id": "$type", "count": {"$sum": "$count"}}}
+            ],
+            "by_status": [
+                {"$group": {"_id": "$resolved", "count": {"$sum": "$count"}}}
+            ],
+            "by_train": [
+                {"$group": {
+                    "_id": "$trainNumber",
+                    "trainName": {"$first": "$trainName"},
+                    "alertCount": {"$sum": "$count"}
+                }},
+                {"$match": {"alertCount": {"$gt": 0}}},
+                {"$sort": {"alertCount": -1, "_id": 1}}
+            ]
+        }}
+    ]
+
+    return (await db.alert_rollups.aggregate(pipeline).to_list(1))[0]
+
+async def ensure_rollups(db):
+    """Backfill the rollups if they have never been built"""
+    if await db.alert_rollups.estimated_document_count() == 0 and \
+            await db.alerts.estimated_document_count() > 0:
+        buckets = await rebuild_rollups(db)
+        print(f"Alert rollups backfilled with {buckets} buckets")
+
+async def rebuild_rollups(db):
+    """Rebuild the rollup collection from the raw alerts"""
+    pipeline = [
+        {"$group": {
+            "_id": {
+                "hour": {"$dateFromParts": {
+                    "year": {"$year": "$timestamp"},
+                    "month": {"$month": "$timestamp"},
+                    "day": {"$dayOfMonth": "$timestamp"},
+                    "hour": {"$hour": "$timestamp"}
+                }},
+                "type": "$type",
+                "trainNumber": "$trainNumber",
+                "stationCode": {"$ifNull": ["$stationCode", None]},
+                "resolved": "$resolved"
+            },
+            "trainName": {"$first": "$trainName"},
+            "count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            **{field: f"$_id.{field}" for field in ROLLUP_KEY_FIELDS},
+            "trainName": 1,
+            "count": 1
+        }},
+        # Atomically replace the existing rollups
+        {"$out": "alert_rollups"}
+    ]
+
+    await db.alerts.aggregate(pipeline).to_list(None)
+    await db.alert_rollups.create_indexes(INDEXES["alert_rollups"])
+
+    return await db.alert_rollups.count_documents({})
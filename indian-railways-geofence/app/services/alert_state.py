@@ -0,0 +1,68 @@
+class ActiveAlertTable:
+    """
+    In-process table of open (unresolved) alerts
+
+    Station proximity alerts are keyed by (trainNumber, stationCode) and
+    theft alerts by objectId, so the geo-fencing checks can answer
+    "already alerted?" without querying MongoDB. The table is loaded from
+    the alerts collection at startup and is authoritative for this process;
+    every code path that opens or resolves an alert must update it.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self._station = {}  # trainNumber -> {stationCode: alert}
+        self._theft = {}  # objectId -> alert
+
+    def __len__(self):
+        return len(self._theft) + sum(len(alerts) for alerts in self._station.values())
+
+    async def load(self, db):
+        """(Re)build the table from the unresolved alerts in the database"""
+        alerts = await db.alerts.find({"resolved": False}).to_list(None)
+
+        self._station = {}
+        self._theft = {}
+        for alert in alerts:
+            self.add(alert)
+
+        self.loaded = True
+        print(f"Active alert table loaded with {len(self)} open alerts")
+
+    def add(self, alert):
+        """Record an open alert"""
+        if alert["type"] == "station_proximity":
+            self._station.setdefault(alert["trainNumber"], {})[alert["stationCode"]] = alert
+        elif alert["type"] == "theft":
+            self._theft[alert["objectId"]] = alert
+
+    def discard(self, alert):
+        """Forget an alert once it has been resolved"""
+        if alert["type"] == "station_proximity":
+            self.discard_station_alert(alert["trainNumber"], alert["stationCode"])
+        elif alert["type"] == "theft":
+            self.discard_theft_alert(alert["objectId"])
+
+    def station_alerts(self, train_number):
+        """Get the open station alerts for a train, keyed by station code"""
+        return dict(self._station.get(train_number, {}))
+
+    def discard_station_alert(self, train_number, station_code):
+        alerts = self._station.get(train_number)
+        if alerts is None:
+            return
+
+        alerts.pop(station_code, None)
+        if not alerts:
+            del self._station[train_number]
+
+    def theft_alert(self, object_id):
+        """Get the open theft alert for an object, if any"""
+        return self._theft.get(object_id)
+
+    def discard_theft_alert(self, object_id):
+        self._theft.pop(object_id, None)
+
+
+# Shared table used by the geo-fencing service and the alert routes
+alert_state = ActiveAlertTable()
@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
 
+from app.services.alert_rollups import ALERT_STATS_SOURCE, get_rollup_stats
+
 async def get_active_alerts(db, alert_type=None, train_number=None):
     """Get all active (unresolved) alerts with optional filters"""
     query = {"resolved": False}
@@ -42,51 +44,45 @@ async def get_alerts_by_user(db, user_id):
     
     return all_alerts
 
+async def _get_raw_stats(db, since_date):
+    """Compute every breakdown in a single pass over the raw alerts"""
+    pipeline = [
+        {"$match": {"timestamp": {"$gte": since_date}}},
+        {"$facet": {
+            "by_type": [
+                {"$group": {"_id": "$type", "count": {"$sum": 1}}}
+            ],
+            "by_status": [
+                {"$group": {"_id": "$resolved", "count": {"$sum": 1}}}
+            ],
+            "by_train": [
+                {"$group": {
+                    "_id": "$trainNumber",
+                    "trainName": {"$first": "$trainName"},
+                    "alertCount": {"$sum": 1}
+                }},
+                # Sort trains by alert count
+                {"$sort": {"alertCount": -1, "_id": 1}}
+            ]
+        }}
+    ]
+    
+    return (await db.alerts.aggregate(pipeline).to_list(1))[0]
+
 async def get_alert_stats(db, days=7):
     """Get alert statistics for the specified number of days"""
     since_date = datetime.now() - timedelta(days=days)
     
-    # Get counts by type
-    station_alerts = await db.alerts.count_documents({
-        "type": "station_proximity",
-        "timestamp": {"$gte": since_date}
-    })
-    
-    theft_alerts = await db.alerts.count_documents({
-        "type": "theft",
-        "timestamp": {"$gte": since_date}
-    })
-    
-    # Get counts by resolved status
-    resolved = await db.alerts.count_documents({
-        "resolved": True,
-        "timestamp": {"$gte": since_date}
-    })
-    
-    unresolved = await db.alerts.count_documents({
-        "resolved": False,
-        "timestamp": {"$gte": since_date}
-    })
-    
-    # Get alerts by train
-    train_stats = []
-    trains = await db.trains.find().to_list(1000)
+    if ALERT_STATS_SOURCE == "rollups":
+        result = await get_rollup_stats(db, since_date)
+    else:
+        result = await _get_raw_stats(db, since_date)
     
-    for train in trains:
-        count = await db.alerts.count_documents({
-            "trainNumber": train["number"],
-            "timestamp": {"$gte": since_date}
-        })
-        
-        if count > 0:
-            train_stats.append({
-                "trainNumber": train["number"],
-                "trainName": train["name"],
-                "alertCount": count
-            })
+    by_type = {group["_id"]: group["count"] for group in result["by_type"]}
+    by_status = {group["_id"]: group["count"] for group in result["by_status"]}
     
-    # Sort trains by alert count
-    train_stats.sort(key=lambda x: x["alertCount"], reverse=True)
+    station_alerts = by_type.get("station_proximity", 0)
+    theft_alerts = by_type.get("theft", 0)
     
     return {
         "total": station_alerts + theft_alerts,
@@ -95,9 +91,16 @@ async def get_alert_stats(db, days=7):
             "theft": theft_alerts
         },
         "by_status": {
-            "resolved": resolved,
-            "unresolved": unresolved
+            "resolved": by_status.get(True, 0),
+            "unresolved": by_status.get(False, 0)
         },
-        "by_train": train_stats,
+        "by_train": [
+            {
+                "trainNumber": group["_id"],
+                "trainName": group["trainName"],
+                "alertCount": group["alertCount"]
+            }
+            for group in result["by_train"]
+        ],
         "period_days": days
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,102 @@
+import asyncio
+import os
+
+# Events buffered per subscriber before the oldest are dropped
+BROADCAST_BUFFER_SIZE = int(os.getenv("BROADCAST_BUFFER_SIZE", 256))
+
+
+class Subscription:
+    """
+    One subscriber's bounded event buffer
+
+    Filters only apply to events that carry the filtered field, so a
+    station filter still lets train positions through. When the buffer is
+    full the oldest event is dropped and the subscriber receives a "resync"
+    event, telling it to reload its state from the REST endpoints.
+    """
+
+    def __init__(self, train=None, station=None, alert_type=None, maxsize=BROADCAST_BUFFER_SIZE):
+        self.train = train
+        self.station = station
+        self.alert_type = alert_type
+        self.dropped = 0
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._overflowed = False
+
+    def matches(self, event):
+        data = event["data"]
+        if self.train and data.get("trainNumber") not in (None, self.train):
+            return False
+        if self.station and data.get("stationCode") not in (None, self.station):
+            return False
+        if self.alert_type and event["event"].startswith("alert_") and data.get("type") != self.alert_type:
+            return False
+        return True
+
+    def offer(self, event):
+        """Buffer an event without blocking the publisher, returns whether one was dropped"""
+        overflowed = self._queue.full()
+        if overflowed:
+            self._queue.get_nowait()
+            self.dropped += 1
+            self._overflowed = True
+        self._queue.put_nowait(event)
+        return overflowed
+
+    async def get(self):
+        """Wait for the next event"""
+        if self._overflowed:
+            self._overflowed = False
+            return {"event": "resync", "data": {"dropped": self.dropped}}
+        return await self._queue.get()
+
+
+class Broadcaster:
+    """In-process fan-out of alert and position events to stream subscribers"""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self.published = 0
+        self.dropped = 0  # across every subscriber, including ones that have left
+
+    def subscribe(self, train=None, station=None, alert_type=None):
+        subscription = Subscription(train, station, alert_type)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscriptions.discard(subscription)
+
+    def publish(self, event_type, data):
+        """Publish an event to every matching subscriber"""
+        self.published += 1
+        if not self._subscriptions:
+            return
+
+        event = {"event": event_type, "data": data}
+        for subscription in self._subscriptions:
+            if subscription.matches(event) and subscription.offer(event):
+                self.dropped += 1
+
+    def publish_alert(self, alert):
+        """Publish an alert that was opened or resolved"""
+        event_type = "alert_resolved" if alert["resolved"] else "alert_opened"
+        self.publish(event_type, alert)
+
+    def publish_position(self, kind, entity_id, location, train_number=None):
+        """Publish a train or object position change"""
+        data = {"id": entity_id, "location": location}
+        if train_number:
+            data["trainNumber"] = train_number
+        self.publish(f"{kind}_position", data)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscriptions),
+            "published": self.published,
+            "dropped": self.dropped
+        }
+
+
+# Shared broadcaster used by the geo-fencing service and the stream routes
+broadcaster = Broadcaster()
@@ -1,91 +1,265 @@
+import asyncio
 from datetime import datetime
 import os
 
-from app.utils.distance import haversine_distance
+import numpy as np
+from pymongo import InsertOne, UpdateMany
+
+from app.utils.distance import haversine_distance, haversine_one_to_many
 from app.models import AlertCreate
+from app.services.station_index import station_index
+from app.services.alert_state import alert_state
+from app.services.movement_budget import movement_budget
+from app.services.broadcaster import broadcaster
+from app.services.alert_rollups import record_alert_changes
+from app.services.reference_cache import reference_cache
 
 # Get geo-fencing settings from environment variables
 STATION_PROXIMITY_RADIUS = float(os.getenv("STATION_PROXIMITY_RADIUS", 1.0))  # km
 DEFAULT_COACH_GEOFENCE_RADIUS = float(os.getenv("DEFAULT_COACH_GEOFENCE_RADIUS", 0.05))  # km
 
-async def check_station_proximity(train_number, db):
-    """Check if a train is entering a station's proximity radius"""
-    train = await db.trains.find_one({"number": train_number})
-    if not train:
-        return
+# Where candidate stations come from: "index" (in-process station index)
+# or "database" (a $nearSphere query against the stations 2dsphere index)
+STATION_PROXIMITY_MODE = os.getenv("STATION_PROXIMITY_MODE", "index")
+
+# MongoDB measures spherical distances with a slightly larger Earth radius
+# than haversine_distance, so pad the server-side radius and filter again
+GEO_QUERY_RADIUS_PADDING = 1.01
+
+# Skip proximity checks while a train cannot have crossed a station fence.
+# Only used with the in-process station index, whose version tells us when
+# the set of fences has changed.
+MOVEMENT_BUDGET_ENABLED = os.getenv("MOVEMENT_BUDGET_ENABLED", "true").lower() == "true"
+MOVEMENT_BUDGET_HORIZON = float(os.getenv("MOVEMENT_BUDGET_HORIZON", 5.0))  # km
+
+async def find_nearby_stations(coordinates, radius_km, db):
+    """
+    Find stations within radius_km of a [longitude, latitude] point
     
-    stations = await db.stations.find().to_list(1000)
+    Returns a list of (station, distance_km) tuples sorted by distance
+    """
+    lon, lat = coordinates
     
-    for station in stations:
-        train_coords = train["location"]["coordinates"]
-        station_coords = station["location"]["coordinates"]
+    if STATION_PROXIMITY_MODE == "database":
+        stations = await db.stations.find(
+            {
+                "location": {
+                    "$nearSphere": {
+                        "$geometry": {"type": "Point", "coordinates": [lon, lat]},
+                        "$maxDistance": radius_km * 1000 * GEO_QUERY_RADIUS_PADDING  # meters
+                    }
+                }
+            },
+            {"_id": 0, "code": 1, "name": 1, "location": 1}
+        ).to_list(None)
         
-        # Calculate distance using Haversine formula
-        distance = haversine_distance(
-            train_coords[1], train_coords[0],  # lat, lon
-            station_coords[1], station_coords[0]  # lat, lon
+        nearby_stations = []
+        for station in stations:
+            station_coords = station["location"]["coordinates"]
+            distance = haversine_distance(lat, lon, station_coords[1], station_coords[0])
+            if distance <= radius_km:
+                nearby_stations.append((station, distance))
+        
+        return nearby_stations
+    
+    # Load the station index lazily if startup did not build it
+    if not station_index.loaded:
+        await station_index.load(db)
+    
+    return station_index.query_radius(lon, lat, radius_km)
+
+async def _nearby_stations(train, db, use_budget):
+    """
+    Find the stations inside a train's proximity radius
+    
+    Returns None when the movement budget shows the check can be skipped.
+    """
+    train_coords = train["location"]["coordinates"]
+    
+    # Skip the check if the train can't have crossed any fence since the last one
+    if use_budget and movement_budget.can_skip(train["number"], train_coords, station_index.version):
+        return None
+    
+    movement_budget.count_evaluation()
+    
+    # Only the stations near the train need a distance check. When budgeting,
+    # look a little further out to find the distance to the nearest fence.
+    search_radius = STATION_PROXIMITY_RADIUS
+    if use_budget:
+        search_radius += MOVEMENT_BUDGET_HORIZON
+    
+    candidates = await find_nearby_stations(train_coords, search_radius, db)
+    
+    if use_budget:
+        slack = min(
+            [MOVEMENT_BUDGET_HORIZON] +
+            [abs(distance - STATION_PROXIMITY_RADIUS) for _, distance in candidates]
         )
+        movement_budget.record(train["number"], train_coords, slack, station_index.version)
+    
+    return [
+        (station, distance) for station, distance in candidates
+        if distance <= STATION_PROXIMITY_RADIUS
+    ]
+
+def _station_alert_changes(train, nearby_stations):
+    """
+    Compare a train's nearby stations with its open alerts
+    
+    Returns the (station, distance, alert) tuples to open, the open alerts
+    to resolve by station code and the write operations for both.
+    """
+    nearby_codes = {station["code"] for station, _ in nearby_stations}
+    open_alerts = alert_state.station_alerts(train["number"])
+    
+    operations = []
+    new_alerts = []
+    
+    for station, distance in nearby_stations:
+        if station["code"] in open_alerts:
+            continue
         
-        # Check if train is within proximity radius of station
-        if distance <= STATION_PROXIMITY_RADIUS:
-            # Check if we've already alerted for this train-station pair
-            existing_alert = await db.alerts.find_one({
+        # Create new alert
+        alert = AlertCreate(
+            type="station_proximity",
+            trainNumber=train["number"],
+            trainName=train["name"],
+            stationCode=station["code"],
+            stationName=station["name"],
+            distance=distance,
+            timestamp=datetime.now(),
+            resolved=False
+        )
+        alert_dict = alert.dict()
+        operations.append(InsertOne(alert_dict))
+        new_alerts.append((station, distance, alert_dict))
+    
+    # Resolve alerts for every station the train is no longer near
+    resolved_alerts = {code: alert for code, alert in open_alerts.items() if code not in nearby_codes}
+    if resolved_alerts:
+        operations.append(UpdateMany(
+            {
                 "type": "station_proximity",
                 "trainNumber": train["number"],
-                "stationCode": station["code"],
+                "stationCode": {"$in": list(resolved_alerts)},
                 "resolved": False
-            })
+            },
+            {
+                "$set": {"resolved": True, "resolvedAt": datetime.now()}
+            }
+        ))
+    
+    return new_alerts, resolved_alerts, operations
+
+async def check_station_proximity(train_number, db, train=None):
+    """
+    Check if a train is entering a station's proximity radius
+    
+    Callers that already hold the train document can pass it in to save
+    a round-trip. Returns the alerts opened by this check.
+    """
+    if train is None:
+        train = await db.trains.find_one({"number": train_number})
+    if not train:
+        return []
+    
+    return await check_stations_for_trains(db, [train])
+
+async def check_stations_for_trains(db, trains):
+    """
+    Check station proximity for a batch of moved train documents
+    
+    The alerts opened and resolved for every train are written in one
+    round-trip, and the rollups in another. Returns the alerts opened.
+    """
+    use_budget = MOVEMENT_BUDGET_ENABLED and STATION_PROXIMITY_MODE == "index"
+    nearby = await asyncio.gather(*(_nearby_stations(train, db, use_budget) for train in trains))
+    
+    # Look up the stations we've already alerted for in the open alert table
+    if not alert_state.loaded:
+        await alert_state.load(db)
+    
+    changes = []
+    operations = []
+    
+    for train, nearby_stations in zip(trains, nearby):
+        if nearby_stations is None:
+            continue
+        
+        new_alerts, resolved_alerts, train_operations = _station_alert_changes(train, nearby_stations)
+        if not train_operations:
+            continue
+        
+        # Update the table before writing so concurrent checks see the new state
+        for _, _, alert_dict in new_alerts:
+            alert_state.add(alert_dict)
+        for code in resolved_alerts:
+            alert_state.discard_station_alert(train["number"], code)
+        
+        changes.append((train, new_alerts, resolved_alerts))
+        operations.extend(train_operations)
+    
+    if not operations:
+        return []
+    
+    try:
+        await db.alerts.bulk_write(operations, ordered=False)
+    except Exception:
+        # Undo the claims so the next check retries instead of skipping
+        for train, new_alerts, resolved_alerts in changes:
+            for _, _, alert_dict in new_alerts:
+                alert_state.discard(alert_dict)
+            for alert in resolved_alerts.values():
+                alert_state.add(alert)
+            movement_budget.invalidate(train["number"])
+        raise
+    await record_alert_changes(
+        db,
+        opened=[alert_dict for _, new_alerts, _ in changes for _, _, alert_dict in new_alerts],
+        resolved=[alert for _, _, resolved_alerts in changes for alert in resolved_alerts.values()]
+    )
+    
+    opened = []
+    for train, new_alerts, resolved_alerts in changes:
+        for alert in resolved_alerts.values():
+            broadcaster.publish_alert(dict(alert, resolved=True))
+        
+        for station, distance, alert_dict in new_alerts:
+            broadcaster.publish_alert(alert_dict)
+            print(f"ALERT: Train {train['name']} is entering {station['name']} ({distance:.2f} km away)")
+            opened.append(alert_dict)
             
-            if not existing_alert:
-                # Create new alert
-                alert = AlertCreate(
-                    type="station_proximity",
-                    trainNumber=train["number"],
-                    trainName=train["name"],
-                    stationCode=station["code"],
-                    stationName=station["name"],
-                    distance=distance,
-                    timestamp=datetime.now(),
-                    resolved=False
-                )
-                
-                await db.alerts.insert_one(alert.dict())
-                print(f"ALERT: Train {train['name']} is entering {station['name']} ({distance:.2f} km away)")
-                
-                # In a real system, we would send push notifications to passengers here
-        else:
-            # If train is outside the radius, resolve any existing alerts
-            await db.alerts.update_many(
-                {
-                    "type": "station_proximity",
-                    "trainNumber": train["number"],
-                    "stationCode": station["code"],
-                    "resolved": False
-                },
-                {
-                    "$set": {"resolved": True}
-                }
-            )
+            # In a real system, we would send push notifications to passengers here
+    
+    return opened
 
 async def check_object_theft(object_id, db):
-    """Check if an object has moved outside its train's geo-fence"""
+    """
+    Check if an object has moved outside its train's geo-fence
+    
+    Returns the alerts opened by this check.
+    """
     obj = await db.objects.find_one({"id": object_id})
     if not obj:
-        return
+        return []
     
-    # Get the train information
-    train = await db.trains.find_one({"number": obj["trainNumber"]})
+    # Get the train information and find the coach
+    train = await reference_cache.get_train(db, obj["trainNumber"])
     if not train:
-        return
+        return []
     
-    # Find the coach
-    coach = next((c for c in train["coaches"] if c["id"] == obj["coachId"]), None)
+    coach = train["coaches"].get(obj["coachId"])
     if not coach:
-        return
+        return []
+    
+    # Only the train's position has to come from the database
+    position = await db.trains.find_one({"number": obj["trainNumber"]}, {"_id": 0, "location": 1})
+    if not position:
+        return []
     
     # Calculate distance between object and train
     object_coords = obj["location"]["coordinates"]
-    train_coords = train["location"]["coordinates"]
+    train_coords = position["location"]["coordinates"]
     
     distance = haversine_distance(
         object_coords[1], object_coords[0],
@@ -95,19 +269,14 @@ async def check_object_theft(object_id, db):
     # Get geofence radius (default if not specified)
     geofence_radius = coach.get("geofenceRadius", DEFAULT_COACH_GEOFENCE_RADIUS)
     
+    # Check if we've already alerted for this object
+    if not alert_state.loaded:
+        await alert_state.load(db)
+    existing_alert = alert_state.theft_alert(obj["id"])
+    
     # Check if object is outside the geo-fence
     if distance > geofence_radius:
-        # Check if we've already alerted for this object
-        existing_alert = await db.alerts.find_one({
-            "type": "theft",
-            "objectId": obj["id"],
-            "resolved": False
-        })
-        
         if not existing_alert:
-            # Get owner information
-            owner = await db.users.find_one({"name": obj["ownerId"]})
-            
             # Create new theft alert
             alert = AlertCreate(
                 type="theft",
@@ -122,19 +291,146 @@ async def check_object_theft(object_id, db):
                 resolved=False
             )
             
-            await db.alerts.insert_one(alert.dict())
+            alert_dict = alert.dict()
+            alert_state.add(alert_dict)
+            try:
+                await db.alerts.insert_one(alert_dict)
+            except Exception:
+                alert_state.discard(alert_dict)
+                raise
+            await record_alert_changes(db, opened=[alert_dict])
+            broadcaster.publish_alert(alert_dict)
             print(f"THEFT ALERT: Object {obj['id']} ({obj['type']}) has moved {distance*1000:.2f} meters outside train {train['name']}, coach {obj['coachId']}")
             
             # In a real system, we would send push notifications to the owner here
-    else:
+            return [alert_dict]
+    elif existing_alert:
         # If object is back inside the geo-fence, resolve any existing alerts
-        await db.alerts.update_many(
+        alert_state.discard_theft_alert(obj["id"])
+        try:
+            await db.alerts.update_many(
+                {
+                    "type": "theft",
+                    "objectId": obj["id"],
+                    "resolved": False
+                },
+                {
+                    "$set": {"resolved": True, "resolvedAt": datetime.now()}
+                }
+            )
+        except Exception:
+            alert_state.add(existing_alert)
+            raise
+        await record_alert_changes(db, resolved=[existing_alert])
+        broadcaster.publish_alert(dict(existing_alert, resolved=True))
+    
+    return []
+
+async def check_objects_for_train(train_number, db):
+    """
+    Check every object on a train against its coach geo-fence in one pass
+    
+    Returns the alerts opened by this check.
+    """
+    train = await db.trains.find_one({"number": train_number})
+    if not train:
+        return []
+    
+    # Geofence radius for each coach (default if not specified)
+    coach_radii = {
+        coach["id"]: coach.get("geofenceRadius", DEFAULT_COACH_GEOFENCE_RADIUS)
+        for coach in train["coaches"]
+    }
+    
+    # Fetch all of the train's objects at once, skipping unknown coaches
+    objects = await db.objects.find({"trainNumber": train_number}).to_list(None)
+    objects = [obj for obj in objects if obj["coachId"] in coach_radii]
+    if not objects:
+        return []
+    
+    # Calculate every object's distance from the train in one step
+    distances = haversine_one_to_many(
+        train["location"]["coordinates"],
+        np.array([obj["location"]["coordinates"] for obj in objects])
+    )
+    radii = np.array([coach_radii[obj["coachId"]] for obj in objects])
+    outside = distances > radii
+    
+    if not alert_state.loaded:
+        await alert_state.load(db)
+    
+    new_alerts = []
+    resolved_alerts = []
+    
+    for obj, distance, is_outside in zip(objects, distances.tolist(), outside.tolist()):
+        existing_alert = alert_state.theft_alert(obj["id"])
+        
+        if is_outside and not existing_alert:
+            # Create new theft alert
+            alert = AlertCreate(
+                type="theft",
+                trainNumber=train["number"],
+                trainName=train["name"],
+                objectId=obj["id"],
+                objectType=obj["type"],
+                ownerId=obj["ownerId"],
+                coachId=obj["coachId"],
+                distance=distance,
+                timestamp=datetime.now(),
+                resolved=False
+            )
+            new_alerts.append((obj, distance, alert.dict()))
+        elif not is_outside and existing_alert:
+            # Object is back inside the geo-fence
+            resolved_alerts.append(existing_alert)
+    
+    resolved_ids = [alert["objectId"] for alert in resolved_alerts]
+    
+    operations = [InsertOne(alert_dict) for _, _, alert_dict in new_alerts]
+    if resolved_ids:
+        operations.append(UpdateMany(
             {
                 "type": "theft",
-                "objectId": obj["id"],
+                "objectId": {"$in": resolved_ids},
                 "resolved": False
             },
             {
-                "$set": {"resolved": True}
+                "$set": {"resolved": True, "resolvedAt": datetime.now()}
             }
-        )
\ No newline at end of file
+        ))
+    
+    if not operations:
+        return []
+    
+    # Update the table before writing so concurrent checks see the new state
+    for _, _, alert_dict in new_alerts:
+        alert_state.add(alert_dict)
+    for object_id in resolved_ids:
+        alert_state.discard_theft_alert(object_id)
+    
+    # Reconcile all theft alerts for this train in a single round-trip
+    try:
+        await db.alerts.bulk_write(operations, ordered=False)
+    except Exception:
+        # Undo the claim so the next check retries instead of skipping
+        for _, _, alert_dict in new_alerts:
+            alert_state.discard(alert_dict)
+        for alert in resolved_alerts:
+            alert_state.add(alert)
+        raise
+    await record_alert_changes(
+        db,
+        opened=[alert_dict for _, _, alert_dict in new_alerts],
+        resolved=resolved_alerts
+    )
+    
+    for alert in resolved_alerts:
+        broadcaster.publish_alert(dict(alert, resolved=True))
+    
+    for obj, distance, alert_dict in new_alerts:
+        broadcaster.publish_alert(alert_dict)
+        print(f"THEFT ALERT: Object {obj['id']} ({obj['type']}) has moved {distance*1000:.2f} meters outside train {train['name']}, coach {obj['coachId']}")
+        
+        # In a real system, we would send push notifications to the owner here
+    
+    return [alert_dict for _, _, alert_dict in new_alerts]
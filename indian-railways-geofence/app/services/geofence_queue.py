@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+
+from app.services.geo_fencing import check_station_proximity, check_object_theft
+
+# Background evaluation settings
+GEOFENCE_WORKERS = int(os.getenv("GEOFENCE_WORKERS", 4))  # 0 evaluates inline
+GEOFENCE_MAX_STALENESS = float(os.getenv("GEOFENCE_MAX_STALENESS", 2.0))  # seconds
+
+async def evaluate_geofence(kind, entity_id, db):
+    """Run the geo-fence check for a train or object that moved"""
+    if kind == "train":
+        return await check_station_proximity(entity_id, db)
+    return await check_object_theft(entity_id, db)
+
+
+class GeofenceQueue:
+    """
+    Background geo-fence evaluation with latest-wins coalescing
+
+    Location routes submit "train X / object Y moved" events and return
+    as soon as the position is persisted. A pool of worker tasks evaluates
+    them. Each entity has at most one pending event: the checks read the
+    current position when they run, so a burst of updates for one train
+    costs a single evaluation of its newest position.
+
+    Staleness is bounded by back-pressure: while the oldest pending event
+    has waited longer than max_staleness, new events are evaluated inline
+    by the submitting request, which slows producers until the workers
+    catch up.
+    """
+
+    def __init__(self, evaluate=evaluate_geofence, workers=GEOFENCE_WORKERS, max_staleness=GEOFENCE_MAX_STALENESS):
+        self.evaluate = evaluate
+        self.workers = workers
+        self.max_staleness = max_staleness
+        self._db = None
+        self._queue = None
+        self._tasks = []
+        self._pending = {}  # (kind, id) -> time queued, oldest first
+        self._in_progress = set()
+        self._dirty = set()  # keys that moved again while being evaluated
+        self.submitted = 0
+        self.coalesced = 0
+        self.evaluated = 0
+        self.inline = 0
+        self.failed = 0
+
+    @property
+    def running(self):
+        return bool(self._tasks)
+
+    async def start(self, db):
+        """Start the worker pool"""
+        if self.running or self.workers <= 0:
+            return
+
+        self._db = db
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"Geofence queue started with {self.workers} workers")
+
+    async def stop(self):
+        """Stop the worker pool, dropping any pending events"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        self._tasks = []
+        self._pending = {}
+        self._in_progress = set()
+        self._dirty = set()
+
+    def oldest_pending_age(self):
+        """Seconds the oldest pending event has been waiting"""
+        if not self._pending:
+            return 0.0
+        return time.monotonic() - next(iter(self._pending.values()))
+
+    async def submit(self, kind, entity_id, db):
+        """Queue a geo-fence evaluation for a train or object that moved"""
+        self.submitted += 1
+        key = (kind, entity_id)
+
+        if not self.running:
+            await self._evaluate_inline(key, db)
+            return
+
+        # Latest wins: a pending evaluation will see the new position
+        if key in self._pending:
+            self.coalesced += 1
+            return
+
+        # Already running on an older position: run once more afterwards
+        if key in self._in_progress:
+            self._dirty.add(key)
+            self.coalesced += 1
+            return
+
+        # Back-pressure when the backlog is older than the staleness bound
+        if self.oldest_pending_age() > self.max_staleness:
+            await self._evaluate_inline(key, db)
+            return
+
+        self._enqueue(key)
+
+    def _enqueue(self, key):
+        self._pending[key] = time.monotonic()
+        self._queue.put_nowait(key)
+
+    async def _evaluate_inline(self, key, db):
+        self.inline += 1
+        await self.evaluate(key[0], key[1], db)
+
+    async def _worker(self):
+        while True:
+            key = await self._queue.get()
+            self._pending.pop(key, None)
+            self._in_progress.add(key)
+
+            try:
+                await self.evaluate(key[0], key[1], self._db)
+                self.evaluated += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Geofence evaluation failed for {key[0]} {key[1]}: {e}")
+            finally:
+                self._in_progress.discard(key)
+                if key in self._dirty:
+                    self._dirty.discard(key)
+                    self._enqueue(key)
+
+    def stats(self):
+        return {
+            "workers": len(self._tasks),
+            "pending": len(self._pending),
+            "oldest_pending_seconds": self.oldest_pending_age(),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "evaluated": self.evaluated,
+            "inline": self.inline,
+            "failed": self.failed
+        }
+
+
+# Shared queue used by the location routes
+geofence_queue = GeofenceQueue()
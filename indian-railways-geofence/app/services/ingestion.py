@@ -0,0 +1,137 @@
+import asyncio
+
+from pymongo import UpdateOne, UpdateMany
+
+from app.services.geo_fencing import check_stations_for_trains, check_objects_for_train
+from app.services.broadcaster import broadcaster
+from app.services.position_history import position_history
+
+def _latest_fixes(fixes):
+    """Get the index of the newest fix for each ID in a batch"""
+    latest = {}
+    for i, fix in enumerate(fixes):
+        current = latest.get(fix.id)
+        if current is None or fix.timestamp >= fixes[current].timestamp:
+            latest[fix.id] = i
+    return latest
+
+def _newer_than(timestamp):
+    """Filter for documents last moved by an older fix, or never by one"""
+    return {"$or": [{"fixedAt": {"$lt": timestamp}}, {"fixedAt": None}]}
+
+def _is_newer(fix, doc):
+    """Check a fix is newer than the one a document was last moved by"""
+    return doc.get("fixedAt") is None or fix.timestamp > doc["fixedAt"]
+
+def _outcomes(fixes, latest, known_ids, stale_ids=()):
+    """Build the per-fix outcome list in input order"""
+    results = []
+    for i, fix in enumerate(fixes):
+        if fix.id not in known_ids:
+            status = "not_found"
+        elif latest[fix.id] != i:
+            status = "superseded"  # a newer fix for the same ID was in the batch
+        elif fix.id in stale_ids:
+            status = "stale"  # a newer fix was applied by an earlier batch
+        else:
+            status = "updated"
+        results.append({"id": fix.id, "timestamp": fix.timestamp, "status": status})
+    return results
+
+async def ingest_train_fixes(db, fixes):
+    """
+    Write a batch of train position fixes and run station proximity
+    checks for the trains that moved
+    
+    Only the newest fix per train is applied, and only if it is newer
+    than the fix the train was last moved by, so delayed or replayed
+    batches cannot move a train back. Returns the per-fix outcomes and the
+    alerts opened by the checks.
+    """
+    latest = _latest_fixes(fixes)
+    
+    trains = await db.trains.find({"number": {"$in": list(latest)}}).to_list(None)
+    known = {train["number"] for train in trains}
+    stale = {train["number"] for train in trains if not _is_newer(fixes[latest[train["number"]]], train)}
+    trains_by_number = {train["number"]: train for train in trains if train["number"] not in stale}
+    
+    train_operations = []
+    object_operations = []
+    
+    for number, train in trains_by_number.items():
+        fix = fixes[latest[number]]
+        location = {"type": "Point", "coordinates": [fix.lon, fix.lat]}
+        
+        # The guard also covers a newer fix written since the trains were read
+        train_operations.append(UpdateOne(
+            {"number": number, **_newer_than(fix.timestamp)},
+            {"$set": {"location": location, "fixedAt": fix.timestamp}}
+        ))
+        
+        # Objects move with the train
+        object_operations.append(UpdateMany({"trainNumber": number}, {"$set": {"location": location}}))
+        
+        train["location"] = location
+    
+    if train_operations:
+        await db.trains.bulk_write(train_operations, ordered=False)
+        await db.objects.bulk_write(object_operations, ordered=False)
+    
+    for number, train in trains_by_number.items():
+        broadcaster.publish_position("train", number, train["location"], number)
+    
+    # Every fix is history, including superseded and late ones
+    for fix in fixes:
+        if fix.id in known:
+            position_history.record("train", fix.id, [fix.lon, fix.lat], fix.timestamp)
+    
+    # Check station proximity for every moved train
+    alerts = await check_stations_for_trains(db, list(trains_by_number.values()))
+    return _outcomes(fixes, latest, known, stale), alerts
+
+async def ingest_object_fixes(db, fixes):
+    """
+    Write a batch of object position fixes and run theft checks for the
+    trains whose objects moved
+    
+    Only the newest fix per object is applied, and only if it is newer
+    than the fix the object was last moved by. Returns the per-fix outcomes
+    and the alerts opened by the checks.
+    """
+    latest = _latest_fixes(fixes)
+    
+    found = await db.objects.find(
+        {"id": {"$in": list(latest)}},
+        {"_id": 0, "id": 1, "trainNumber": 1, "fixedAt": 1}
+    ).to_list(None)
+    known = {obj["id"] for obj in found}
+    stale = {obj["id"] for obj in found if not _is_newer(fixes[latest[obj["id"]]], obj)}
+    objects = [obj for obj in found if obj["id"] not in stale]
+    
+    operations = []
+    for obj in objects:
+        fix = fixes[latest[obj["id"]]]
+        obj["location"] = {"type": "Point", "coordinates": [fix.lon, fix.lat]}
+        operations.append(UpdateOne(
+            {"id": obj["id"], **_newer_than(fix.timestamp)},
+            {"$set": {"location": obj["location"], "fixedAt": fix.timestamp}}
+        ))
+    
+    if operations:
+        await db.objects.bulk_write(operations, ordered=False)
+    
+    for obj in objects:
+        broadcaster.publish_position("object", obj["id"], obj["location"], obj["trainNumber"])
+    
+    for fix in fixes:
+        if fix.id in known:
+            position_history.record("object", fix.id, [fix.lon, fix.lat], fix.timestamp)
+    
+    # Check every affected train's objects in one pass per train
+    train_numbers = {obj["trainNumber"] for obj in objects}
+    opened = await asyncio.gather(*(
+        check_objects_for_train(number, db) for number in train_numbers
+    ))
+    
+    alerts = [alert for train_alerts in opened for alert in train_alerts]
+    return _outcomes(fixes, latest, known, stale), alerts
@@ -0,0 +1,239 @@
+import asyncio
+import math
+import os
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+from app.utils.distance import haversine_distance, haversine_elementwise, bearing_elementwise, destination_points
+from app.services.simulation import apply_train_moves, TICK_TRAIN_FIELDS
+
+# Journey scheduler settings
+JOURNEY_TICK_SECONDS = float(os.getenv("JOURNEY_TICK_SECONDS", 1.0))  # resolution of the shared timer
+JOURNEY_HISTORY = int(os.getenv("JOURNEY_HISTORY", 100))  # finished journeys kept for listing
+
+ACTIVE = ("running", "paused")
+
+
+class JourneyScheduler:
+    """
+    Runs simulated journeys on the server with a single shared timer
+
+    Every journey steps its train towards the destination station every
+    interval_seconds of wall-clock time, at the speed needed to arrive
+    after duration_minutes. Each timer tick collects every journey that
+    is due and moves all of their trains together: one read of the
+    trains, one NumPy great-circle step and one bulk_write through
+    apply_train_moves, however many journeys are running.
+
+    A train has at most one active journey; starting another cancels the
+    first. Journeys are kept in memory and do not survive a restart.
+    """
+
+    def __init__(self, tick_seconds=JOURNEY_TICK_SECONDS, history=JOURNEY_HISTORY):
+        self.tick_seconds = tick_seconds
+        self.history = history
+        self._db = None
+        self._task = None
+        self._journeys = {}  # id -> journey, oldest first
+        self._due = {}  # id -> loop time of the next step
+        self.ticks = 0
+        self.steps = 0
+        self.last_tick_seconds = None
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    async def start(self, db):
+        """Start the shared timer"""
+        if self.running:
+            return
+
+        self._db = db
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _now(self):
+        return asyncio.get_running_loop().time()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            try:
+                await self.tick(self._db)
+            except Exception as e:
+                print(f"Journey tick failed: {e}")
+
+    async def start_journey(self, db, train, destination, duration_minutes=30, interval_seconds=30):
+        """Start moving a train towards a destination station, returns the journey"""
+        start_coords = train["location"]["coordinates"]
+        dest_coords = destination["location"]["coordinates"]
+
+        total_distance = haversine_distance(
+            start_coords[1], start_coords[0],
+            dest_coords[1], dest_coords[0]
+        )
+        required_speed = (total_distance / duration_minutes) * 60  # km/h
+
+        for journey in list(self._journeys.values()):
+            if journey["trainNumber"] == train["number"] and journey["status"] in ACTIVE:
+                self._finish(journey, "cancelled")
+
+        # Set the speed now so the train shows it before the first step
+        await db.trains.update_one({"number": train["number"]}, {"$set": {"speed": required_speed}})
+
+        now = datetime.now()
+        journey = {
+            "id": uuid.uuid4().hex,
+            "trainNumber": train["number"],
+            "destination": destination["code"],
+            "destinationName": destination["name"],
+            "target": dest_coords,
+            "speedKmh": required_speed,
+            "intervalSeconds": interval_seconds,
+            "distanceKm": total_distance,
+            "remainingKm": total_distance,
+            "steps": 0,
+            "totalSteps": math.ceil(duration_minutes * 60 / interval_seconds),
+            "status": "running",
+            "startedAt": now,
+            "updatedAt": now
+        }
+        self._journeys[journey["id"]] = journey
+        self._due[journey["id"]] = self._now() + interval_seconds
+
+        return journey
+
+    def list(self, status=None):
+        return [journey for journey in self._journeys.values() if status is None or journey["status"] == status]
+
+    def get(self, journey_id):
+        return self._journeys.get(journey_id)
+
+    def pause(self, journey_id):
+        """Stop stepping a running journey, returns it or None if it is not running"""
+        journey = self._journeys.get(journey_id)
+        if not journey or journey["status"] != "running":
+            return None
+
+        journey["status"] = "paused"
+        journey["updatedAt"] = datetime.now()
+        return journey
+
+    def resume(self, journey_id):
+        """Continue a paused journey from where its train is now"""
+        journey = self._journeys.get(journey_id)
+        if not journey or journey["status"] != "paused":
+            return None
+
+        journey["status"] = "running"
+        journey["updatedAt"] = datetime.now()
+        self._due[journey_id] = self._now() + journey["intervalSeconds"]
+        return journey
+
+    def cancel(self, journey_id):
+        """Cancel an active journey, leaving the train where it is"""
+        journey = self._journeys.get(journey_id)
+        if not journey or journey["status"] not in ACTIVE:
+            return None
+
+        self._finish(journey, "cancelled")
+        return journey
+
+    def _finish(self, journey, status):
+        journey["status"] = status
+        journey["updatedAt"] = datetime.now()
+        self._due.pop(journey["id"], None)
+
+        # Forget the oldest finished journeys beyond the history limit
+        finished = [journey_id for journey_id, kept in self._journeys.items() if kept["status"] not in ACTIVE]
+        for journey_id in finished[:max(len(finished) - self.history, 0)]:
+            del self._journeys[journey_id]
+
+    async def tick(self, db, now=None):
+        """Step every journey that is due, returns how many were stepped"""
+        now = self._now() if now is None else now
+        due = [
+            journey for journey in self._journeys.values()
+            if journey["status"] == "running" and self._due[journey["id"]] <= now
+        ]
+        if not due:
+            return 0
+
+        started = self._now()
+        trains = await db.trains.find(
+            {"number": {"$in": [journey["trainNumber"] for journey in due]}},
+            TICK_TRAIN_FIELDS
+        ).to_list(None)
+        by_number = {train["number"]: train for train in trains}
+
+        # Journeys may have been paused or cancelled while the trains were read
+        due = [journey for journey in due if journey["status"] == "running"]
+        for journey in due:
+            if journey["trainNumber"] not in by_number:
+                self._finish(journey, "cancelled")
+        due = [journey for journey in due if journey["trainNumber"] in by_number]
+        if not due:
+            return 0
+        trains = [by_number[journey["trainNumber"]] for journey in due]
+
+        origins = np.array([train["location"]["coordinates"] for train in trains], dtype=float)
+        targets = np.array([journey["target"] for journey in due], dtype=float)
+        steps = np.array([journey["speedKmh"] * journey["intervalSeconds"] / 3600 for journey in due])
+
+        remaining = haversine_elementwise(origins, targets)
+        bearings = bearing_elementwise(origins, targets)
+        arrived = steps >= remaining
+
+        positions = destination_points(origins, bearings, np.minimum(steps, remaining))
+        positions[arrived] = targets[arrived]
+
+        for journey, train, coordinates, bearing, done in zip(
+            due, trains, positions.tolist(), bearings.tolist(), arrived.tolist()
+        ):
+            train["location"] = {"type": "Point", "coordinates": coordinates}
+            # direction is measured anticlockwise from East, bearings clockwise from North
+            train["direction"] = (90 - bearing) % 360
+            train["speed"] = 0 if done else journey["speedKmh"]
+
+        # If the write fails the journeys stay due and are retried next tick
+        await apply_train_moves(db, trains, fields=("location", "direction", "speed"))
+
+        for journey, left, done in zip(due, (remaining - steps).tolist(), arrived.tolist()):
+            journey["steps"] += 1
+            journey["remainingKm"] = max(left, 0.0)
+            journey["updatedAt"] = datetime.now()
+
+            # Journeys paused or cancelled during the write keep that status
+            if done and journey["status"] in ACTIVE:
+                self._finish(journey, "completed")
+            elif journey["status"] == "running":
+                self._due[journey["id"]] += journey["intervalSeconds"]
+
+        self.ticks += 1
+        self.steps += len(trains)
+        self.last_tick_seconds = self._now() - started
+        return len(trains)
+
+    def stats(self):
+        counts = {}
+        for journey in self._journeys.values():
+            counts[journey["status"]] = counts.get(journey["status"], 0) + 1
+        return {
+            "running": self.running,
+            "journeys": counts,
+            "ticks": self.ticks,
+            "steps": self.steps,
+            "last_tick_seconds": self.last_tick_seconds
+        }
+
+
+# Shared scheduler started with the application
+journey_scheduler = JourneyScheduler()
@@ -0,0 +1,69 @@
+from app.utils.distance import haversine_distance
+
+# Safety margin (km) so floating-point error can never turn a boundary
+# crossing into a skipped evaluation
+MOVEMENT_BUDGET_EPSILON = 1e-6
+
+
+class MovementBudget:
+    """
+    Per-train movement budget for skipping station proximity checks
+
+    After each evaluation we remember where the train was and how far it
+    was from the nearest fence boundary (the "slack"). By the triangle
+    inequality the train's distance to any station changes by at most the
+    distance it has moved since then, so while that displacement stays
+    below the slack no station can have been entered or left and the
+    evaluation can be skipped without changing its outcome.
+    """
+
+    def __init__(self):
+        self._budgets = {}  # trainNumber -> (coordinates, slack_km, fence_version)
+        self.skipped = 0
+        self.evaluated = 0
+
+    def can_skip(self, train_number, coordinates, fence_version):
+        """Check whether a train's new position can skip re-evaluation"""
+        budget = self._budgets.get(train_number)
+        if budget is None:
+            return False
+
+        last_coordinates, slack, last_fence_version = budget
+        if last_fence_version != fence_version:
+            return False
+
+        moved = haversine_distance(
+            last_coordinates[1], last_coordinates[0],
+            coordinates[1], coordinates[0]
+        )
+        if moved + MOVEMENT_BUDGET_EPSILON < slack:
+            self.skipped += 1
+            return True
+
+        return False
+
+    def record(self, train_number, coordinates, slack_km, fence_version):
+        """Remember the result of a full evaluation"""
+        self._budgets[train_number] = (list(coordinates), slack_km, fence_version)
+
+    def count_evaluation(self):
+        """Count a full evaluation, whether or not a budget is kept for it"""
+        self.evaluated += 1
+
+    def invalidate(self, train_number):
+        """Force the next check for a train to be a full evaluation"""
+        self._budgets.pop(train_number, None)
+
+    def clear(self):
+        self._budgets = {}
+
+    def stats(self):
+        return {
+            "evaluated": self.evaluated,
+            "skipped": self.skipped,
+            "tracked_trains": len(self._budgets)
+        }
+
+
+# Shared budgets used by the geo-fencing service
+movement_budget = MovementBudget()
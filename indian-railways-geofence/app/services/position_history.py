@@ -0,0 +1,349 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.utils.trajectory import simplify_track
+
+# Position history settings
+POSITION_HISTORY_ENABLED = os.getenv("POSITION_HISTORY_ENABLED", "true").lower() == "true"
+POSITION_BUCKET_SECONDS = int(os.getenv("POSITION_BUCKET_SECONDS", 3600))  # time window per bucket document
+POSITION_FLUSH_INTERVAL = float(os.getenv("POSITION_FLUSH_INTERVAL", 2.0))  # seconds
+POSITION_MAX_BUFFER = int(os.getenv("POSITION_MAX_BUFFER", 10000))  # buffered fixes before an early flush
+POSITION_COMPACT_INTERVAL = float(os.getenv("POSITION_COMPACT_INTERVAL", 600))  # seconds
+POSITION_COMPACT_BATCH = int(os.getenv("POSITION_COMPACT_BATCH", 500))  # buckets compacted per run
+
+# Simplification tolerances (metres) precomputed for closed buckets
+POSITION_LEVELS = [int(level) for level in os.getenv("POSITION_LEVELS", "10,50,250,1000").split(",")]
+
+# Coordinates are stored as integer micro-degrees (about 0.1 m)
+COORDINATE_SCALE = 1_000_000
+
+def naive_utc(timestamp):
+    """Convert an aware timestamp to naive UTC, as MongoDB stores them"""
+    if timestamp.tzinfo:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def bucket_start(timestamp, bucket_seconds=POSITION_BUCKET_SECONDS):
+    """Start of the bucket window a timestamp falls in"""
+    epoch = datetime(1970, 1, 1)
+    seconds = int((timestamp - epoch).total_seconds())
+    return epoch + timedelta(seconds=seconds - seconds % bucket_seconds)
+
+def encode_segment(fixes):
+    """
+    Delta-encode a time-ordered list of (timestamp, lon, lat) fixes
+
+    Coordinates are quantized before taking differences, so decoding
+    reproduces the quantized positions exactly with no accumulated drift.
+    """
+    t0 = fixes[0][0]
+    xs = [round(lon * COORDINATE_SCALE) for _, lon, _ in fixes]
+    ys = [round(lat * COORDINATE_SCALE) for _, _, lat in fixes]
+
+    return {
+        "t0": t0,
+        "o": [xs[0], ys[0]],
+        "dt": [round((timestamp - t0).total_seconds() * 1000) for timestamp, _, _ in fixes],
+        "dx": [0] + [xs[i] - xs[i - 1] for i in range(1, len(xs))],
+        "dy": [0] + [ys[i] - ys[i - 1] for i in range(1, len(ys))]
+    }
+
+def decode_segment(segment):
+    """Decode a segment back into (timestamp, lon, lat) fixes"""
+    fixes = []
+    x, y = segment["o"]
+    for dt, dx, dy in zip(segment["dt"], segment["dx"], segment["dy"]):
+        x += dx
+        y += dy
+        fixes.append((
+            segment["t0"] + timedelta(milliseconds=dt),
+            x / COORDINATE_SCALE,
+            y / COORDINATE_SCALE
+        ))
+    return fixes
+
+def bucket_windows(buffer, bucket_seconds=POSITION_BUCKET_SECONDS):
+    """Split buffered fixes into (kind, entity id, window start, fixes), oldest fix first"""
+    for (kind, entity_id), fixes in buffer.items():
+        windows = {}
+        for fix in sorted(fixes, key=lambda fix: fix[0]):
+            windows.setdefault(bucket_start(fix[0], bucket_seconds), []).append(fix)
+
+        for start, window_fixes in windows.items():
+            yield kind, entity_id, start, window_fixes
+
+def bucket_operation(kind, entity_id, start, fixes):
+    """Build the upsert appending one window's fixes to its bucket as a segment"""
+    return UpdateOne(
+        {"kind": kind, "entityId": entity_id, "start": start},
+        {
+            "$push": {"segments": encode_segment(fixes)},
+            "$inc": {"count": len(fixes)},
+            "$min": {"first": fixes[0][0]},
+            "$max": {"last": fixes[-1][0]},
+            # Late fixes invalidate precomputed levels
+            "$set": {"compacted": False}
+        },
+        upsert=True
+    )
+
+def bucket_operations(buffer, bucket_seconds=POSITION_BUCKET_SECONDS):
+    """
+    Build the bucket upserts for buffered fixes
+
+    buffer maps (kind, entity id) to a list of (timestamp, lon, lat). Each
+    entity's fixes for one bucket window become one appended segment.
+    """
+    return [bucket_operation(*window) for window in bucket_windows(buffer, bucket_seconds)]
+
+def bucket_fixes(bucket):
+    """Decode every fix stored in a bucket, oldest first"""
+    return sorted(fix for segment in bucket["segments"] for fix in decode_segment(segment))
+
+def build_levels(fixes, levels=POSITION_LEVELS):
+    """Simplify a bucket's fixes at each precomputed tolerance"""
+    return {str(level): encode_segment(simplify_track(fixes, level / 1000)) for level in levels}
+
+def compact_bucket(bucket):
+    """Build the fields replacing a closed bucket's segments with one segment and its levels"""
+    fixes = bucket_fixes(bucket)
+    return {"segments": [encode_segment(fixes)], "levels": build_levels(fixes), "compacted": True}
+
+def pick_level(levels, tolerance_km):
+    """Choose the coarsest precomputed level within a tolerance, returns (metres, segment)"""
+    usable = [int(level) for level in levels if int(level) <= tolerance_km * 1000]
+    if not usable:
+        return 0, None
+    level = max(usable)
+    return level, levels[str(level)]
+
+
+class PositionHistory:
+    """
+    Buffered writer and reader for train and object position history
+
+    Fixes are kept in memory and flushed every flush_interval seconds, or
+    sooner once max_buffer fixes are waiting. Each flush appends one
+    delta-encoded segment per entity to that entity's bucket document for
+    the time window, so a bucket collects many fixes in a single document
+    instead of one document per fix.
+
+    Once a bucket's window has closed it is compacted: its track is
+    simplified at each of POSITION_LEVELS and stored alongside the raw
+    segments, so coarse reads of long ranges decode few points.
+    """
+
+    def __init__(self, bucket_seconds=POSITION_BUCKET_SECONDS, flush_interval=POSITION_FLUSH_INTERVAL,
+                 max_buffer=POSITION_MAX_BUFFER):
+        self.bucket_seconds = bucket_seconds
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._db = None
+        self._task = None
+        self._buffer = {}
+        self._buffered = 0
+        self._in_flight = []  # buffers being written
+        self._flush_now = None
+        self._last_compact = 0.0
+        self.recorded = 0
+        self.flushed = 0
+        self.flushes = 0
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    async def start(self, db):
+        """Start the background flusher"""
+        if self.running or not POSITION_HISTORY_ENABLED:
+            return
+
+        self._db = db
+        self._flush_now = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Stop the flusher after writing whatever is still buffered"""
+        if not self.running:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+    def record(self, kind, entity_id, coordinates, timestamp=None):
+        """Buffer a position fix; ignored while the flusher is not running"""
+        if not self.running:
+            return
+
+        # Stored timestamps keep milliseconds, so keep buffered ones the same
+        timestamp = naive_utc(timestamp or datetime.now())
+        timestamp = timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
+        self._buffer.setdefault((kind, entity_id), []).append((timestamp, coordinates[0], coordinates[1]))
+        self._buffered += 1
+        self.recorded += 1
+
+        if self._buffered >= self.max_buffer:
+            self._flush_now.set()
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Position history flush failed: {e}")
+
+            loop_time = asyncio.get_running_loop().time()
+            if loop_time - self._last_compact >= POSITION_COMPACT_INTERVAL:
+                try:
+                    # A full batch means more are waiting; carry on after the next flush
+                    if await self.compact(self._db) < POSITION_COMPACT_BATCH:
+                        self._last_compact = loop_time
+                except Exception as e:
+                    self._last_compact = loop_time
+                    print(f"Position history compaction failed: {e}")
+
+    async def flush(self):
+        """
+        Write the buffered fixes, returns how many were written
+
+        Fixes whose write fails are put back in the buffer for the next
+        flush; until then they are still returned by get_track.
+        """
+        if not self._buffer:
+            return 0
+
+        buffer, self._buffer = self._buffer, {}
+        count, self._buffered = self._buffered, 0
+        windows = list(bucket_windows(buffer, self.bucket_seconds))
+
+        self._in_flight.append(buffer)
+        try:
+            await self._db.position_history.bulk_write(
+                [bucket_operation(*window) for window in windows], ordered=False
+            )
+        except BulkWriteError as e:
+            # Unordered writes apply every operation that did not fail itself
+            failed = [windows[error["index"]] for error in e.details["writeErrors"]]
+            self._requeue(failed)
+            raise
+        except Exception:
+            self._requeue(windows)
+            raise
+        finally:
+            self._in_flight.remove(buffer)
+
+        self.flushes += 1
+        self.flushed += count
+        return count
+
+    def _requeue(self, windows):
+        """Put the fixes of unwritten windows back ahead of anything buffered since"""
+        for kind, entity_id, _, fixes in windows:
+            self._buffer.setdefault((kind, entity_id), [])[:0] = fixes
+            self._buffered += len(fixes)
+
+    def _pending(self, kind, entity_id):
+        """Fixes for an entity that are buffered or still being written"""
+        return [fix for buffer in self._in_flight + [self._buffer] for fix in buffer.get((kind, entity_id), [])]
+
+    async def compact(self, db, now=None, batch=POSITION_COMPACT_BATCH):
+        """
+        Precompute simplified levels for up to batch buckets whose window
+        has closed, oldest first, returns the count
+
+        The segments appended by each flush are merged into one, so the
+        delta encoding covers the whole bucket instead of every flush
+        repeating its own origin and start time.
+        """
+        closed_before = (now or datetime.now()) - timedelta(seconds=self.bucket_seconds)
+        buckets = await db.position_history.find(
+            {"compacted": False, "start": {"$lte": closed_before}},
+            {"segments": 1, "count": 1}
+        ).sort("start", 1).limit(batch).to_list(None)
+        if not buckets:
+            return 0
+
+        # Simplification is CPU-bound, keep it off the event loop
+        compacted = await asyncio.to_thread(lambda: [compact_bucket(bucket) for bucket in buckets])
+
+        operations = [
+            # Skipped if a late fix was appended since the bucket was read
+            UpdateOne({"_id": bucket["_id"], "count": bucket["count"]}, {"$set": fields})
+            for bucket, fields in zip(buckets, compacted)
+        ]
+        await db.position_history.bulk_write(operations, ordered=False)
+
+        return len(operations)
+
+    async def get_track(self, db, kind, entity_id, start, end, tolerance_km=None):
+        """
+        Get an entity's fixes between start and end, oldest first
+
+        Fixes that are still buffered or being flushed are included. With
+        tolerance_km the track is simplified so no recorded fix is further
+        than that from it; compacted buckets wholly inside the range start
+        from their coarsest level within the tolerance and only the remainder
+        is spent on the final pass.
+        """
+        start, end = naive_utc(start), naive_utc(end)
+        pending = self._pending(kind, entity_id)
+        buckets = await db.position_history.find(
+            {
+                "kind": kind,
+                "entityId": entity_id,
+                "start": {"$gte": bucket_start(start, self.bucket_seconds), "$lte": end}
+            },
+            {"_id": 0, "start": 1, "segments": 1, "levels": 1, "compacted": 1}
+        ).sort("start", 1).to_list(None)
+        window = timedelta(seconds=self.bucket_seconds)
+
+        fixes = []
+        used_level = 0
+        for bucket in buckets:
+            level, segment = 0, None
+            # A level may drop the vertices either side of a range edge inside
+            # the bucket, so partly covered buckets are read raw
+            covered = start <= bucket["start"] and bucket["start"] + window <= end
+            if tolerance_km and covered and bucket.get("compacted"):
+                level, segment = pick_level(bucket["levels"], tolerance_km)
+            if segment:
+                used_level = max(used_level, level)
+                fixes.extend(decode_segment(segment))
+            else:
+                fixes.extend(bucket_fixes(bucket))
+
+        # A flush may have finished during the read, so skip fixes it already stored
+        stored = {fix[0] for fix in fixes}
+        pending = {fix[0]: fix for fix in pending + self._pending(kind, entity_id) if fix[0] not in stored}
+        fixes.extend(pending.values())
+
+        fixes = sorted(fix for fix in fixes if start <= fix[0] <= end)
+        if tolerance_km:
+            fixes = simplify_track(fixes, tolerance_km - used_level / 1000)
+
+        return fixes
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "buffered": self._buffered,
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "flushes": self.flushes
+        }
+
+
+# Shared history writer used by the location routes, ingestion and the simulator
+position_history = PositionHistory()
@@ -0,0 +1,120 @@
+import os
+from collections import OrderedDict
+
+# Maximum number of trains and stations kept in memory
+REFERENCE_CACHE_SIZE = int(os.getenv("REFERENCE_CACHE_SIZE", 1024))
+
+# Train fields that change rarely; location is left out because it changes constantly
+TRAIN_REFERENCE_FIELDS = {"_id": 0, "number": 1, "name": 1, "coaches": 1}
+
+def _train_entry(train):
+    """Cache entry for a train, with its coaches indexed by id"""
+    return {
+        "number": train["number"],
+        "name": train["name"],
+        "coaches": {coach["id"]: coach for coach in train.get("coaches", [])}
+    }
+
+def _station_entry(station):
+    station.pop("_id", None)
+    return station
+
+
+class ReferenceCache:
+    """
+    Size-bounded read-through cache of train and station reference data
+
+    Entries are evicted least recently used first. While reads of a key
+    are waiting for the database the key has a version, which write routes
+    bump through invalidate_*. A read remembers the version it started
+    with and only stores its result if no write happened in the meantime,
+    so a slow read cannot put stale data back into the cache. Versions are
+    dropped once the last read of a key finishes, so they never outnumber
+    the reads in flight.
+
+    Cached entries are shared between callers and must not be modified.
+    """
+
+    def __init__(self, maxsize=REFERENCE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._versions = {}  # key -> [version, reads in flight]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get_train(self, db, train_number):
+        """Get a train's number, name and coach-id -> coach dict"""
+        return await self._get(
+            ("train", train_number),
+            lambda: db.trains.find_one({"number": train_number}, TRAIN_REFERENCE_FIELDS),
+            _train_entry
+        )
+
+    async def get_station(self, db, station_code):
+        """Get a station document"""
+        return await self._get(
+            ("station", station_code),
+            lambda: db.stations.find_one({"code": station_code}),
+            _station_entry
+        )
+
+    def invalidate_train(self, train_number):
+        self._invalidate(("train", train_number))
+
+    def invalidate_station(self, station_code):
+        self._invalidate(("station", station_code))
+
+    def clear(self):
+        self._entries.clear()
+        self._versions.clear()
+
+    async def _get(self, key, fetch, build):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        state = self._versions.setdefault(key, [0, 0])
+        version = state[0]
+        state[1] += 1
+        try:
+            doc = await fetch()
+        finally:
+            state[1] -= 1
+            if not state[1]:
+                del self._versions[key]
+        if doc is None:
+            return None
+
+        entry = build(doc)
+        if state[0] == version:
+            self._entries[key] = entry
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return entry
+
+    def _invalidate(self, key):
+        self._entries.pop(key, None)
+        # Only reads still waiting for the database need to notice the write
+        state = self._versions.get(key)
+        if state:
+            state[0] += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+
+# Shared cache used by the routes and the geo-fencing service
+reference_cache = ReferenceCache()
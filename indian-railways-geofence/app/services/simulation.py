@@ -1,69 +1,113 @@
+import asyncio
 import random
 import math
+import time
 from datetime import datetime, timedelta
 
-from app.utils.distance import haversine_distance
-from app.services.geo_fencing import check_station_proximity, check_object_theft
+import numpy as np
+from pymongo import UpdateOne, UpdateMany
 
-async def simulate_train_movement(db, train_number=None, distance_km=None):
-    """
-    Simulate train movement
-    If train_number is provided, only move that train
-    If distance_km is provided, move train by that distance
+from app.utils.distance import haversine_distance, destination_points
+from app.services.geo_fencing import check_stations_for_trains, check_object_theft
+from app.services.broadcaster import broadcaster
+from app.services.position_history import position_history
+
+# Seconds of movement per simulation tick
+SIMULATION_TICK_SECONDS = 5
+
+# Largest random change of heading per tick, in degrees either way
+SIMULATION_HEADING_JITTER = 5
+
+# Fields a tick needs, including the ones the proximity check reads
+TICK_TRAIN_FIELDS = {"_id": 0, "number": 1, "name": 1, "location": 1, "speed": 1, "direction": 1}
+
+_rng = np.random.default_rng()
+
+# Timings of the last simulation tick
+tick_stats = {"ticks": 0, "trains": 0, "tick_seconds": None, "ticks_per_second": None}
+
+async def apply_train_moves(db, trains, fields=("location", "direction")):
     """
-    query = {}
-    if train_number:
-        query["number"] = train_number
+    Persist and announce new train positions
     
-    trains = await db.trains.find(query).to_list(1000)
-    updated_trains = []
+    trains are documents whose location (and the other fields) already
+    hold their new values. They are written with one unordered bulk_write
+    for trains and one for their objects, then published, recorded and
+    checked for station proximity without being read again. Returns the
+    number of alerts opened.
+    """
+    train_operations = []
+    object_operations = []
     
     for train in trains:
-        # If specific distance provided, calculate speed to move that distance
-        if distance_km:
-            # Convert distance from km to degrees (approximate)
-            distance_in_degrees = distance_km / 111
-            
-            # Calculate new coordinates based on direction
-            direction_radians = (train["direction"] * math.pi) / 180
-            new_lon = train["location"]["coordinates"][0] + distance_in_degrees * math.cos(direction_radians)
-            new_lat = train["location"]["coordinates"][1] + distance_in_degrees * math.sin(direction_radians)
-        else:
-            # Calculate new position based on speed and direction
-            # Speed is in km/h, convert to degrees per interval (5 seconds)
-            # Approximate conversion: 1 degree ≈ 111 km at the equator
-            speed_in_degrees = (train["speed"] / 3600) * 5 / 111
-            
-            # Calculate new coordinates based on direction
-            direction_radians = (train["direction"] * math.pi) / 180
-            new_lon = train["location"]["coordinates"][0] + speed_in_degrees * math.cos(direction_radians)
-            new_lat = train["location"]["coordinates"][1] + speed_in_degrees * math.sin(direction_radians)
-        
-        # Update train location
-        await db.trains.update_one(
+        train_operations.append(UpdateOne(
             {"number": train["number"]},
-            {
-                "$set": {
-                    "location.coordinates": [new_lon, new_lat],
-                    # Randomly change direction slightly to simulate realistic movement
-                    "direction": (train["direction"] + (10 * (0.5 - random.random()))) % 360
-                }
-            }
-        )
-        
-        # Update objects that should move with the train
-        await db.objects.update_many(
-            {"trainNumber": train["number"]},
-            {"$set": {"location.coordinates": [new_lon, new_lat]}}
-        )
+            {"$set": {field: train[field] for field in fields}}
+        ))
         
-        # Check for station proximity
-        await check_station_proximity(train["number"], db)
-        
-        updated_train = await db.trains.find_one({"number": train["number"]})
-        updated_trains.append(updated_train)
+        # Objects move with the train
+        object_operations.append(UpdateMany({"trainNumber": train["number"]}, {"$set": {"location": train["location"]}}))
+    
+    await asyncio.gather(
+        db.trains.bulk_write(train_operations, ordered=False),
+        db.objects.bulk_write(object_operations, ordered=False)
+    )
     
-    return updated_trains
+    for train in trains:
+        broadcaster.publish_position("train", train["number"], train["location"], train["number"])
+        position_history.record("train", train["number"], train["location"]["coordinates"])
+    
+    return len(await check_stations_for_trains(db, trains))
+
+async def simulate_train_movement(db, train_number=None, distance_km=None, interval_seconds=SIMULATION_TICK_SECONDS):
+    """
+    Advance every train (or one train) by one simulation tick
+    
+    Every new position and heading is computed in one NumPy step and
+    persisted through apply_train_moves. If distance_km is provided,
+    trains move that far instead of speed * interval_seconds. Returns a summary of the tick.
+    """
+    started = time.perf_counter()
+    
+    query = {"number": train_number} if train_number else {}
+    trains = await db.trains.find(query, TICK_TRAIN_FIELDS).to_list(None)
+    if not trains:
+        return {"updated_trains": 0, "alerts_opened": 0, "tick_seconds": 0.0, "ticks_per_second": None}
+    
+    origins = np.array([train["location"]["coordinates"] for train in trains], dtype=float)
+    directions = np.array([train.get("direction", 0) for train in trains], dtype=float)
+    
+    if distance_km is not None:
+        distances = np.full(len(trains), distance_km, dtype=float)
+    else:
+        distances = np.array([train.get("speed", 0) for train in trains], dtype=float) * interval_seconds / 3600
+    
+    # direction is measured anticlockwise from East, bearings clockwise from North
+    positions = destination_points(origins, (90 - directions) % 360, distances)
+    
+    # Randomly change direction slightly to simulate realistic movement
+    new_directions = (directions + _rng.uniform(-SIMULATION_HEADING_JITTER, SIMULATION_HEADING_JITTER, len(trains))) % 360
+    
+    for train, coordinates, direction in zip(trains, positions.tolist(), new_directions.tolist()):
+        train["location"] = {"type": "Point", "coordinates": coordinates}
+        train["direction"] = direction
+    
+    opened = await apply_train_moves(db, trains)
+    
+    elapsed = time.perf_counter() - started
+    tick_stats.update(
+        ticks=tick_stats["ticks"] + 1,
+        trains=len(trains),
+        tick_seconds=elapsed,
+        ticks_per_second=1 / elapsed if elapsed else None
+    )
+    
+    return {
+        "updated_trains": len(trains),
+        "alerts_opened": opened,
+        "tick_seconds": elapsed,
+        "ticks_per_second": tick_stats["ticks_per_second"]
+    }
 
 async def simulate_object_theft(db, object_id, distance_km=0.1):
     """Simulate object theft by moving it away from its train"""
@@ -109,47 +153,3 @@ async def simulate_object_theft(db, object_id, distance_km=0.1):
         "requested_distance_km": distance_km,
         "actual_distance_km": actual_distance
     }
-
-async def simulate_full_journey(db, train_number, destination_station, duration_minutes=30, interval_seconds=30):
-    """Simulate a full journey from current location to destination station"""
-    train = await db.trains.find_one({"number": train_number})
-    if not train:
-        return None
-    
-    destination = await db.stations.find_one({"code": destination_station})
-    if not destination:
-        return None
-    
-    # Calculate total distance and bearing to destination
-    start_coords = train["location"]["coordinates"]
-    dest_coords = destination["location"]["coordinates"]
-    
-    total_distance = haversine_distance(
-        start_coords[1], start_coords[0],
-        dest_coords[1], dest_coords[0]
-    )
-    
-    # Calculate required speed to reach destination in given time
-    required_speed = (total_distance / duration_minutes) * 60  # km/h
-    
-    # Calculate bearing to destination
-    y = math.sin(dest_coords[0] - start_coords[0]) * math.cos(dest_coords[1])
-    x = math.cos(start_coords[1]) * math.sin(dest_coords[1]) - \
-        math.sin(start_coords[1]) * math.cos(dest_coords[1]) * math.cos(dest_coords[0] - start_coords[0])
-    bearing = (math.atan2(y, x) * 180 / math.pi + 360) % 360
-    
-    # Update train with new speed and direction
-    await db.trains.update_one(
-        {"number": train_number},
-        {"$set": {"speed": required_speed, "direction": bearing}}
-    )
-    
-    return {
-        "train": train,
-        "destination": destination,
-        "distance_km": total_distance,
-        "duration_minutes": duration_minutes,
-        "speed_kmh": required_speed,
-        "direction_degrees": bearing,
-        "updates_count": duration_minutes * 60 // interval_seconds
-    }
\ No newline at end of file
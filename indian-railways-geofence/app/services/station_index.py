@@ -0,0 +1,122 @@
+import math
+import os
+
+from app.utils.distance import haversine_distance, EARTH_RADIUS_KM
+
+# Size of a grid cell in degrees (0.25 degrees is roughly 28 km)
+STATION_INDEX_CELL_SIZE = float(os.getenv("STATION_INDEX_CELL_SIZE", 0.25))
+
+
+class StationIndex:
+    """
+    Process-resident spatial index over station coordinates
+
+    Stations are bucketed into a fixed grid of lon/lat cells so a radius
+    query only has to compute distances for the stations in the handful of
+    cells that overlap the search circle.
+    """
+
+    def __init__(self, cell_size=STATION_INDEX_CELL_SIZE):
+        self.cell_size = cell_size
+        self.lon_cells = math.ceil(360 / cell_size)
+        self.loaded = False
+        self.version = 0
+        self._cells = {}  # (x, y) -> {code: station}
+        self._stations = {}  # code -> (cell, station)
+
+    def __len__(self):
+        return len(self._stations)
+
+    def _cell(self, lon, lat):
+        """Get the grid cell containing a point"""
+        x = math.floor((lon + 180) / self.cell_size) % self.lon_cells
+        y = math.floor((lat + 90) / self.cell_size)
+        return (x, y)
+
+    async def load(self, db):
+        """(Re)build the index from the stations collection"""
+        stations = await db.stations.find(
+            {}, {"_id": 0, "code": 1, "name": 1, "location": 1}
+        ).to_list(None)
+
+        self._cells = {}
+        self._stations = {}
+        for station in stations:
+            self.upsert(station)
+
+        self.loaded = True
+        print(f"Station index built with {len(self._stations)} stations")
+
+    def upsert(self, station):
+        """Add a station to the index or move it to its new location"""
+        self.remove(station["code"])
+
+        lon, lat = station["location"]["coordinates"]
+        entry = {
+            "code": station["code"],
+            "name": station["name"],
+            "location": {"type": "Point", "coordinates": [lon, lat]}
+        }
+        cell = self._cell(lon, lat)
+
+        self._cells.setdefault(cell, {})[entry["code"]] = entry
+        self._stations[entry["code"]] = (cell, entry)
+        self.version += 1
+
+    def remove(self, code):
+        """Remove a station from the index"""
+        existing = self._stations.pop(code, None)
+        if existing is None:
+            return
+
+        cell, _ = existing
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(code, None)
+            if not bucket:
+                del self._cells[cell]
+        self.version += 1
+
+    def query_radius(self, lon, lat, radius_km):
+        """
+        Find stations within radius_km of a point
+
+        Returns a list of (station, distance_km) tuples sorted by distance
+        """
+        # Angular extent of the search circle
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        max_lat = min(abs(lat) + dlat, 90)
+        if max_lat >= 89.9:
+            dlon = 180
+        else:
+            dlon = min(dlat / math.cos(math.radians(max_lat)), 180)
+
+        min_x = math.floor((lon - dlon + 180) / self.cell_size)
+        max_x = math.floor((lon + dlon + 180) / self.cell_size)
+        if max_x - min_x + 1 >= self.lon_cells:
+            min_x, max_x = 0, self.lon_cells - 1
+        min_y = math.floor((lat - dlat + 90) / self.cell_size)
+        max_y = math.floor((lat + dlat + 90) / self.cell_size)
+
+        results = []
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                bucket = self._cells.get((x % self.lon_cells, y))
+                if not bucket:
+                    continue
+
+                for station in bucket.values():
+                    station_coords = station["location"]["coordinates"]
+                    distance = haversine_distance(
+                        lat, lon,
+                        station_coords[1], station_coords[0]
+                    )
+                    if distance <= radius_km:
+                        results.append((station, distance))
+
+        results.sort(key=lambda item: item[1])
+        return results
+
+
+# Shared index used by the geo-fencing service and the station routes
+station_index = StationIndex()
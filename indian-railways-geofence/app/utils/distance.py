@@ -1,5 +1,10 @@
 import math
 
+import numpy as np
+
+# Earth's radius in kilometers
+EARTH_RADIUS_KM = 6371
+
 def haversine_distance(lat1, lon1, lat2, lon2):
     """
     Calculate the great circle distance between two points 
@@ -74,4 +79,122 @@ def destination_point(lat, lon, bearing, distance):
     lat2 = math.degrees(lat2)
     lon2 = math.degrees(lon2)
     
-    return (lat2, lon2)
\ No newline at end of file
+    return (lat2, lon2)
+
+
+# Batch versions of the functions above, backed by NumPy.
+# Coordinates are given in GeoJSON [longitude, latitude] order, either as a
+# single point of shape (2,) or as an array of points of shape (N, 2).
+
+def _as_lonlat(points):
+    """Convert coordinates to radian longitude and latitude arrays"""
+    points = np.radians(np.asarray(points, dtype=float))
+    return points[..., 0], points[..., 1]
+
+def _haversine(lon1, lat1, lon2, lat2):
+    """Haversine distance in kilometers for broadcastable radian arrays"""
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    c = 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    
+    return c * EARTH_RADIUS_KM
+
+def _bearing(lon1, lat1, lon2, lat2):
+    """Bearing in degrees (0-360) for broadcastable radian arrays"""
+    y = np.sin(lon2 - lon1) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - \
+        np.sin(lat1) * np.cos(lat2) * np.cos(lon2 - lon1)
+    
+    return (np.degrees(np.arctan2(y, x)) + 360) % 360
+
+def haversine_one_to_many(origin, points):
+    """
+    Calculate the distance from one [lon, lat] point to each of N points
+    
+    Returns an array of shape (N,) in kilometers
+    """
+    lon1, lat1 = _as_lonlat(origin)
+    lon2, lat2 = _as_lonlat(points)
+    
+    return _haversine(lon1, lat1, lon2, lat2)
+
+def haversine_pairwise(points_a, points_b):
+    """
+    Calculate the distance between every point in points_a (N, 2)
+    and every point in points_b (M, 2)
+    
+    Returns an array of shape (N, M) in kilometers
+    """
+    lon1, lat1 = _as_lonlat(points_a)
+    lon2, lat2 = _as_lonlat(points_b)
+    
+    return _haversine(lon1[:, None], lat1[:, None], lon2[None, :], lat2[None, :])
+
+def haversine_elementwise(points_a, points_b):
+    """
+    Calculate the distance between points_a[i] and points_b[i]
+    
+    Returns an array of shape (N,) in kilometers
+    """
+    lon1, lat1 = _as_lonlat(points_a)
+    lon2, lat2 = _as_lonlat(points_b)
+    
+    return _haversine(lon1, lat1, lon2, lat2)
+
+def bearing_one_to_many(origin, points):
+    """
+    Calculate the bearing from one [lon, lat] point to each of N points
+    
+    Returns an array of shape (N,) in degrees (0-360, where 0 is North)
+    """
+    lon1, lat1 = _as_lonlat(origin)
+    lon2, lat2 = _as_lonlat(points)
+    
+    return _bearing(lon1, lat1, lon2, lat2)
+
+def bearing_pairwise(points_a, points_b):
+    """
+    Calculate the bearing from every point in points_a (N, 2)
+    to every point in points_b (M, 2)
+    
+    Returns an array of shape (N, M) in degrees
+    """
+    lon1, lat1 = _as_lonlat(points_a)
+    lon2, lat2 = _as_lonlat(points_b)
+    
+    return _bearing(lon1[:, None], lat1[:, None], lon2[None, :], lat2[None, :])
+
+def bearing_elementwise(points_a, points_b):
+    """
+    Calculate the bearing from points_a[i] to points_b[i]
+    
+    Returns an array of shape (N,) in degrees
+    """
+    lon1, lat1 = _as_lonlat(points_a)
+    lon2, lat2 = _as_lonlat(points_b)
+    
+    return _bearing(lon1, lat1, lon2, lat2)
+
+def destination_points(origins, bearings, distances):
+    """
+    Calculate destination points given starting [lon, lat] points,
+    bearings (in degrees) and distances (in kilometers)
+    
+    Inputs broadcast against each other, so a single origin can be
+    combined with many bearings or distances and vice versa.
+    Returns an array of [lon, lat] points of shape (N, 2)
+    """
+    lon, lat = _as_lonlat(origins)
+    bearing = np.radians(np.asarray(bearings, dtype=float))
+    
+    # Angular distance
+    d = np.asarray(distances, dtype=float) / EARTH_RADIUS_KM
+    
+    lat2 = np.arcsin(np.sin(lat) * np.cos(d) +
+                     np.cos(lat) * np.sin(d) * np.cos(bearing))
+    
+    lon2 = lon + np.arctan2(np.sin(bearing) * np.sin(d) * np.cos(lat),
+                            np.cos(d) - np.sin(lat) * np.sin(lat2))
+    
+    return np.stack(np.broadcast_arrays(np.degrees(lon2), np.degrees(lat2)), axis=-1)
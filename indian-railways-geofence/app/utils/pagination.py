@@ -0,0 +1,135 @@
+import base64
+import binascii
+import json
+import os
+from datetime import datetime
+
+from bson import json_util
+from bson.objectid import ObjectId
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.utils.db import format_mongo_doc
+
+# Page sizes for list endpoints
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 1000
+
+# Response header carrying the continuation token
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Types a sort key value in a cursor may have; anything else could carry
+# query operators into the keyset filter
+CURSOR_VALUE_TYPES = (datetime, ObjectId, str, int, float, type(None))
+
+# Documents fetched per round trip and written per chunk when streaming
+NDJSON_BATCH_SIZE = int(os.getenv("NDJSON_BATCH_SIZE", 500))
+
+def encode_cursor(values):
+    """Encode the sort key values of the last document as an opaque token"""
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+def decode_cursor(token):
+    """Decode a continuation token back into sort key values"""
+    try:
+        return json_util.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _keyset_filter(sort, values):
+    """Build a filter matching documents that sort after the given key values"""
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if any(isinstance(value, bool) or not isinstance(value, CURSOR_VALUE_TYPES) for value in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {sort[j][0]: values[j] for j in range(i)}
+        clause[field] = {"$gt" if direction > 0 else "$lt": values[i]}
+        clauses.append(clause)
+
+    return {"$or": clauses}
+
+def parse_fields(fields):
+    """Parse a comma-separated field list into a list of field names"""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+def _find(collection, query, sort, cursor, fields):
+    """Start a sorted find resuming after the cursor position"""
+    if cursor:
+        query = {"$and": [query, _keyset_filter(sort, decode_cursor(cursor))]}
+
+    projection = None
+    if fields:
+        # Always fetch the sort keys so the next cursor can be built
+        projection = {field: 1 for field in fields if field != "id"}
+        projection.update({field: 1 for field, _ in sort})
+
+    return collection.find(query, projection).sort(sort)
+
+def _format(doc, fields, expose_id):
+    """Format a document for a response, keeping only the requested fields"""
+    if not expose_id:
+        doc.pop("_id", None)
+    doc = format_mongo_doc(doc)
+    if fields:
+        doc = {field: doc[field] for field in fields if field in doc}
+    return doc
+
+async def find_page(collection, query, sort, limit, cursor=None, fields=None):
+    """
+    Fetch one page of a collection using keyset pagination
+
+    sort must end with a unique key so every document has a distinct
+    position. Returns the documents and the continuation token for the
+    next page (None on the last page).
+    """
+    docs = await _find(collection, query, sort, cursor, fields).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor([docs[-1].get(field) for field, _ in sort])
+
+    return docs, next_cursor
+
+def projected_response(docs, fields, next_cursor, expose_id=False):
+    """
+    Build a response containing only the requested fields
+
+    When expose_id is set the MongoDB _id is returned as "id", otherwise
+    it is dropped.
+    """
+    items = [_format(doc, fields, expose_id) for doc in docs]
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return JSONResponse(jsonable_encoder(items), headers=headers)
+
+def set_next_cursor(response, next_cursor):
+    """Add the continuation token to a response"""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+def ndjson_response(collection, query, sort, cursor=None, fields=None, expose_id=False):
+    """
+    Stream every matching document as newline-delimited JSON
+
+    Documents are read from the database cursor in batches and written as
+    they arrive, so memory use does not grow with the result size.
+    """
+    docs = _find(collection, query, sort, cursor, fields).batch_size(NDJSON_BATCH_SIZE)
+
+    async def lines():
+        chunk = []
+        async for doc in docs:
+            chunk.append(json.dumps(_format(doc, fields, expose_id), default=str))
+            if len(chunk) >= NDJSON_BATCH_SIZE:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,40 @@
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+import orjson
+
+def _default(value):
+    """Encode the BSON types orjson does not know about"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, which encodes datetime natively"""
+
+    def render(self, content):
+        return orjson.dumps(content, default=_default)
+
+class DocumentEncoder:
+    """
+    Turn MongoDB documents into a response model's JSON shape without
+    building model instances
+
+    The model's field names and defaults are read once, so each document
+    costs a single dict build. Like format_mongo_doc, _id is returned as
+    the string "id"; datetimes are left for orjson to format.
+    """
+
+    def __init__(self, model):
+        self.fields = [(name, field.default) for name, field in model.__fields__.items()]
+
+    def encode(self, doc):
+        item = {}
+        for name, default in self.fields:
+            if name == "id":
+                item["id"] = str(doc["_id"])
+            else:
+                item[name] = doc.get(name, default)
+        return item
+
+    def encode_many(self, docs):
+        return [self.encode(doc) for doc in docs]
@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+
+from app.utils.distance import (
+    EARTH_RADIUS_KM, haversine_distance, bearing_between_points, haversine_one_to_many, bearing_one_to_many
+)
+
+# Ground resolution of Web Mercator map tiles at zoom 0 on the equator
+METRES_PER_PIXEL_AT_ZOOM_0 = 156543.03392
+
+def segment_distances(start, end, points):
+    """
+    Calculate the distance from each of N [lon, lat] points to the
+    great-circle segment between start and end
+
+    Points beyond either end of the segment are measured to that end.
+    Returns an array of shape (N,) in kilometers.
+    """
+    to_start = haversine_one_to_many(start, points)
+    length = haversine_distance(start[1], start[0], end[1], end[0])
+    if length == 0:
+        return to_start
+
+    # Cross-track and along-track angular distances
+    angular = to_start / EARTH_RADIUS_KM
+    angle = np.radians(
+        bearing_one_to_many(start, points) - bearing_between_points(start[1], start[0], end[1], end[0])
+    )
+    cross_track = np.arcsin(np.clip(np.sin(angular) * np.sin(angle), -1, 1))
+    along_track = np.arccos(np.clip(np.cos(angular) / np.cos(cross_track), -1, 1))
+
+    distances = np.abs(cross_track) * EARTH_RADIUS_KM
+
+    before = np.cos(angle) < 0
+    distances[before] = to_start[before]
+
+    beyond = ~before & (along_track * EARTH_RADIUS_KM > length)
+    if beyond.any():
+        distances[beyond] = haversine_one_to_many(end, points[beyond])
+
+    return distances
+
+def douglas_peucker(coordinates, tolerance_km):
+    """
+    Simplify a [lon, lat] polyline with the Douglas-Peucker algorithm
+
+    Every dropped point is within tolerance_km of the simplified line.
+    Returns the indices of the kept points.
+    """
+    count = len(coordinates)
+    if count < 3:
+        return list(range(count))
+
+    points = np.asarray(coordinates, dtype=float)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    # Iterative so long tracks cannot hit the recursion limit
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        distances = segment_distances(points[first], points[last], points[first + 1:last])
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_km:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return np.flatnonzero(keep).tolist()
+
+def simplify_track(fixes, tolerance_km):
+    """Simplify a list of (timestamp, lon, lat) fixes"""
+    if tolerance_km <= 0:
+        return list(fixes)
+    indices = douglas_peucker([(lon, lat) for _, lon, lat in fixes], tolerance_km)
+    return [fixes[i] for i in indices]
+
+def zoom_tolerance(zoom, latitude, pixels=1.0):
+    """Tolerance in kilometers that keeps simplification error under `pixels` at a map zoom level"""
+    metres_per_pixel = METRES_PER_PIXEL_AT_ZOOM_0 * math.cos(math.radians(latitude)) / 2 ** zoom
+    return pixels * metres_per_pixel / 1000
@@ -0,0 +1,78 @@
+"""
+Micro-benchmark: response_model serialization vs the fast encoder path
+
+Encodes synthetic alert documents the way GET /alerts does by default
+(build Alert models, re-validate them against response_model, then
+jsonable_encoder and json.dumps) and with DocumentEncoder and orjson.
+No database is needed.
+
+    python -m benchmarks.bench_serialization --alerts 1000 --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson.objectid import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.models import Alert
+from app.utils.serialization import DocumentEncoder, FastJSONResponse
+
+def make_alerts(count):
+    """Generate a mix of station and theft alert documents"""
+    now = datetime.now()
+    alerts = []
+    for i in range(count):
+        alert = {
+            "_id": ObjectId(),
+            "trainNumber": "12301",
+            "trainName": "Rajdhani Express",
+            "timestamp": now - timedelta(seconds=i),
+            "resolved": i % 3 == 0
+        }
+        if i % 2:
+            alert.update(type="station_proximity", stationCode="NDLS",
+                         stationName="New Delhi Railway Station", distance=0.85)
+        else:
+            alert.update(type="theft", objectId=f"OBJ{i:05d}", objectType="Bag",
+                         ownerId=str(ObjectId()), coachId="A1")
+        alerts.append(alert)
+    return alerts
+
+def model_path(alerts):
+    # What the route builds
+    items = [Alert(id=str(alert["_id"]), **{k: v for k, v in alert.items() if k != "_id"}) for alert in alerts]
+    # What FastAPI does with it for response_model=List[Alert]
+    validated = [Alert(**item.dict()) for item in items]
+    return JSONResponse(jsonable_encoder(validated)).body
+
+def fast_path(alerts, encoder=DocumentEncoder(Alert)):
+    return FastJSONResponse(encoder.encode_many(alerts)).body
+
+def bench(encode, alerts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encode(alerts)
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alerts", type=int, default=1000, help="Alerts per response")
+    parser.add_argument("--repeat", type=int, default=20, help="Responses encoded per path")
+    args = parser.parse_args()
+
+    alerts = make_alerts(args.alerts)
+    model_seconds = bench(model_path, alerts, args.repeat)
+    fast_seconds = bench(fast_path, alerts, args.repeat)
+
+    print(f"{'path':<20}{'ms/response':>14}{'alerts/s':>14}")
+    for name, seconds in [("response_model", model_seconds), ("fast encoder", fast_seconds)]:
+        print(f"{name:<20}{seconds * 1000:>14.2f}{args.alerts / seconds:>14.0f}")
+    print(f"speedup: {model_seconds / fast_seconds:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Throughput benchmark: PUT /trains/{number}/location vs the telemetry WebSocket
+
+Runs the app in-process with TestClient against the configured database.
+
+    python -m benchmarks.bench_telemetry --fixes 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from app.main import app
+
+def make_fixes(train_numbers, count):
+    """Generate fixes that walk each train slowly eastwards"""
+    fixes = []
+    for i in range(count):
+        number = train_numbers[i % len(train_numbers)]
+        fixes.append({
+            "kind": "train",
+            "seq": i,
+            "id": number,
+            "timestamp": datetime.now().isoformat(),
+            "lon": 77.1 + (i // len(train_numbers)) * 0.0001,
+            "lat": 28.55
+        })
+    return fixes
+
+def bench_put(client, fixes):
+    start = time.perf_counter()
+    for fix in fixes:
+        response = client.put(
+            f"/trains/{fix['id']}/location",
+            json={"type": "Point", "coordinates": [fix["lon"], fix["lat"]]}
+        )
+        assert response.status_code == 200
+    return time.perf_counter() - start
+
+def bench_websocket(client, fixes, frame_size):
+    start = time.perf_counter()
+    acked = 0
+    with client.websocket_connect("/telemetry/ws") as websocket:
+        for i in range(0, len(fixes), frame_size):
+            websocket.send_text(json.dumps(fixes[i:i + frame_size]))
+        
+        while acked < len(fixes):
+            reply = websocket.receive_json()
+            if reply["type"] == "ack":
+                acked += len(reply["results"])
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixes", type=int, default=2000, help="Number of position fixes to send")
+    parser.add_argument("--frame-size", type=int, default=50, help="Fixes per WebSocket frame")
+    args = parser.parse_args()
+    
+    with TestClient(app) as client:
+        train_numbers = [train["number"] for train in client.get("/trains").json()]
+        fixes = make_fixes(train_numbers, args.fixes)
+        
+        put_seconds = bench_put(client, fixes)
+        single_seconds = bench_websocket(client, fixes, 1)
+        framed_seconds = bench_websocket(client, fixes, args.frame_size)
+    
+    print(f"{'path':<28}{'seconds':>10}{'fixes/s':>12}")
+    for name, seconds in [
+        ("PUT /trains/{n}/location", put_seconds),
+        ("WebSocket, 1 fix/frame", single_seconds),
+        (f"WebSocket, {args.frame_size} fixes/frame", framed_seconds),
+    ]:
+        print(f"{name:<28}{seconds:>10.2f}{args.fixes / seconds:>12.0f}")
+
+if __name__ == "__main__":
+    main()
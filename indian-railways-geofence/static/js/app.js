@@ -17,6 +17,7 @@ let stationMarkers = {};
 let objectMarkers = {};
 let selectedTrain = null;
 let refreshInterval;
+let eventSource;
 
 // API base URL
 const API_BASE_URL = 'http://localhost:8000';
@@ -527,6 +528,44 @@ async function simulateFullJourney(trainNumber, destinationStation) {
 
 // Start real-time updates
 function startRealTimeUpdates() {
+    // Fall back to polling if the browser can't stream events
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    
+    // Close existing stream if any
+    if (eventSource) {
+        eventSource.close();
+    }
+    
+    // Subscribe to alert and position changes pushed by the server
+    eventSource = new EventSource(`${API_BASE_URL}/stream/events`);
+    let reconnecting = false;
+    
+    eventSource.addEventListener('open', () => {
+        // Reload everything we may have missed while disconnected
+        if (reconnecting) {
+            reconnecting = false;
+            loadInitialData();
+        }
+    });
+    
+    eventSource.addEventListener('error', () => {
+        reconnecting = true;
+    });
+    
+    eventSource.addEventListener('alert_opened', (e) => applyAlertEvent(JSON.parse(e.data)));
+    eventSource.addEventListener('alert_resolved', (e) => applyAlertEvent(JSON.parse(e.data)));
+    eventSource.addEventListener('train_position', (e) => applyTrainPosition(JSON.parse(e.data)));
+    eventSource.addEventListener('object_position', (e) => applyObjectPosition(JSON.parse(e.data)));
+    
+    // The server dropped events for us, so reload the full state
+    eventSource.addEventListener('resync', () => loadInitialData());
+}
+
+// Poll the API for updates (used when streaming is unavailable)
+function startPolling() {
     // Clear existing interval if any
     if (refreshInterval) {
         clearInterval(refreshInterval);
@@ -538,6 +577,72 @@ function startRealTimeUpdates() {
     }, 5000);
 }
 
+// Check if an alert matches the alert filter form
+function alertMatchesFilters(alert) {
+    const alertType = document.getElementById('alert-type').value;
+    const resolved = document.getElementById('alert-resolved').value;
+    const trainNumber = document.getElementById('alert-train').value;
+    
+    if (alertType && alert.type !== alertType) return false;
+    if (resolved !== '' && String(alert.resolved) !== resolved) return false;
+    if (trainNumber && alert.trainNumber !== trainNumber) return false;
+    return true;
+}
+
+// Apply a pushed alert (opened or resolved)
+function applyAlertEvent(alert) {
+    const index = alerts.findIndex(a => a.id === alert.id);
+    
+    if (alertMatchesFilters(alert)) {
+        if (index >= 0) {
+            alerts[index] = alert;
+        } else {
+            alerts.unshift(alert);
+        }
+    } else if (index >= 0) {
+        alerts.splice(index, 1);
+    }
+    
+    renderAlerts();
+    
+    if (!alert.resolved && index < 0) {
+        showNotification(formatAlertMessage(alert), 'info');
+    }
+    
+    // Update train details if the alert is for the selected train
+    if (selectedTrain && alert.trainNumber === selectedTrain) {
+        updateTrainDetails(selectedTrain);
+    }
+}
+
+// Apply a pushed train position
+function applyTrainPosition(data) {
+    const train = trains.find(t => t.number === data.id);
+    if (!train) {
+        return;
+    }
+    
+    train.location = data.location;
+    renderTrains();
+    
+    // Objects move with their train
+    objects.filter(obj => obj.trainNumber === data.id).forEach(obj => {
+        obj.location = data.location;
+    });
+    renderObjects();
+}
+
+// Apply a pushed object position
+function applyObjectPosition(data) {
+    const obj = objects.find(o => o.id === data.id);
+    if (!obj) {
+        return;
+    }
+    
+    obj.location = data.location;
+    renderObjects();
+}
+
 // Show notification
 function showNotification(message, type = 'info') {
     const notification = document.createElement('div');
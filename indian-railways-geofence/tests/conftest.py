@@ -0,0 +1,41 @@
+import asyncio
+import os
+
+import pytest
+
+# Run the API tests against the in-process backend unless told otherwise
+os.environ.setdefault("DB_BACKEND", "memory")
+
+from app.db.memory import MemoryClient
+from app.db.indexes import ensure_indexes
+
+@pytest.fixture
+def db():
+    """An empty in-memory database with every index created"""
+    database = MemoryClient()["test"]
+    asyncio.run(ensure_indexes(database))
+    return database
+
+@pytest.fixture
+def spy(monkeypatch):
+    """
+    Record calls to a collection method while still running it
+
+    spy(db.trains, "bulk_write") returns the list the positional arguments
+    of each call are appended to. before, if given, is awaited ahead of
+    every call.
+    """
+    def install(collection, method, before=None):
+        calls = []
+        original = getattr(collection, method)
+
+        async def wrapper(*args, **kwargs):
+            calls.append(args)
+            if before:
+                await before(*args)
+            return await original(*args, **kwargs)
+
+        monkeypatch.setattr(collection, method, wrapper)
+        return calls
+
+    return install
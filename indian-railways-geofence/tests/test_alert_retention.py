@@ -0,0 +1,128 @@
+import pytest
+import asyncio
+import gzip
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from app.services.alert_retention import AlertArchiver, write_partitions, read_partitions, partition_path
+
+def make_alert(timestamp, resolved=True, train_number="12301"):
+    return {
+        "_id": ObjectId(),
+        "type": "station_proximity",
+        "trainNumber": train_number,
+        "trainName": "Rajdhani Express",
+        "stationCode": "NDLS",
+        "timestamp": timestamp,
+        "resolved": resolved,
+        "resolvedAt": timestamp + timedelta(minutes=5) if resolved else None
+    }
+
+# Test archive partitions
+def test_partitions_round_trip_by_day(tmp_path):
+    alerts = [make_alert(datetime(2024, 1, 1, 10)), make_alert(datetime(2024, 1, 2, 9))]
+    
+    days = write_partitions(str(tmp_path), alerts)
+    
+    assert [day.isoformat() for day in days] == ["2024-01-01", "2024-01-02"]
+    assert read_partitions(str(tmp_path), datetime(2024, 1, 1)) == alerts[::-1]
+
+def test_read_skips_old_partitions_and_applies_filters(tmp_path):
+    old = make_alert(datetime(2024, 1, 1, 10))
+    other_train = make_alert(datetime(2024, 1, 3, 10), train_number="12951")
+    match = make_alert(datetime(2024, 1, 3, 11))
+    write_partitions(str(tmp_path), [old, other_train, match])
+    
+    alerts = read_partitions(str(tmp_path), datetime(2024, 1, 2), {"trainNumber": "12301"})
+    
+    assert alerts == [match]
+
+def test_read_resumes_before_cursor_key(tmp_path):
+    alerts = [make_alert(datetime(2024, 1, 1, hour)) for hour in range(3)]
+    write_partitions(str(tmp_path), alerts)
+    
+    before = (alerts[1]["timestamp"], alerts[1]["_id"])
+    
+    assert read_partitions(str(tmp_path), datetime(2024, 1, 1), before=before) == [alerts[0]]
+
+def test_read_tolerates_truncated_partition(tmp_path):
+    alert = make_alert(datetime(2024, 1, 1, 10))
+    write_partitions(str(tmp_path), [alert])
+    path = partition_path(str(tmp_path), alert["timestamp"].date())
+    
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data + gzip.compress(b'{"partial": ')[:-8])
+    
+    assert read_partitions(str(tmp_path), datetime(2024, 1, 1)) == [alert]
+
+def test_read_stops_once_limit_is_reached(tmp_path, monkeypatch):
+    from app.services import alert_retention
+    
+    alerts = [make_alert(datetime(2024, 1, day, hour)) for day in range(1, 6) for hour in (9, 10)]
+    write_partitions(str(tmp_path), alerts)
+    
+    opened = []
+    gzip_open = gzip.open
+    
+    def recording_open(path, *args, **kwargs):
+        opened.append(path)
+        return gzip_open(path, *args, **kwargs)
+    
+    monkeypatch.setattr(alert_retention.gzip, "open", recording_open)
+    before = (alerts[7]["timestamp"], alerts[7]["_id"])
+    
+    newest = read_partitions(str(tmp_path), datetime(2024, 1, 1), limit=3)
+    resumed = read_partitions(str(tmp_path), datetime(2024, 1, 1), before=before, limit=2)
+    
+    assert newest == [alerts[9], alerts[8], alerts[7]]
+    assert resumed == [alerts[6], alerts[5]]
+    # Newer partitions than the cursor and older ones than needed stay closed
+    assert [path[-19:-9] for path in opened] == ["2024-01-05", "2024-01-04", "2024-01-04", "2024-01-03"]
+
+# Test the archiver
+def test_archiver_moves_only_old_resolved_alerts(tmp_path, db):
+    now = datetime(2024, 2, 1)
+    old = [make_alert(now - timedelta(days=30, hours=i)) for i in range(5)]
+    old_open = make_alert(now - timedelta(days=30), resolved=False)
+    recent = make_alert(now - timedelta(days=1))
+    asyncio.run(db.alerts.insert_many(old + [old_open, recent]))
+    archiver = AlertArchiver(directory=str(tmp_path), after_days=7, batch_size=2)
+    
+    archived = asyncio.run(archiver.archive(db, now=now))
+    
+    assert archived == 5
+    assert asyncio.run(db.alerts.find({}).sort("timestamp", 1).to_list(None)) == [old_open, recent]
+    assert len(read_partitions(str(tmp_path), now - timedelta(days=60))) == 5
+
+def test_pages_cover_hot_and_archived_alerts_once(tmp_path, db):
+    now = datetime(2024, 2, 1)
+    archived = [make_alert(now - timedelta(days=day)) for day in range(10, 20)]
+    hot = [make_alert(now - timedelta(hours=hour)) for hour in range(1, 4)]
+    write_partitions(str(tmp_path), archived)
+    asyncio.run(db.alerts.insert_many(hot + archived[:1]))  # archived but not deleted yet
+    archiver = AlertArchiver(directory=str(tmp_path))
+    
+    async def all_pages():
+        pages, cursor = [], None
+        while True:
+            page, cursor = await archiver.find_page(db, {"timestamp": {"$gte": now - timedelta(days=30)}}, now - timedelta(days=30), 4, cursor)
+            pages.append(page)
+            if not cursor:
+                return pages
+    
+    pages = asyncio.run(all_pages())
+    
+    assert [len(page) for page in pages] == [4, 4, 4, 1]
+    assert [alert["_id"] for page in pages for alert in page] == [alert["_id"] for alert in hot + archived]
+
+def test_cursor_that_is_not_an_alert_key_is_rejected(tmp_path, db):
+    from fastapi import HTTPException
+    from app.utils.pagination import encode_cursor
+    now = datetime(2024, 2, 1)
+    archiver = AlertArchiver(directory=str(tmp_path))
+    
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(archiver.find_page(db, {}, now - timedelta(days=30), 4, encode_cursor(["x", "y"])))
+    
+    assert error.value.status_code == 400
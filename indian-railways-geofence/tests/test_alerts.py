@@ -0,0 +1,295 @@
+import pytest
+import asyncio
+from datetime import datetime
+from app.services import geo_fencing
+from app.services.alert_state import ActiveAlertTable
+from app.utils.distance import destination_point
+
+def station_alert(train_number, station_code):
+    return {
+        "type": "station_proximity",
+        "trainNumber": train_number,
+        "stationCode": station_code,
+        "resolved": False
+    }
+
+def theft_alert(object_id):
+    return {
+        "type": "theft",
+        "trainNumber": "12301",
+        "objectId": object_id,
+        "resolved": False
+    }
+
+# Test the open alert table
+def test_station_alerts_keyed_by_train_and_station():
+    table = ActiveAlertTable()
+    table.add(station_alert("12301", "NDLS"))
+    table.add(station_alert("12301", "JP"))
+    table.add(station_alert("12002", "NDLS"))
+    
+    assert set(table.station_alerts("12301")) == {"NDLS", "JP"}
+    assert set(table.station_alerts("12002")) == {"NDLS"}
+    assert table.station_alerts("99999") == {}
+    assert len(table) == 3
+    
+    table.discard(station_alert("12301", "NDLS"))
+    assert set(table.station_alerts("12301")) == {"JP"}
+    
+    table.discard_station_alert("12301", "JP")
+    table.discard_station_alert("12301", "JP")
+    assert table.station_alerts("12301") == {}
+    assert len(table) == 1
+
+def test_theft_alerts_keyed_by_object():
+    table = ActiveAlertTable()
+    alert = theft_alert("OBJ001")
+    table.add(alert)
+    
+    assert table.theft_alert("OBJ001") is alert
+    assert table.theft_alert("OBJ002") is None
+    
+    table.discard(alert)
+    assert table.theft_alert("OBJ001") is None
+    assert len(table) == 0
+
+def test_station_alerts_returns_copy():
+    table = ActiveAlertTable()
+    table.add(station_alert("12301", "NDLS"))
+    
+    alerts = table.station_alerts("12301")
+    alerts.clear()
+    
+    assert set(table.station_alerts("12301")) == {"NDLS"}
+
+# Test alert rollup updates
+def test_rollup_operations_for_opened_and_resolved(db):
+    from datetime import datetime
+    from app.services.alert_rollups import record_alert_changes
+    
+    alert = dict(station_alert("12301", "NDLS"), trainName="Rajdhani Express", timestamp=datetime(2023, 5, 8, 10, 42, 7))
+    
+    async def buckets():
+        return await db.alert_rollups.find({}, {"_id": 0}).sort("resolved", 1).to_list(None)
+    
+    asyncio.run(record_alert_changes(db, opened=[alert]))
+    assert asyncio.run(buckets()) == [{
+        "hour": datetime(2023, 5, 8, 10),
+        "type": "station_proximity",
+        "trainNumber": "12301",
+        "stationCode": "NDLS",
+        "resolved": False,
+        "count": 1,
+        "trainName": "Rajdhani Express"
+    }]
+    
+    # Resolving moves the count from the unresolved to the resolved bucket
+    asyncio.run(record_alert_changes(db, resolved=[alert]))
+    resolved = asyncio.run(buckets())
+    assert [(bucket["resolved"], bucket["count"]) for bucket in resolved] == [(False, 0), (True, 1)]
+    assert all(bucket["hour"] == datetime(2023, 5, 8, 10) for bucket in resolved)
+    
+    asyncio.run(record_alert_changes(db))
+    assert len(asyncio.run(buckets())) == 2
+
+# Test the geo-fencing checks against the memory backend
+@pytest.fixture
+def alert_table(monkeypatch):
+    table = ActiveAlertTable()
+    monkeypatch.setattr(geo_fencing, "alert_state", table)
+    return table
+
+def point(lat, lon):
+    return {"type": "Point", "coordinates": [lon, lat]}
+
+def test_check_objects_for_train_opens_and_resolves_theft_alerts(db, alert_table):
+    train = point(28.6, 77.2)
+    away = point(*destination_point(28.6, 77.2, 90, 0.2))
+    
+    async def scenario():
+        await db.trains.insert_one({
+            "number": "12301", "name": "Rajdhani Express", "location": train,
+            "coaches": [{"id": "A1", "geofenceRadius": 0.05}, {"id": "B1", "geofenceRadius": 0.5}]
+        })
+        await db.objects.insert_many([
+            {"id": "IN", "type": "bag", "ownerId": "Asha", "trainNumber": "12301", "coachId": "A1", "location": train},
+            {"id": "OUT", "type": "laptop", "ownerId": "Ravi", "trainNumber": "12301", "coachId": "A1", "location": away},
+            {"id": "WIDE", "type": "bag", "ownerId": "Asha", "trainNumber": "12301", "coachId": "B1", "location": away},
+            {"id": "GONE", "type": "bag", "ownerId": "Asha", "trainNumber": "12301", "coachId": "Z9", "location": away}
+        ])
+        
+        opened = await geo_fencing.check_objects_for_train("12301", db)
+        again = await geo_fencing.check_objects_for_train("12301", db)
+        open_alerts = await db.alerts.find({"resolved": False}).to_list(None)
+        
+        await db.objects.update_one({"id": "OUT"}, {"$set": {"location": train}})
+        reopened = await geo_fencing.check_objects_for_train("12301", db)
+        alerts = await db.alerts.find({}).to_list(None)
+        return opened, again, open_alerts, reopened, alerts
+    
+    opened, again, open_alerts, reopened, alerts = asyncio.run(scenario())
+    
+    assert [(alert["objectId"], alert["ownerId"], alert["coachId"]) for alert in opened] == [("OUT", "Ravi", "A1")]
+    assert opened[0]["distance"] == pytest.approx(0.2, rel=1e-6)
+    assert again == [] and [alert["objectId"] for alert in open_alerts] == ["OUT"]
+    
+    # Back inside the coach fence
+    assert reopened == []
+    assert [(alert["objectId"], alert["resolved"]) for alert in alerts] == [("OUT", True)]
+    assert len(alert_table) == 0
+
+def test_station_proximity_with_near_sphere_queries(monkeypatch, db, alert_table):
+    from app.services.movement_budget import MovementBudget
+    
+    budget = MovementBudget()
+    monkeypatch.setattr(geo_fencing, "movement_budget", budget)
+    monkeypatch.setattr(geo_fencing, "STATION_PROXIMITY_MODE", "database")
+    monkeypatch.setattr(geo_fencing, "STATION_PROXIMITY_RADIUS", 1.0)
+    
+    async def scenario():
+        await db.stations.insert_many([
+            {"code": code, "name": f"Station {code}", "location": point(*destination_point(28.6, 77.2, bearing, km))}
+            for code, bearing, km in (("NEAR", 0, 0.5), ("EDGE", 90, 0.99), ("FAR", 180, 1.5), ("AWAY", 0, 30))
+        ])
+        await db.trains.insert_one({"number": "12301", "name": "Rajdhani Express", "location": point(28.6, 77.2)})
+        
+        opened = await geo_fencing.check_station_proximity("12301", db)
+        
+        # Move next to the far station only
+        await db.trains.update_one({"number": "12301"}, {"$set": {"location": point(*destination_point(28.6, 77.2, 180, 1.4))}})
+        moved = await geo_fencing.check_station_proximity("12301", db)
+        return opened, moved, await db.alerts.find({}).sort("stationCode", 1).to_list(None)
+    
+    opened, moved, alerts = asyncio.run(scenario())
+    
+    assert sorted(alert["stationCode"] for alert in opened) == ["EDGE", "NEAR"]
+    assert [alert["stationCode"] for alert in moved] == ["FAR"]
+    assert [(alert["stationCode"], alert["resolved"]) for alert in alerts] == [("EDGE", True), ("FAR", False), ("NEAR", True)]
+    assert set(alert_table.station_alerts("12301")) == {"FAR"}
+    # Evaluations are counted even though no budget is kept in database mode
+    assert budget.stats() == {"evaluated": 2, "skipped": 0, "tracked_trains": 0}
+
+def test_failed_alert_write_leaves_no_phantom_open_alert(monkeypatch, db, spy, alert_table):
+    from app.services.movement_budget import MovementBudget
+    from app.services.station_index import StationIndex
+    
+    budget = MovementBudget()
+    monkeypatch.setattr(geo_fencing, "STATION_PROXIMITY_MODE", "index")
+    monkeypatch.setattr(geo_fencing, "station_index", StationIndex())
+    monkeypatch.setattr(geo_fencing, "movement_budget", budget)
+    
+    async def fail_first_write(*args):
+        if len(writes) == 1:
+            raise ConnectionError("primary stepped down")
+    
+    writes = spy(db.alerts, "bulk_write", before=fail_first_write)
+    
+    async def scenario():
+        await db.stations.insert_one({"code": "NDLS", "name": "New Delhi", "location": point(*destination_point(28.6, 77.2, 0, 0.5))})
+        await db.trains.insert_one({"number": "12301", "name": "Rajdhani Express", "location": point(28.6, 77.2)})
+        
+        with pytest.raises(ConnectionError):
+            await geo_fencing.check_station_proximity("12301", db)
+        failed = (alert_table.station_alerts("12301"), budget.stats()["tracked_trains"])
+        
+        retried = await geo_fencing.check_station_proximity("12301", db)
+        return failed, retried, await db.alerts.find({}).to_list(None)
+    
+    failed, retried, alerts = asyncio.run(scenario())
+    
+    assert failed == ({}, 0)
+    assert [alert["stationCode"] for alert in retried] == ["NDLS"]
+    assert [alert["stationCode"] for alert in alerts] == ["NDLS"]
+    assert set(alert_table.station_alerts("12301")) == {"NDLS"}
+
+def test_moved_trains_share_one_alert_and_rollup_write(monkeypatch, db, spy, alert_table):
+    from app.services.movement_budget import MovementBudget
+    from app.services.station_index import StationIndex
+    
+    monkeypatch.setattr(geo_fencing, "STATION_PROXIMITY_MODE", "index")
+    monkeypatch.setattr(geo_fencing, "station_index", StationIndex())
+    monkeypatch.setattr(geo_fencing, "movement_budget", MovementBudget())
+    alert_writes = spy(db.alerts, "bulk_write")
+    rollup_writes = spy(db.alert_rollups, "bulk_write")
+    
+    async def scenario():
+        await db.alerts.insert_one(dict(station_alert("12002", "BCT"), trainName="Mumbai Rajdhani", timestamp=datetime(2024, 1, 1)))
+        await db.stations.insert_many([
+            {"code": "NDLS", "name": "New Delhi", "location": point(*destination_point(28.6, 77.2, 0, 0.5))},
+            {"code": "JP", "name": "Jaipur", "location": point(*destination_point(26.9, 75.8, 0, 0.5))}
+        ])
+        trains = [
+            {"number": "12301", "name": "Rajdhani Express", "location": point(28.6, 77.2)},
+            {"number": "12951", "name": "Ajmer Shatabdi", "location": point(26.9, 75.8)},
+            {"number": "12002", "name": "Mumbai Rajdhani", "location": point(20.0, 73.0)}
+        ]
+        opened = await geo_fencing.check_stations_for_trains(db, trains)
+        return opened, await db.alerts.find_one({"stationCode": "BCT"})
+    
+    opened, left = asyncio.run(scenario())
+    
+    assert [(alert["trainNumber"], alert["stationCode"]) for alert in opened] == [("12301", "NDLS"), ("12951", "JP")]
+    assert len(alert_writes) == 1 and len(alert_writes[0][0]) == 3
+    assert len(rollup_writes) == 1
+    assert left["resolved"] and alert_table.station_alerts("12002") == {}
+
+def test_failed_theft_resolve_keeps_the_alert_open(monkeypatch, db, spy, alert_table):
+    train = point(28.6, 77.2)
+    
+    async def scenario():
+        await db.trains.insert_one({"number": "12301", "name": "Rajdhani Express", "location": train, "coaches": [{"id": "A1"}]})
+        await db.objects.insert_one({
+            "id": "BAG", "type": "bag", "ownerId": "Asha", "trainNumber": "12301", "coachId": "A1",
+            "location": point(*destination_point(28.6, 77.2, 90, 0.2))
+        })
+        await geo_fencing.check_objects_for_train("12301", db)
+        
+        async def fail(*args):
+            raise ConnectionError("primary stepped down")
+        
+        spy(db.alerts, "bulk_write", before=fail)
+        await db.objects.update_one({"id": "BAG"}, {"$set": {"location": train}})
+        with pytest.raises(ConnectionError):
+            await geo_fencing.check_objects_for_train("12301", db)
+    
+    asyncio.run(scenario())
+    
+    assert alert_table.theft_alert("BAG")["resolved"] is False
+
+# Test alert statistics
+def test_alert_stats_from_raw_alerts_and_rollups(monkeypatch, db):
+    from datetime import datetime, timedelta
+    from app.services import alerts
+    from app.services.alert_rollups import rebuild_rollups
+    
+    recent = datetime.now() - timedelta(hours=2)
+    
+    async def scenario():
+        await db.alerts.insert_many([
+            dict(station_alert("12301", "NDLS"), trainName="Rajdhani Express", timestamp=recent),
+            dict(station_alert("12301", "JP"), trainName="Rajdhani Express", timestamp=recent, resolved=True),
+            dict(theft_alert("OBJ001"), trainName="Rajdhani Express", timestamp=recent),
+            dict(station_alert("12002", "NDLS"), trainName="Shatabdi Express", timestamp=recent, resolved=True),
+            # Outside the window
+            dict(theft_alert("OBJ002"), trainName="Rajdhani Express", timestamp=recent - timedelta(days=30))
+        ])
+        await rebuild_rollups(db)
+        
+        stats = {}
+        for source in ("raw", "rollups"):
+            monkeypatch.setattr(alerts, "ALERT_STATS_SOURCE", source)
+            stats[source] = await alerts.get_alert_stats(db, days=7)
+        return stats
+    
+    stats = asyncio.run(scenario())
+    
+    assert stats["raw"] == stats["rollups"] == {
+        "total": 4,
+        "by_type": {"station_proximity": 3, "theft": 1},
+        "by_status": {"resolved": 2, "unresolved": 2},
+        "by_train": [
+            {"trainNumber": "12301", "trainName": "Rajdhani Express", "alertCount": 3},
+            {"trainNumber": "12002", "trainName": "Shatabdi Express", "alertCount": 1}
+        ],
+        "period_days": 7
+    }
@@ -4,6 +4,12 @@ from app.main import app
 
 client = TestClient(app)
 
+@pytest.fixture(scope="module", autouse=True)
+def running_app():
+    # Startup connects to the database and seeds it
+    with client:
+        yield
+
 # Test station endpoints
 def test_get_stations():
     response = client.get("/stations")
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from app.services.broadcaster import Broadcaster, Subscription, BROADCAST_BUFFER_SIZE
+
+def alert(train_number, station_code=None, alert_type="station_proximity", resolved=False):
+    return {
+        "type": alert_type,
+        "trainNumber": train_number,
+        "stationCode": station_code,
+        "resolved": resolved
+    }
+
+# Test server-side filters
+def test_filters():
+    async def run():
+        broadcaster = Broadcaster()
+        everything = broadcaster.subscribe()
+        train = broadcaster.subscribe(train="12301")
+        station = broadcaster.subscribe(station="NDLS")
+        theft = broadcaster.subscribe(alert_type="theft")
+        
+        broadcaster.publish_alert(alert("12301", "NDLS"))
+        broadcaster.publish_alert(alert("12002", "JP", resolved=True))
+        broadcaster.publish_alert(alert("12002", alert_type="theft"))
+        broadcaster.publish_position("train", "12301", {"type": "Point", "coordinates": [77.0, 28.0]}, "12301")
+        
+        def drain(subscription):
+            events = []
+            while not subscription._queue.empty():
+                events.append(subscription._queue.get_nowait())
+            return [event["event"] for event in events]
+        
+        return drain(everything), drain(train), drain(station), drain(theft)
+    
+    everything, train, station, theft = asyncio.run(run())
+    
+    assert everything == ["alert_opened", "alert_resolved", "alert_opened", "train_position"]
+    assert train == ["alert_opened", "train_position"]
+    # Theft alerts carry no station, so a station filter lets them through
+    assert station == ["alert_opened", "alert_opened", "train_position"]
+    assert theft == ["alert_opened", "train_position"]
+
+# Test bounded buffers
+def test_overflow_drops_oldest_and_requests_resync():
+    async def run():
+        subscription = Subscription(maxsize=2)
+        for i in range(5):
+            subscription.offer({"event": "train_position", "data": {"id": str(i)}})
+        
+        return [await subscription.get() for _ in range(3)], subscription.dropped
+    
+    events, dropped = asyncio.run(run())
+    
+    assert dropped == 3
+    assert events[0]["event"] == "resync"
+    assert [event["data"]["id"] for event in events[1:]] == ["3", "4"]
+
+def test_dropped_total_outlives_subscribers():
+    async def run():
+        broadcaster = Broadcaster()
+        slow = broadcaster.subscribe()
+        for i in range(BROADCAST_BUFFER_SIZE + 2):
+            broadcaster.publish_position("train", str(i), None)
+        broadcaster.unsubscribe(slow)
+        return slow.dropped, broadcaster.stats()
+    
+    dropped, stats = asyncio.run(run())
+    
+    assert dropped == 2
+    assert stats["dropped"] == 2 and stats["subscribers"] == 0
+
+def test_unsubscribe():
+    async def run():
+        broadcaster = Broadcaster()
+        subscription = broadcaster.subscribe()
+        broadcaster.unsubscribe(subscription)
+        broadcaster.publish_alert(alert("12301", "NDLS"))
+        return subscription._queue.empty(), broadcaster.stats()
+    
+    empty, stats = asyncio.run(run())
+    
+    assert empty
+    assert stats["subscribers"] == 0
@@ -0,0 +1,82 @@
+import pytest
+import asyncio
+from app.db import generate
+from app.db.generate import SyntheticFleet, INDIA_BOUNDS
+
+def flatten(batches):
+    return [doc for batch in batches for doc in batch]
+
+# Test that the same seed gives the same dataset
+def test_fleet_is_reproducible():
+    first = SyntheticFleet(20, 30, 40, 50, seed=7)
+    second = SyntheticFleet(20, 30, 40, 50, seed=7)
+    other = SyntheticFleet(20, 30, 40, 50, seed=8)
+
+    assert flatten(first.train_batches(8)) == flatten(second.train_batches(8))
+    assert flatten(first.object_batches(8)) == flatten(second.object_batches(8))
+    assert flatten(first.train_batches(8)) != flatten(other.train_batches(8))
+
+# Test that batches never exceed the batch size
+def test_batches_are_bounded():
+    fleet = SyntheticFleet(0, 5, 10, 23, seed=1)
+
+    assert [len(batch) for batch in fleet.object_batches(10)] == [10, 10, 3]
+
+# Test that users and objects reference existing trains and coaches
+def test_references_are_consistent():
+    fleet = SyntheticFleet(10, 15, 20, 60, seed=3)
+    trains = {train["number"]: train for train in flatten(fleet.train_batches(7))}
+    users = flatten(fleet.user_batches(7))
+    objects = flatten(fleet.object_batches(7))
+
+    for user in users:
+        assert user["currentCoach"] in [coach["id"] for coach in trains[user["currentTrain"]]["coaches"]]
+
+    # Names are not unique, so find each object's owner through registeredObjects
+    owners = {object_id: user for user in users for object_id in user["registeredObjects"]}
+    for obj in objects:
+        owner = owners[obj["id"]]
+        assert obj["ownerId"] == owner["name"]
+        assert (obj["trainNumber"], obj["coachId"]) == (owner["currentTrain"], owner["currentCoach"])
+        assert obj["location"] == trains[obj["trainNumber"]]["location"]
+
+    assert sum(len(user["registeredObjects"]) for user in users) == 60
+
+# Test that keys are unique and locations are inside India's bounding box
+def test_keys_unique_and_in_bounds():
+    fleet = SyntheticFleet(50, 50, 50, 50, seed=5)
+    stations = flatten(fleet.station_batches(20))
+    trains = flatten(fleet.train_batches(20))
+    users = flatten(fleet.user_batches(20))
+
+    assert len({station["code"] for station in stations}) == 50
+    assert len({user["email"] for user in users}) == len({user["phone"] for user in users}) == 50
+
+    low, high = INDIA_BOUNDS
+    for doc in stations + trains:
+        lon, lat = doc["location"]["coordinates"]
+        assert low[0] <= lon <= high[0] and low[1] <= lat <= high[1]
+
+    for train in trains:
+        assert len(train["coaches"]) >= 4
+
+# Test streaming into the database in batches
+def test_generate_dataset_inserts_in_batches(db, spy):
+    trains = spy(db.trains, "insert_many")
+    objects = spy(db.objects, "insert_many")
+    
+    counts = asyncio.run(generate.generate_dataset(db, stations=5, trains=12, users=9, objects=25, seed=2, batch_size=10))
+    
+    assert counts == {"stations": 5, "trains": 12, "users": 9, "objects": 25}
+    assert [len(docs) for docs, in trains] == [10, 2]
+    assert [len(docs) for docs, in objects] == [10, 10, 5]
+    assert asyncio.run(db.objects.count_documents({})) == 25
+
+# Test that startup generation is skipped once a fleet exists
+def test_generate_on_startup_runs_once(monkeypatch, db):
+    for name, value in [("STATIONS", 2), ("TRAINS", 3), ("USERS", 4), ("OBJECTS", 5), ("BATCH_SIZE", 10)]:
+        monkeypatch.setattr(generate, f"GENERATE_{name}", value)
+    
+    assert asyncio.run(generate.generate_on_startup(db)) == {"stations": 2, "trains": 3, "users": 4, "objects": 5}
+    assert asyncio.run(generate.generate_on_startup(db)) is None
+    assert asyncio.run(db.trains.count_documents({})) == 3
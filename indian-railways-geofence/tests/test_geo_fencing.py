@@ -1,5 +1,13 @@
+import random
+
+import numpy as np
 import pytest
-from app.utils.distance import haversine_distance, bearing_between_points, destination_point
+from app.utils.distance import (
+    haversine_distance, bearing_between_points, destination_point,
+    haversine_one_to_many, haversine_pairwise, haversine_elementwise,
+    bearing_one_to_many, bearing_pairwise, bearing_elementwise,
+    destination_points
+)
 
 # Test haversine distance calculation
 def test_haversine_distance():
@@ -79,4 +87,65 @@ def test_destination_point():
     
     # Check if distance is approximately correct
     actual_distance = haversine_distance(delhi_lat, delhi_lon, south_lat, south_lon)
-    assert 95 <= actual_distance <= 105
\ No newline at end of file
+    assert 95 <= actual_distance <= 105
+
+def random_points(rng, count):
+    """Random [lon, lat] points across India"""
+    return np.array([[rng.uniform(68.0, 97.0), rng.uniform(8.0, 37.0)] for _ in range(count)])
+
+# Test batch distance calculations against the scalar versions
+def test_haversine_batch_matches_scalar():
+    rng = random.Random(42)
+    points_a = random_points(rng, 20)
+    points_b = random_points(rng, 30)
+    
+    pairwise = haversine_pairwise(points_a, points_b)
+    assert pairwise.shape == (20, 30)
+    for i, (lon1, lat1) in enumerate(points_a):
+        for j, (lon2, lat2) in enumerate(points_b):
+            assert pairwise[i, j] == pytest.approx(haversine_distance(lat1, lon1, lat2, lon2))
+    
+    one_to_many = haversine_one_to_many(points_a[0], points_b)
+    assert one_to_many.shape == (30,)
+    np.testing.assert_allclose(one_to_many, pairwise[0])
+    
+    elementwise = haversine_elementwise(points_a, points_b[:20])
+    assert elementwise.shape == (20,)
+    np.testing.assert_allclose(elementwise, np.diag(pairwise[:, :20]))
+    
+    # Zero distance
+    assert haversine_elementwise(points_a, points_a).tolist() == [0.0] * 20
+
+# Test batch bearing calculations against the scalar version
+def test_bearing_batch_matches_scalar():
+    rng = random.Random(43)
+    points_a = random_points(rng, 10)
+    points_b = random_points(rng, 15)
+    
+    pairwise = bearing_pairwise(points_a, points_b)
+    assert pairwise.shape == (10, 15)
+    for i, (lon1, lat1) in enumerate(points_a):
+        for j, (lon2, lat2) in enumerate(points_b):
+            assert pairwise[i, j] == pytest.approx(bearing_between_points(lat1, lon1, lat2, lon2))
+    
+    np.testing.assert_allclose(bearing_one_to_many(points_a[3], points_b), pairwise[3])
+    np.testing.assert_allclose(bearing_elementwise(points_a, points_b[:10]), np.diag(pairwise[:, :10]))
+
+# Test batch destination calculation against the scalar version
+def test_destination_points_matches_scalar():
+    rng = random.Random(44)
+    origins = random_points(rng, 25)
+    bearings = np.array([rng.uniform(0, 360) for _ in range(25)])
+    distances = np.array([rng.uniform(0, 500) for _ in range(25)])
+    
+    destinations = destination_points(origins, bearings, distances)
+    assert destinations.shape == (25, 2)
+    for (lon, lat), bearing, distance, (dest_lon, dest_lat) in zip(origins, bearings, distances, destinations):
+        expected_lat, expected_lon = destination_point(lat, lon, bearing, distance)
+        assert dest_lat == pytest.approx(expected_lat)
+        assert dest_lon == pytest.approx(expected_lon)
+    
+    # A single origin broadcasts against many bearings
+    fan = destination_points(origins[0], [0, 90, 180, 270], 100)
+    assert fan.shape == (4, 2)
+    np.testing.assert_allclose(haversine_one_to_many(origins[0], fan), 100)
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from app.services.geofence_queue import GeofenceQueue
+
+class RecordingEvaluator:
+    """Records evaluations and holds them until released"""
+    def __init__(self):
+        self.calls = []
+        self.release = asyncio.Event()
+    
+    async def __call__(self, kind, entity_id, db):
+        self.calls.append((kind, entity_id))
+        await self.release.wait()
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+# Test latest-wins coalescing
+def test_bursts_are_coalesced():
+    async def run():
+        evaluator = RecordingEvaluator()
+        queue = GeofenceQueue(evaluator, workers=1, max_staleness=60)
+        await queue.start(db=None)
+        
+        # The first event starts running, the rest collapse into one re-run
+        await queue.submit("train", "12301", None)
+        await settle()
+        for _ in range(5):
+            await queue.submit("train", "12301", None)
+        
+        evaluator.release.set()
+        await settle()
+        await queue.stop()
+        return evaluator.calls, queue.stats()
+    
+    calls, stats = asyncio.run(run())
+    
+    assert calls == [("train", "12301"), ("train", "12301")]
+    assert stats["coalesced"] == 5
+    assert stats["evaluated"] == 2
+
+def test_pending_events_coalesce_per_entity():
+    async def run():
+        evaluator = RecordingEvaluator()
+        queue = GeofenceQueue(evaluator, workers=1, max_staleness=60)
+        await queue.start(db=None)
+        
+        # Keep the worker busy so the next events stay pending
+        await queue.submit("train", "BUSY", None)
+        await settle()
+        for entity in ["12301", "OBJ001", "12301", "OBJ001", "12301"]:
+            kind = "object" if entity.startswith("OBJ") else "train"
+            await queue.submit(kind, entity, None)
+        
+        evaluator.release.set()
+        await settle()
+        await queue.stop()
+        return evaluator.calls
+    
+    calls = asyncio.run(run())
+    
+    assert calls == [("train", "BUSY"), ("train", "12301"), ("object", "OBJ001")]
+
+# Test the staleness bound
+def test_stale_backlog_evaluates_inline():
+    async def run():
+        evaluator = RecordingEvaluator()
+        evaluator.release.set()
+        queue = GeofenceQueue(evaluator, workers=1, max_staleness=0)
+        await queue.start(db=None)
+        
+        # Pretend an event has been waiting too long
+        queue._pending[("train", "OLD")] = 0
+        await queue.submit("train", "12301", None)
+        
+        await queue.stop()
+        return evaluator.calls, queue.stats()
+    
+    calls, stats = asyncio.run(run())
+    
+    assert calls == [("train", "12301")]
+    assert stats["inline"] == 1
+
+def test_no_workers_evaluates_inline():
+    async def run():
+        evaluator = RecordingEvaluator()
+        evaluator.release.set()
+        queue = GeofenceQueue(evaluator, workers=0)
+        await queue.start(db=None)
+        await queue.submit("object", "OBJ001", None)
+        return evaluator.calls
+    
+    assert asyncio.run(run()) == [("object", "OBJ001")]
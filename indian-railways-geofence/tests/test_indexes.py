@@ -0,0 +1,52 @@
+import pytest
+from app.db.indexes import INDEXES, HOT_QUERIES, _has_collection_scan
+
+# Test query plan inspection
+def test_detects_nested_collection_scan():
+    plan = {
+        "stage": "SORT",
+        "inputStage": {
+            "stage": "OR",
+            "inputStages": [
+                {"stage": "IXSCAN", "indexName": "timestamp_1"},
+                {"stage": "COLLSCAN"}
+            ]
+        }
+    }
+    
+    assert _has_collection_scan(plan)
+    assert not _has_collection_scan({"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}})
+    assert not _has_collection_scan(None)
+
+def test_hot_queries_target_indexed_collections():
+    for name, collection, _, _ in HOT_QUERIES:
+        assert collection in INDEXES, name
+
+def test_open_alert_indexes_are_partial():
+    alert_indexes = {model.document["name"]: model.document for model in INDEXES["alerts"] if "name" in model.document}
+    
+    for name in ["open_station_alerts", "open_theft_alerts", "open_alerts"]:
+        assert alert_indexes[name]["partialFilterExpression"] == {"resolved": False}
+
+# Test changing the resolved alert TTL on an existing database
+def test_ensure_indexes_applies_changed_ttl(monkeypatch, db):
+    import asyncio
+    from pymongo import IndexModel, ASCENDING
+    from app.db import indexes
+    
+    def resolved_alerts(**ttl):
+        return IndexModel([("resolvedAt", ASCENDING)], name="resolved_alerts", partialFilterExpression={"resolved": True}, **ttl)
+    
+    async def ttl_after(*models):
+        monkeypatch.setitem(indexes.INDEXES, "alerts", list(models))
+        await indexes.ensure_indexes(db)
+        return (await db.alerts.index_information())["resolved_alerts"].get("expireAfterSeconds")
+    
+    async def scenario():
+        return [
+            await ttl_after(resolved_alerts(expireAfterSeconds=86400)),
+            await ttl_after(resolved_alerts(expireAfterSeconds=7 * 86400)),
+            await ttl_after(resolved_alerts())
+        ]
+    
+    assert asyncio.run(scenario()) == [86400, 7 * 86400, None]
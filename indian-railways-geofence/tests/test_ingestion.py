@@ -0,0 +1,150 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from app.models import LocationFix
+from app.services.ingestion import _latest_fixes, _outcomes
+
+def fix(id, minute, lon=77.0, lat=28.0):
+    return LocationFix(id=id, timestamp=datetime(2023, 5, 8, 10, minute), lon=lon, lat=lat)
+
+# Test that only the newest fix per ID is applied
+def test_latest_fix_wins():
+    fixes = [fix("12301", 5), fix("12002", 1), fix("12301", 7), fix("12301", 6)]
+    
+    latest = _latest_fixes(fixes)
+    
+    assert latest == {"12301": 2, "12002": 1}
+
+def test_outcomes_in_input_order():
+    fixes = [fix("12301", 5), fix("99999", 1), fix("12301", 7)]
+    
+    results = _outcomes(fixes, _latest_fixes(fixes), {"12301"})
+    
+    assert [result["status"] for result in results] == ["superseded", "not_found", "updated"]
+    assert [result["id"] for result in results] == ["12301", "99999", "12301"]
+
+# Test telemetry message parsing
+def test_parse_telemetry_message():
+    from app.routes.telemetry import _parse_message
+    
+    kind, seq, parsed = _parse_message({
+        "kind": "object", "seq": 3, "id": "OBJ001",
+        "timestamp": "2023-05-08T10:30:00", "lon": 77.1, "lat": 28.5
+    })
+    
+    assert kind == "object"
+    assert seq == 3
+    assert parsed.id == "OBJ001"
+    
+    with pytest.raises(ValueError):
+        _parse_message({"kind": "bus", "id": "1", "timestamp": "2023-05-08T10:30:00", "lon": 0, "lat": 0})
+    
+    with pytest.raises(ValueError):
+        _parse_message({"kind": "train", "id": "12301"})
+
+# Test the telemetry stream end to end
+def test_telemetry_stream_survives_binary_frame(db):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.db.connection import get_database
+    
+    asyncio.run(db.trains.insert_one({"number": "12301", "name": "Rajdhani", "location": {"type": "Point", "coordinates": [77.0, 28.0]}}))
+    app.dependency_overrides[get_database] = lambda: db
+    try:
+        with TestClient(app).websocket_connect("/telemetry/ws") as websocket:
+            websocket.send_json({"kind": "train", "seq": 1, "id": "12301", "timestamp": "2023-05-08T10:30:00", "lon": 77.1, "lat": 28.5})
+            reply = websocket.receive_json()
+            
+            # Binary frames end the stream instead of leaving it waiting
+            websocket.send_bytes(b"\x00\x01")
+    finally:
+        app.dependency_overrides.clear()
+    
+    assert reply == {"type": "ack", "results": [{"seq": 1, "kind": "train", "id": "12301", "status": "updated"}]}
+    assert asyncio.run(db.trains.find_one({"number": "12301"}))["location"]["coordinates"] == [77.1, 28.5]
+
+# Test ingesting a batch
+def test_ingest_train_fixes_keeps_newer_positions(monkeypatch, db):
+    from app.services import ingestion
+    
+    async def no_alerts(db, trains):
+        return []
+    
+    monkeypatch.setattr(ingestion, "check_stations_for_trains", no_alerts)
+    
+    async def scenario():
+        await db.trains.insert_many([
+            {"number": "A", "location": {"type": "Point", "coordinates": [77.0, 28.0]}, "fixedAt": datetime(2023, 5, 8, 10, 10)},
+            {"number": "B", "location": {"type": "Point", "coordinates": [72.8, 19.0]}}
+        ])
+        await db.objects.insert_one({"id": "BAG", "trainNumber": "B", "location": None})
+        
+        first, _ = await ingestion.ingest_train_fixes(db, [
+            fix("A", 5, lon=70.0), fix("B", 20, lon=73.0), fix("B", 15, lon=72.9), fix("C", 1)
+        ])
+        # A delayed batch replayed after a newer one
+        replayed, _ = await ingestion.ingest_train_fixes(db, [fix("B", 15, lon=72.9)])
+        
+        trains = await db.trains.find({}, {"_id": 0}).sort("number", 1).to_list(None)
+        return first, replayed, trains, await db.objects.find_one({"id": "BAG"})
+    
+    first, replayed, (a, b), bag = asyncio.run(scenario())
+    
+    assert [result["status"] for result in first] == ["stale", "updated", "superseded", "not_found"]
+    assert [result["status"] for result in replayed] == ["stale"]
+    assert a["location"]["coordinates"] == [77.0, 28.0] and a["fixedAt"] == datetime(2023, 5, 8, 10, 10)
+    assert b["location"]["coordinates"] == [73.0, 28.0] and b["fixedAt"] == datetime(2023, 5, 8, 10, 20)
+    assert bag["location"]["coordinates"] == [73.0, 28.0]
+
+def test_batch_mixing_aware_and_naive_timestamps(monkeypatch, db):
+    from app.services import ingestion
+    
+    async def no_alerts(db, trains):
+        return []
+    
+    monkeypatch.setattr(ingestion, "check_stations_for_trains", no_alerts)
+    asyncio.run(db.trains.insert_one({"number": "A", "location": {"type": "Point", "coordinates": [77.0, 28.0]}}))
+    
+    fixes = [
+        LocationFix(id="A", timestamp="2023-05-08T10:00:00Z", lon=70.0, lat=28.0),
+        LocationFix(id="A", timestamp="2023-05-08T15:00:00+05:30", lon=71.0, lat=28.0),
+        LocationFix(id="A", timestamp="2023-05-08T09:45:00", lon=72.0, lat=28.0)
+    ]
+    results, _ = asyncio.run(ingestion.ingest_train_fixes(db, fixes))
+    train = asyncio.run(db.trains.find_one({"number": "A"}))
+    
+    # 15:00 in India is 09:30 UTC, the oldest of the three
+    assert [result["status"] for result in results] == ["updated", "superseded", "superseded"]
+    assert train["location"]["coordinates"] == [70.0, 28.0] and train["fixedAt"] == datetime(2023, 5, 8, 10)
+
+def test_telemetry_stream_reports_failed_batches_and_stays_open(monkeypatch, db):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.db.connection import get_database
+    from app.routes import telemetry
+    
+    calls = []
+    ingest = telemetry.ingest_train_fixes
+    
+    async def fail_once(db, fixes):
+        calls.append(fixes)
+        if len(calls) == 1:
+            raise ConnectionError("primary stepped down")
+        return await ingest(db, fixes)
+    
+    monkeypatch.setattr(telemetry, "ingest_train_fixes", fail_once)
+    asyncio.run(db.trains.insert_one({"number": "12301", "name": "Rajdhani", "location": {"type": "Point", "coordinates": [77.0, 28.0]}}))
+    app.dependency_overrides[get_database] = lambda: db
+    message = {"kind": "train", "seq": 7, "id": "12301", "timestamp": "2023-05-08T10:30:00", "lon": 77.1, "lat": 28.5}
+    try:
+        with TestClient(app).websocket_connect("/telemetry/ws") as websocket:
+            websocket.send_json(message)
+            error = websocket.receive_json()
+            websocket.send_json(message)
+            ack = websocket.receive_json()
+    finally:
+        app.dependency_overrides.clear()
+    
+    assert error["type"] == "error" and error["kind"] == "train" and error["seqs"] == [7]
+    assert ack == {"type": "ack", "results": [{"seq": 7, "kind": "train", "id": "12301", "status": "updated"}]}
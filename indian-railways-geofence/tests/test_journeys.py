@@ -0,0 +1,148 @@
+import pytest
+import asyncio
+from app.services import simulation
+from app.services.journeys import JourneyScheduler
+from app.utils.distance import haversine_distance
+
+def make_train(number, coordinates):
+    return {"number": number, "name": f"Train {number}", "location": {"type": "Point", "coordinates": coordinates}}
+
+def make_station(code, coordinates):
+    return {"code": code, "name": f"Station {code}", "location": {"type": "Point", "coordinates": coordinates}}
+
+def add_trains(db, *trains):
+    asyncio.run(db.trains.insert_many(list(trains)))
+    return trains
+
+def stored_train(db, number):
+    return asyncio.run(db.trains.find_one({"number": number}))
+
+@pytest.fixture(autouse=True)
+def no_proximity_checks(monkeypatch):
+    async def fake_check(db, trains):
+        return []
+    monkeypatch.setattr(simulation, "check_stations_for_trains", fake_check)
+
+# Test that concurrent journeys are stepped together in one tick
+def test_due_journeys_share_one_tick(db, spy):
+    a, b = add_trains(db, make_train("A", [77.0, 28.0]), make_train("B", [72.8, 19.0]))
+    writes = spy(db.trains, "bulk_write")
+    
+    async def run():
+        scheduler = JourneyScheduler()
+        first = await scheduler.start_journey(db, a, make_station("X", [77.0, 29.0]), 60, 60)
+        await scheduler.start_journey(db, b, make_station("Y", [73.8, 19.0]), 60, 60)
+        
+        now = asyncio.get_running_loop().time()
+        assert await scheduler.tick(db, now) == 0
+        assert await scheduler.tick(db, now + 60) == 2
+        return scheduler, first
+    
+    scheduler, first = asyncio.run(run())
+    
+    assert len(writes) == 1 and len(writes[0][0]) == 2
+    assert scheduler.stats()["steps"] == 2
+    
+    # One minute of an hour-long journey
+    train = stored_train(db, "A")
+    lon, lat = train["location"]["coordinates"]
+    assert haversine_distance(28.0, 77.0, lat, lon) == pytest.approx(first["distanceKm"] / 60, rel=1e-6)
+    assert lon == pytest.approx(77.0)
+    assert train["direction"] == pytest.approx(90)
+    assert train["speed"] == pytest.approx(first["speedKmh"])
+    assert first["steps"] == 1 and first["remainingKm"] == pytest.approx(first["distanceKm"] * 59 / 60)
+
+# Test that a journey ends exactly at its destination
+def test_journey_completes_at_destination(db):
+    train, = add_trains(db, make_train("A", [77.0, 28.0]))
+    
+    async def run():
+        scheduler = JourneyScheduler()
+        journey = await scheduler.start_journey(db, train, make_station("X", [77.1, 28.1]), 2, 60)
+        
+        now = asyncio.get_running_loop().time()
+        for minute in range(1, 4):
+            await scheduler.tick(db, now + minute * 60)
+        return journey
+    
+    journey = asyncio.run(run())
+    
+    assert journey["status"] == "completed"
+    assert journey["steps"] == 2
+    assert stored_train(db, "A")["location"]["coordinates"] == pytest.approx([77.1, 28.1])
+    assert stored_train(db, "A")["speed"] == 0
+
+# Test that a failed write leaves the journey where it was
+def test_failed_write_does_not_advance_journey(db, spy):
+    train, = add_trains(db, make_train("A", [77.0, 28.0]))
+    
+    async def fail_first_write(*args):
+        if len(writes) == 1:
+            raise ConnectionError("primary stepped down")
+    
+    writes = spy(db.trains, "bulk_write", before=fail_first_write)
+    
+    async def run():
+        scheduler = JourneyScheduler()
+        journey = await scheduler.start_journey(db, train, make_station("X", [77.0, 29.0]), 60, 60)
+        now = asyncio.get_running_loop().time()
+        
+        with pytest.raises(ConnectionError):
+            await scheduler.tick(db, now + 60)
+        failed = (journey["steps"], journey["remainingKm"])
+        
+        # Still due, so the next tick retries the step
+        assert await scheduler.tick(db, now + 61) == 1
+        return journey, failed
+    
+    journey, failed = asyncio.run(run())
+    
+    lon, lat = stored_train(db, "A")["location"]["coordinates"]
+    assert failed == (0, journey["distanceKm"])
+    assert journey["steps"] == 1 and journey["status"] == "running"
+    assert haversine_distance(28.0, 77.0, lat, lon) == pytest.approx(journey["distanceKm"] / 60, rel=1e-6)
+
+# Test pausing, resuming and cancelling
+def test_pause_resume_and_cancel(db):
+    train, = add_trains(db, make_train("A", [77.0, 28.0]))
+    
+    async def run():
+        scheduler = JourneyScheduler()
+        journey = await scheduler.start_journey(db, train, make_station("X", [77.0, 29.0]), 60, 60)
+        now = asyncio.get_running_loop().time()
+        
+        assert scheduler.pause(journey["id"]) is journey
+        assert scheduler.pause(journey["id"]) is None
+        assert await scheduler.tick(db, now + 600) == 0
+        
+        # Resuming waits a full interval before the next step
+        assert scheduler.resume(journey["id"]) is journey
+        resumed = asyncio.get_running_loop().time()
+        assert await scheduler.tick(db, resumed + 30) == 0
+        assert await scheduler.tick(db, resumed + 60) == 1
+        
+        assert scheduler.cancel(journey["id"]) is journey
+        assert scheduler.cancel(journey["id"]) is None
+        assert await scheduler.tick(db, now + 6000) == 0
+        return scheduler, journey
+    
+    scheduler, journey = asyncio.run(run())
+    
+    assert journey["status"] == "cancelled"
+    assert scheduler.list("cancelled") == [journey]
+    assert scheduler.list("running") == []
+
+# Test that a new journey for a train replaces its active one
+def test_new_journey_cancels_previous_for_same_train(db):
+    train, = add_trains(db, make_train("A", [77.0, 28.0]))
+    
+    async def run():
+        scheduler = JourneyScheduler()
+        first = await scheduler.start_journey(db, train, make_station("X", [77.0, 29.0]))
+        second = await scheduler.start_journey(db, train, make_station("Y", [78.0, 28.0]))
+        return scheduler, first, second
+    
+    scheduler, first, second = asyncio.run(run())
+    
+    assert first["status"] == "cancelled"
+    assert scheduler.list("running") == [second]
@@ -0,0 +1,195 @@
+import pytest
+import asyncio
+from datetime import datetime, timedelta
+from pymongo import UpdateOne, UpdateMany, InsertOne, DeleteOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+from app.db.memory import MemoryClient
+from app.db.indexes import INDEXES, HOT_QUERIES, ensure_indexes, report_collection_scans
+from app.services.alert_rollups import rebuild_rollups, get_rollup_stats
+from app.utils.pagination import find_page
+
+async def make_db():
+    db = MemoryClient()["test"]
+    await ensure_indexes(db)
+    return db
+
+def make_train(number, coordinates, **fields):
+    return {"number": number, "name": f"Train {number}", "location": {"type": "Point", "coordinates": coordinates}, **fields}
+
+# Test inserting, finding with operators, sorting and projecting
+def test_find_with_operators_sort_and_projection():
+    async def run():
+        db = await make_db()
+        await db.trains.insert_many([
+            make_train("1", [77.0, 28.0], speed=60),
+            make_train("2", [72.8, 19.0], speed=90),
+            make_train("3", [80.2, 13.0], speed=120)
+        ])
+
+        fast = await db.trains.find({"speed": {"$gte": 90}}, {"_id": 0, "number": 1}).sort("speed", -1).to_list(None)
+        some = await db.trains.find({"$or": [{"number": "1"}, {"number": {"$in": ["3"]}}]}).to_list(None)
+        regex = await db.trains.count_documents({"number": {"$regex": "^[12]$"}})
+        missing = await db.trains.find_one({"number": "1", "delay": None}, {"location.coordinates": 1})
+        return fast, some, regex, missing
+
+    fast, some, regex, missing = asyncio.run(run())
+
+    assert fast == [{"number": "3"}, {"number": "2"}]
+    assert [train["number"] for train in some] == ["1", "3"]
+    assert regex == 2
+    assert set(missing) == {"_id", "location"} and missing["location"] == {"coordinates": [77.0, 28.0]}
+
+# Test the update operators and upserts
+def test_update_operators_and_upsert():
+    async def run():
+        db = await make_db()
+        await db.trains.insert_one(make_train("1", [77.0, 28.0], speed=60))
+
+        result = await db.trains.update_one({"number": "1"}, {"$set": {"location.coordinates": [78.0, 29.0]}, "$inc": {"speed": 5}})
+        missing = await db.trains.update_one({"number": "9"}, {"$set": {"speed": 1}})
+
+        key = {"kind": "train", "entityId": "1", "start": datetime(2024, 1, 1)}
+        for minute in (5, 1):
+            await db.position_history.update_one(key, {
+                "$push": {"segments": minute},
+                "$inc": {"count": 1},
+                "$min": {"first": datetime(2024, 1, 1, 0, minute)},
+                "$max": {"last": datetime(2024, 1, 1, 0, minute)},
+                "$setOnInsert": {"created": minute}
+            }, upsert=True)
+
+        return result, missing, await db.trains.find_one({"number": "1"}), await db.position_history.find_one(key)
+
+    result, missing, train, bucket = asyncio.run(run())
+
+    assert (result.matched_count, result.modified_count) == (1, 1)
+    assert missing.matched_count == 0
+    assert train["location"]["coordinates"] == [78.0, 29.0] and train["speed"] == 65
+    assert bucket["segments"] == [5, 1] and bucket["count"] == 2 and bucket["created"] == 5
+    assert bucket["first"] == datetime(2024, 1, 1, 0, 1) and bucket["last"] == datetime(2024, 1, 1, 0, 5)
+
+# Test that unique indexes reject duplicates
+def test_unique_indexes():
+    async def run():
+        db = await make_db()
+        await db.trains.insert_one(make_train("1", [77.0, 28.0]))
+        second = await db.trains.insert_one(make_train("2", [77.0, 28.0]))
+
+        with pytest.raises(DuplicateKeyError):
+            await db.trains.insert_one(make_train("1", [70.0, 20.0]))
+        with pytest.raises(DuplicateKeyError):
+            await db.trains.update_one({"_id": second.inserted_id}, {"$set": {"number": "1"}})
+        with pytest.raises(BulkWriteError):
+            await db.trains.insert_many([make_train("3", [70.0, 20.0]), make_train("1", [70.0, 20.0])], ordered=False)
+
+        return await db.trains.find({}, {"_id": 0, "number": 1}).sort("number", 1).to_list(None)
+
+    assert asyncio.run(run()) == [{"number": "1"}, {"number": "2"}, {"number": "3"}]
+
+# Test $nearSphere against the 2dsphere grid
+def test_near_sphere_query():
+    async def run():
+        db = await make_db()
+        await db.stations.insert_many([
+            {"code": "FAR", "name": "Far", "location": {"type": "Point", "coordinates": [77.3, 28.6]}},
+            {"code": "NEAR", "name": "Near", "location": {"type": "Point", "coordinates": [77.21, 28.6]}},
+            {"code": "OTHER", "name": "Other", "location": {"type": "Point", "coordinates": [72.8, 19.0]}}
+        ])
+        return await db.stations.find({"location": {"$nearSphere": {
+            "$geometry": {"type": "Point", "coordinates": [77.2, 28.6]},
+            "$maxDistance": 20000
+        }}}).to_list(None)
+
+    assert [station["code"] for station in asyncio.run(run())] == ["NEAR", "FAR"]
+
+# Test bulk writes and find_one_and_update
+def test_bulk_write_and_find_one_and_update():
+    async def run():
+        db = await make_db()
+        await db.objects.insert_many([
+            {"id": "A", "trainNumber": "1", "location": None},
+            {"id": "B", "trainNumber": "1", "location": None}
+        ])
+        location = {"type": "Point", "coordinates": [77.0, 28.0]}
+        result = await db.objects.bulk_write([
+            UpdateMany({"trainNumber": "1"}, {"$set": {"location": location}}),
+            InsertOne({"id": "C", "trainNumber": "2"}),
+            DeleteOne({"id": "B"}),
+            UpdateOne({"id": "D"}, {"$set": {"trainNumber": "3"}}, upsert=True)
+        ], ordered=False)
+
+        before = await db.objects.find_one_and_update({"id": "A"}, {"$set": {"trainNumber": "2"}})
+        after = await db.objects.find_one_and_update(
+            {"id": "C"}, {"$set": {"trainNumber": "4"}}, return_document=ReturnDocument.AFTER
+        )
+        remaining = await db.objects.find({}, {"_id": 0, "id": 1, "trainNumber": 1}).to_list(None)
+        return result, before, after, remaining
+
+    result, before, after, remaining = asyncio.run(run())
+
+    assert (result.matched_count, result.inserted_count, result.deleted_count, result.upserted_count) == (2, 1, 1, 1)
+    assert before["trainNumber"] == "1" and before["location"]["coordinates"] == [77.0, 28.0]
+    assert after["trainNumber"] == "4"
+    assert remaining == [
+        {"id": "A", "trainNumber": "2"}, {"id": "C", "trainNumber": "4"}, {"id": "D", "trainNumber": "3"}
+    ]
+
+# Test that the rollup pipelines run unchanged
+def test_rollup_aggregations():
+    async def run():
+        db = await make_db()
+        now = datetime(2024, 1, 1, 10, 30)
+        await db.alerts.insert_many([
+            {"type": "theft", "trainNumber": "1", "trainName": "One", "objectId": "A", "resolved": False, "timestamp": now},
+            {"type": "theft", "trainNumber": "1", "trainName": "One", "objectId": "B", "resolved": True, "timestamp": now},
+            {"type": "station_proximity", "trainNumber": "2", "trainName": "Two", "stationCode": "NDLS",
+             "resolved": False, "timestamp": now + timedelta(hours=1)}
+        ])
+        buckets = await rebuild_rollups(db)
+        return buckets, await get_rollup_stats(db, now - timedelta(days=1))
+
+    buckets, stats = asyncio.run(run())
+
+    assert buckets == 3
+    assert sorted((row["_id"], row["count"]) for row in stats["by_type"]) == [("station_proximity", 1), ("theft", 2)]
+    assert sorted((row["_id"], row["count"]) for row in stats["by_status"]) == [(False, 2), (True, 1)]
+    assert [(row["_id"], row["trainName"], row["alertCount"]) for row in stats["by_train"]] == [("1", "One", 2), ("2", "Two", 1)]
+
+# Test keyset pagination over (timestamp, _id)
+def test_keyset_pages():
+    async def run():
+        db = await make_db()
+        start = datetime(2024, 1, 1)
+        await db.alerts.insert_many([
+            {"type": "theft", "resolved": False, "timestamp": start + timedelta(minutes=i // 2)} for i in range(7)
+        ])
+
+        pages, cursor = [], None
+        while True:
+            docs, cursor = await find_page(db.alerts, {}, [("timestamp", -1), ("_id", -1)], 3, cursor)
+            pages.append(docs)
+            if not cursor:
+                return pages
+
+    pages = asyncio.run(run())
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    keys = [(doc["timestamp"], doc["_id"]) for page in pages for doc in page]
+    assert keys == sorted(keys, reverse=True) and len(set(keys)) == 7
+
+# Test that every hot query is planned on an index
+def test_hot_queries_use_indexes():
+    db = asyncio.run(make_db())
+
+    assert set(INDEXES) <= set(db._collections)
+    assert asyncio.run(report_collection_scans(db)) == []
+    assert asyncio.run(db.trains.find({"speed": 1}).explain())["queryPlanner"]["winningPlan"]["stage"] == "COLLSCAN"
+    assert len(HOT_QUERIES) > 0
+
+# Test backend selection
+def test_unknown_backend_is_rejected(monkeypatch):
+    from app.db import connection
+    monkeypatch.setattr(connection, "DB_BACKEND", "mongo")
+    
+    with pytest.raises(ValueError, match="DB_BACKEND"):
+        asyncio.run(connection.connect_to_mongo())
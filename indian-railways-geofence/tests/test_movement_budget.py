@@ -0,0 +1,71 @@
+import random
+
+import pytest
+from app.services.movement_budget import MovementBudget
+from app.services.station_index import StationIndex
+from app.utils.distance import destination_point
+
+# Test skipping while the train stays inside its budget
+def test_skip_within_slack():
+    budget = MovementBudget()
+    budget.count_evaluation()
+    budget.record("12301", [77.0, 28.0], 2.0, 1)
+    
+    lat, lon = destination_point(28.0, 77.0, 45, 1.5)
+    assert budget.can_skip("12301", [lon, lat], 1)
+    
+    lat, lon = destination_point(28.0, 77.0, 45, 2.5)
+    assert not budget.can_skip("12301", [lon, lat], 1)
+    
+    assert budget.stats()["skipped"] == 1
+    assert budget.stats()["evaluated"] == 1
+
+def test_no_skip_without_budget():
+    budget = MovementBudget()
+    assert not budget.can_skip("12301", [77.0, 28.0], 1)
+    
+    # Zero slack means the train is sitting on a fence boundary
+    budget.record("12301", [77.0, 28.0], 0.0, 1)
+    assert not budget.can_skip("12301", [77.0, 28.0], 1)
+
+def test_fence_change_invalidates():
+    budget = MovementBudget()
+    budget.record("12301", [77.0, 28.0], 2.0, 1)
+    
+    assert not budget.can_skip("12301", [77.0, 28.0], 2)
+    
+    budget.record("12301", [77.0, 28.0], 2.0, 2)
+    budget.invalidate("12301")
+    assert not budget.can_skip("12301", [77.0, 28.0], 2)
+
+# Test that skipping never hides an entry or exit
+def test_skipping_is_exact():
+    rng = random.Random(11)
+    radius = 1.0
+    horizon = 5.0
+    index = StationIndex(cell_size=0.05)
+    for i in range(200):
+        index.upsert({
+            "name": f"Station {i}",
+            "code": f"S{i}",
+            "location": {"type": "Point", "coordinates": [rng.uniform(77.0, 77.5), rng.uniform(28.0, 28.5)]}
+        })
+    
+    budget = MovementBudget()
+    lat, lon = 28.25, 77.25
+    last_inside = None
+    
+    for _ in range(2000):
+        lat, lon = destination_point(lat, lon, rng.uniform(0, 360), rng.uniform(0.0, 0.3))
+        inside = {station["code"] for station, _ in index.query_radius(lon, lat, radius)}
+        
+        if budget.can_skip("T", [lon, lat], index.version):
+            assert inside == last_inside
+            continue
+        
+        candidates = index.query_radius(lon, lat, radius + horizon)
+        slack = min([horizon] + [abs(distance - radius) for _, distance in candidates])
+        budget.record("T", [lon, lat], slack, index.version)
+        last_inside = inside
+    
+    assert budget.stats()["skipped"] > 0
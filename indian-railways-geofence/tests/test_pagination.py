@@ -0,0 +1,68 @@
+import pytest
+import asyncio
+import json
+from datetime import datetime
+from bson.objectid import ObjectId
+from fastapi import HTTPException
+from app.utils.pagination import encode_cursor, decode_cursor, _keyset_filter, parse_fields, projected_response, ndjson_response
+
+# Test continuation tokens
+def test_cursor_round_trip():
+    values = [datetime(2024, 1, 2, 3, 4, 5), ObjectId()]
+    
+    assert decode_cursor(encode_cursor(values)) == values
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor("not a cursor")
+    
+    assert exc.value.status_code == 400
+
+# Test keyset filters
+def test_keyset_filter_for_descending_compound_key():
+    timestamp = datetime(2024, 1, 1)
+    alert_id = ObjectId()
+    
+    query = _keyset_filter([("timestamp", -1), ("_id", -1)], [timestamp, alert_id])
+    
+    assert query == {"$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$lt": alert_id}}
+    ]}
+
+def test_keyset_filter_rejects_mismatched_cursor():
+    with pytest.raises(HTTPException):
+        _keyset_filter([("number", 1)], ["12301", "extra"])
+
+@pytest.mark.parametrize("value", [{"$gt": ""}, ["12301"], True])
+def test_keyset_filter_rejects_non_scalar_values(value):
+    cursor = encode_cursor([value])
+    
+    with pytest.raises(HTTPException) as exc:
+        _keyset_filter([("number", 1)], decode_cursor(cursor))
+    
+    assert exc.value.status_code == 400
+
+# Test projections
+def test_projected_response_keeps_requested_fields():
+    alert_id = ObjectId()
+    docs = [{"_id": alert_id, "type": "theft", "trainNumber": "12301", "timestamp": datetime(2024, 1, 1)}]
+    
+    response = projected_response(docs, parse_fields("id, type"), "token", expose_id=True)
+    
+    assert json.loads(response.body) == [{"id": str(alert_id), "type": "theft"}]
+    assert response.headers["X-Next-Cursor"] == "token"
+
+# Test NDJSON streaming
+def test_ndjson_response_streams_one_document_per_line(db):
+    docs = [{"id": f"OBJ{i:03d}", "name": f"Bag {i}"} for i in (2, 0, 1)]
+    asyncio.run(db.objects.insert_many(docs))
+    response = ndjson_response(db.objects, {}, [("id", 1)])
+    
+    async def collect():
+        return "".join([chunk async for chunk in response.body_iterator])
+    
+    lines = asyncio.run(collect()).splitlines()
+    
+    assert response.media_type == "application/x-ndjson"
+    assert [json.loads(line) for line in lines] == [{"id": f"OBJ{i:03d}", "name": f"Bag {i}"} for i in range(3)]
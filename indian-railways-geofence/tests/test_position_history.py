@@ -0,0 +1,217 @@
+import pytest
+import asyncio
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from app.services.position_history import (
+    PositionHistory, bucket_start, encode_segment, decode_segment, bucket_operations, bucket_fixes,
+    build_levels, pick_level
+)
+from app.utils.distance import destination_point
+from app.utils.trajectory import segment_distances
+
+def make_fixes(start, count, step_seconds=5):
+    return [
+        (start + timedelta(seconds=i * step_seconds), 77.2090 + i * 0.000123, 28.6139 - i * 0.0000456)
+        for i in range(count)
+    ]
+
+# Test delta encoding
+def test_segment_round_trip_to_micro_degrees():
+    fixes = make_fixes(datetime(2024, 1, 1, 10), 50)
+    
+    decoded = decode_segment(encode_segment(fixes))
+    
+    assert [fix[0] for fix in decoded] == [fix[0] for fix in fixes]
+    for (_, lon, lat), (_, decoded_lon, decoded_lat) in zip(fixes, decoded):
+        assert decoded_lon == pytest.approx(lon, abs=1e-6)
+        assert decoded_lat == pytest.approx(lat, abs=1e-6)
+
+def test_segment_stores_small_integer_deltas():
+    segment = encode_segment(make_fixes(datetime(2024, 1, 1, 10), 3))
+    
+    assert segment["dx"] == [0, 123, 123]
+    assert segment["dy"] == [0, -46, -45]
+    assert segment["dt"] == [0, 5000, 10000]
+
+# Test bucketing
+def test_bucket_start_truncates_to_window():
+    assert bucket_start(datetime(2024, 1, 1, 10, 59, 59), 3600) == datetime(2024, 1, 1, 10)
+    assert bucket_start(datetime(2024, 1, 1, 10, 7, 30), 600) == datetime(2024, 1, 1, 10)
+
+def test_fixes_spanning_windows_become_one_segment_per_window(db):
+    fixes = make_fixes(datetime(2024, 1, 1, 10, 59, 50), 4)
+    
+    async def scenario():
+        await db.position_history.bulk_write(bucket_operations({("train", "12301"): fixes}, 3600))
+        return await db.position_history.find({}).sort("start", 1).to_list(None)
+    
+    buckets = asyncio.run(scenario())
+    
+    assert [bucket["start"] for bucket in buckets] == [datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11)]
+    assert [(bucket["count"], len(bucket["segments"])) for bucket in buckets] == [(2, 1), (2, 1)]
+    assert [bucket["entityId"] for bucket in buckets] == ["12301", "12301"]
+
+# Test buffering
+def test_record_buffers_until_flush(db, spy):
+    writes = spy(db.position_history, "bulk_write")
+    
+    async def scenario():
+        history = PositionHistory(flush_interval=3600)
+        await history.start(db)
+        
+        history.record("train", "12301", [77.2, 28.6], datetime(2024, 1, 1, 10, tzinfo=timezone.utc))
+        history.record("train", "12301", [77.3, 28.6], datetime(2024, 1, 1, 10, 0, 5))
+        buffered = history.stats()["buffered"]
+        
+        await history.stop()
+        return buffered, history.stats(), await db.position_history.find({}).to_list(None)
+    
+    buffered, stats, buckets = asyncio.run(scenario())
+    
+    assert buffered == 2
+    assert stats["flushed"] == 2
+    assert len(writes) == 1
+    assert len(buckets) == 1 and buckets[0]["count"] == 2
+    assert [fix[1] for fix in bucket_fixes(buckets[0])] == [77.2, 77.3]
+
+def test_failed_flush_keeps_fixes_for_the_next_one(db, spy):
+    async def fail_once(operations, ordered=True):
+        if len(writes) == 1:
+            raise ConnectionError("primary stepped down")
+    
+    writes = spy(db.position_history, "bulk_write", before=fail_once)
+    
+    async def scenario():
+        history = PositionHistory(flush_interval=3600)
+        await history.start(db)
+        history.record("train", "12301", [77.2, 28.6], datetime(2024, 1, 1, 10))
+        
+        with pytest.raises(ConnectionError):
+            await history.flush()
+        history.record("train", "12301", [77.3, 28.6], datetime(2024, 1, 1, 10, 0, 5))
+        track = await history.get_track(db, "train", "12301", datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11))
+        
+        await history.stop()
+        return history.stats(), track, await db.position_history.find({}).to_list(None)
+    
+    stats, track, buckets = asyncio.run(scenario())
+    
+    assert [fix[1] for fix in track] == [77.2, 77.3]
+    assert stats["flushed"] == 2 and stats["buffered"] == 0
+    assert [fix[1] for fix in bucket_fixes(buckets[0])] == [77.2, 77.3]
+
+def test_fixes_being_flushed_are_still_read(db, spy):
+    writing, release = asyncio.Event(), asyncio.Event()
+    
+    async def hold(operations, ordered=True):
+        writing.set()
+        await release.wait()
+    
+    spy(db.position_history, "bulk_write", before=hold)
+    
+    async def scenario():
+        history = PositionHistory(flush_interval=3600)
+        await history.start(db)
+        history.record("train", "12301", [77.2, 28.6], datetime(2024, 1, 1, 10, 0, 0, 123456))
+        
+        flush = asyncio.create_task(history.flush())
+        await writing.wait()
+        during = await history.get_track(db, "train", "12301", datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11))
+        release.set()
+        await flush
+        after = await history.get_track(db, "train", "12301", datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11))
+        
+        await history.stop()
+        return during, after
+    
+    during, after = asyncio.run(scenario())
+    
+    assert during == after == [(datetime(2024, 1, 1, 10, 0, 0, 123000), 77.2, 28.6)]
+
+def test_record_is_ignored_when_not_started():
+    history = PositionHistory()
+    history.record("train", "12301", [77.2, 28.6])
+    
+    assert history.stats()["recorded"] == 0
+
+# Test precomputed levels
+def test_pick_level_uses_coarsest_level_within_tolerance():
+    fixes = make_fixes(datetime(2024, 1, 1, 10), 20)
+    levels = build_levels(fixes, [10, 50, 250])
+    
+    assert pick_level(levels, 0.1)[0] == 50
+    assert pick_level(levels, 0.005) == (0, None)
+
+def test_straight_bucket_levels_keep_only_endpoints():
+    fixes = make_fixes(datetime(2024, 1, 1, 10), 20)
+    
+    levels = build_levels(fixes, [10])
+    
+    assert len(decode_segment(levels["10"])) == 2
+
+# Test reading compacted buckets
+def detour_fixes(start, minutes):
+    """Fixes heading east at 1 km a minute with a 2 km detour north between minutes 20 and 40"""
+    fixes = []
+    for half_minutes in range(minutes * 2 + 1):
+        minute = half_minutes / 2
+        lat, lon = destination_point(28.6, 77.2, 90, minute)
+        lat, lon = destination_point(lat, lon, 0, max(0.0, 2 - abs(minute - 30) / 5))
+        fixes.append((start + timedelta(minutes=minute), lon, lat))
+    return fixes
+
+def max_error(fixes, track):
+    points = np.array([[lon, lat] for _, lon, lat in fixes])
+    distances = [segment_distances([a[1], a[2]], [b[1], b[2]], points) for a, b in zip(track, track[1:])]
+    return np.min(distances, axis=0).max()
+
+def test_range_edge_inside_compacted_bucket_stays_within_tolerance(db):
+    start = datetime(2024, 1, 1, 10)
+    fixes = detour_fixes(start, 90)
+    
+    async def scenario():
+        history = PositionHistory(bucket_seconds=3600)
+        await db.position_history.bulk_write(bucket_operations({("train", "12301"): fixes}, 3600))
+        compacted = await history.compact(db, now=datetime(2024, 1, 1, 11, 30))
+        
+        # From halfway up the detour into the next, uncompacted bucket
+        track = await history.get_track(db, "train", "12301", start + timedelta(minutes=25), start + timedelta(minutes=90), 0.3)
+        whole = await history.get_track(db, "train", "12301", start, start + timedelta(minutes=90), 0.3)
+        return compacted, track, whole
+    
+    compacted, track, whole = asyncio.run(scenario())
+    
+    assert compacted == 1
+    assert track[0][0] == start + timedelta(minutes=25)
+    assert max_error([fix for fix in fixes if fix[0] >= track[0][0]], track) <= 0.3
+    assert max_error(fixes, whole) <= 0.3
+
+def test_compact_processes_bounded_batches(db):
+    fixes = make_fixes(datetime(2024, 1, 1, 10), 3)
+    
+    async def scenario():
+        history = PositionHistory(bucket_seconds=3600)
+        await db.position_history.bulk_write(bucket_operations({("train", "A"): fixes, ("train", "B"): fixes}, 3600))
+        runs = [await history.compact(db, now=datetime(2024, 1, 1, 12), batch=1) for _ in range(3)]
+        return runs, await db.position_history.count_documents({"compacted": True})
+    
+    assert asyncio.run(scenario()) == ([1, 1, 0], 2)
+
+def test_compact_merges_flushed_segments(db):
+    import bson
+    fixes = make_fixes(datetime(2024, 1, 1, 10), 60)
+    
+    async def scenario():
+        history = PositionHistory(bucket_seconds=3600)
+        # One segment per flush, as a busy tracker would leave it
+        for fix in fixes:
+            await db.position_history.bulk_write(bucket_operations({("train", "A"): [fix]}, 3600))
+        before = await db.position_history.find_one({})
+        await history.compact(db, now=datetime(2024, 1, 1, 12))
+        return before, await db.position_history.find_one({})
+    
+    before, after = asyncio.run(scenario())
+    
+    assert len(before["segments"]) == 60 and len(after["segments"]) == 1
+    assert len(bson.encode({"s": after["segments"]})) < len(bson.encode({"s": before["segments"]})) / 3
+    assert bucket_fixes(after) == bucket_fixes(before)
@@ -0,0 +1,78 @@
+import pytest
+import asyncio
+from app.services.reference_cache import ReferenceCache
+
+TRAIN = {"number": "12301", "name": "Rajdhani Express", "coaches": [{"id": "A1", "geofenceRadius": 0.05}, {"id": "B1"}]}
+
+def insert(collection, docs):
+    asyncio.run(collection.insert_many([dict(doc) for doc in docs]))
+
+# Test read-through caching
+def test_train_is_read_once_with_coaches_indexed_by_id(db, spy):
+    insert(db.trains, [TRAIN])
+    reads = spy(db.trains, "find_one")
+    cache = ReferenceCache()
+    
+    first = asyncio.run(cache.get_train(db, "12301"))
+    second = asyncio.run(cache.get_train(db, "12301"))
+    
+    assert first is second
+    assert first["coaches"]["A1"]["geofenceRadius"] == 0.05
+    assert len(reads) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_missing_train_is_not_cached(db, spy):
+    reads = spy(db.trains, "find_one")
+    cache = ReferenceCache()
+    
+    assert asyncio.run(cache.get_train(db, "99999")) is None
+    assert asyncio.run(cache.get_train(db, "99999")) is None
+    assert len(reads) == 2
+
+def test_invalidation_forces_a_new_read(db):
+    insert(db.stations, [{"code": "NDLS", "name": "New Delhi"}])
+    cache = ReferenceCache()
+    
+    asyncio.run(cache.get_station(db, "NDLS"))
+    asyncio.run(db.stations.update_one({"code": "NDLS"}, {"$set": {"name": "New Delhi Junction"}}))
+    cache.invalidate_station("NDLS")
+    
+    assert asyncio.run(cache.get_station(db, "NDLS"))["name"] == "New Delhi Junction"
+
+def test_read_racing_a_write_is_not_stored(db, spy):
+    insert(db.trains, [TRAIN])
+    cache = ReferenceCache()
+    
+    # A write lands while the first read is waiting for the database
+    async def write_during_first_read(*args):
+        if len(reads) == 1:
+            cache.invalidate_train("12301")
+    
+    reads = spy(db.trains, "find_one", before=write_during_first_read)
+    asyncio.run(cache.get_train(db, "12301"))
+    asyncio.run(cache.get_train(db, "12301"))
+    
+    assert len(reads) == 2
+
+def test_versions_do_not_outlive_reads(db):
+    insert(db.trains, [TRAIN])
+    cache = ReferenceCache()
+    
+    for number in range(1000):
+        cache.invalidate_train(str(number))
+    asyncio.run(cache.get_train(db, "12301"))
+    
+    assert cache._versions == {}
+
+def test_least_recently_used_entry_is_evicted(db, spy):
+    insert(db.stations, [{"code": code, "name": code} for code in ["NDLS", "BCT", "MAS"]])
+    reads = spy(db.stations, "find_one")
+    cache = ReferenceCache(maxsize=2)
+    
+    for code in ["NDLS", "BCT", "NDLS", "MAS"]:
+        asyncio.run(cache.get_station(db, code))
+    asyncio.run(cache.get_station(db, "NDLS"))
+    
+    assert cache.stats()["evictions"] == 1
+    assert len(reads) == 3
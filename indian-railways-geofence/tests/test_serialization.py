@@ -0,0 +1,44 @@
+import pytest
+import json
+from datetime import datetime
+from bson.objectid import ObjectId
+from fastapi.encoders import jsonable_encoder
+from app.models import Alert, User
+from app.utils.serialization import DocumentEncoder, FastJSONResponse
+
+def _model_json(model, doc):
+    """Encode a document the way the response_model path does"""
+    item = model(id=str(doc["_id"]), **{k: v for k, v in doc.items() if k != "_id"})
+    return jsonable_encoder(item)
+
+# Test the fast path matches the validated response
+def test_alert_encoding_matches_response_model():
+    doc = {
+        "_id": ObjectId(),
+        "type": "station_proximity",
+        "trainNumber": "12301",
+        "trainName": "Rajdhani Express",
+        "stationCode": "NDLS",
+        "stationName": "New Delhi Railway Station",
+        "distance": 0.85,
+        "timestamp": datetime(2024, 5, 8, 10, 30, 0, 125000),
+        "resolved": False,
+        "internalField": "not in the model"
+    }
+    
+    body = FastJSONResponse(DocumentEncoder(Alert).encode_many([doc])).body
+    
+    assert json.loads(body) == [_model_json(Alert, doc)]
+
+def test_user_encoding_fills_model_defaults():
+    doc = {"_id": ObjectId(), "name": "Rahul Sharma", "phone": "+919876543210", "email": "rahul@example.com"}
+    
+    item = DocumentEncoder(User).encode(doc)
+    
+    assert item == _model_json(User, doc)
+    assert item["registeredObjects"] == []
+
+def test_nested_object_ids_are_encoded():
+    owner_id = ObjectId()
+    
+    assert json.loads(FastJSONResponse({"owner": {"id": owner_id}}).body) == {"owner": {"id": str(owner_id)}}
@@ -0,0 +1,62 @@
+import pytest
+import asyncio
+from app.services import simulation
+from app.utils.distance import haversine_distance, bearing_between_points
+
+def make_train(number, direction, speed=60):
+    return {
+        "number": number,
+        "name": f"Train {number}",
+        "location": {"type": "Point", "coordinates": [77.2, 28.6]},
+        "speed": speed,
+        "direction": direction
+    }
+
+def coordinates(db, number):
+    async def find():
+        return await db.trains.find_one({"number": number})
+    return asyncio.run(find())["location"]["coordinates"]
+
+# Test the vectorized tick
+def test_tick_moves_fleet_with_one_bulk_write_per_collection(monkeypatch, db, spy):
+    checked = []
+    
+    async def fake_check(db, trains):
+        checked.extend(train["location"]["coordinates"] for train in trains)
+        return []
+    
+    monkeypatch.setattr(simulation, "check_stations_for_trains", fake_check)
+    asyncio.run(db.trains.insert_many([make_train("EAST", 0), make_train("NORTH", 90), make_train("STOPPED", 45, speed=0)]))
+    asyncio.run(db.objects.insert_one({"id": "BAG", "trainNumber": "EAST", "location": None}))
+    train_writes = spy(db.trains, "bulk_write")
+    object_writes = spy(db.objects, "bulk_write")
+    
+    result = asyncio.run(simulation.simulate_train_movement(db, interval_seconds=60))
+    
+    assert result["updated_trains"] == 3
+    assert result["ticks_per_second"] > 0
+    assert len(train_writes) == 1 and len(object_writes) == 1
+    assert len(checked) == 3
+    
+    east, north, stopped = [coordinates(db, number) for number in ("EAST", "NORTH", "STOPPED")]
+    bag = asyncio.run(db.objects.find_one({"id": "BAG"}))
+    assert bag["location"]["coordinates"] == east
+    assert haversine_distance(28.6, 77.2, east[1], east[0]) == pytest.approx(1.0, rel=1e-6)
+    assert bearing_between_points(28.6, 77.2, east[1], east[0]) == pytest.approx(90, abs=0.01)
+    assert bearing_between_points(28.6, 77.2, north[1], north[0]) == pytest.approx(0, abs=0.01)
+    assert stopped == pytest.approx([77.2, 28.6])
+
+def test_tick_with_fixed_distance_for_one_train(monkeypatch, db):
+    async def fake_check(db, trains):
+        return [{"trainNumber": train["number"]} for train in trains]
+    
+    monkeypatch.setattr(simulation, "check_stations_for_trains", fake_check)
+    asyncio.run(db.trains.insert_many([make_train("12301", 0), make_train("12951", 0)]))
+    
+    result = asyncio.run(simulation.simulate_train_movement(db, train_number="12301", distance_km=2.5))
+    
+    moved = coordinates(db, "12301")
+    assert result["updated_trains"] == 1
+    assert result["alerts_opened"] == 1
+    assert haversine_distance(28.6, 77.2, moved[1], moved[0]) == pytest.approx(2.5, rel=1e-6)
+    assert coordinates(db, "12951") == [77.2, 28.6]
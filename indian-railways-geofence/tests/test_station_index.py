@@ -0,0 +1,77 @@
+import random
+
+import pytest
+from app.services.station_index import StationIndex
+from app.utils.distance import haversine_distance
+
+def make_station(code, lon, lat):
+    return {
+        "name": f"Station {code}",
+        "code": code,
+        "location": {"type": "Point", "coordinates": [lon, lat]}
+    }
+
+# Test radius queries against a brute-force scan
+def test_query_radius_matches_linear_scan():
+    rng = random.Random(7)
+    index = StationIndex(cell_size=0.1)
+    stations = [
+        make_station(f"S{i}", rng.uniform(68.0, 97.0), rng.uniform(8.0, 37.0))
+        for i in range(2000)
+    ]
+    for station in stations:
+        index.upsert(station)
+    
+    for _ in range(50):
+        lon, lat = rng.uniform(68.0, 97.0), rng.uniform(8.0, 37.0)
+        radius = rng.choice([1.0, 10.0, 50.0])
+        
+        expected = {
+            s["code"] for s in stations
+            if haversine_distance(lat, lon, s["location"]["coordinates"][1], s["location"]["coordinates"][0]) <= radius
+        }
+        found = index.query_radius(lon, lat, radius)
+        
+        assert {station["code"] for station, _ in found} == expected
+        
+        # Results are sorted by distance
+        distances = [distance for _, distance in found]
+        assert distances == sorted(distances)
+
+def test_query_radius_distance():
+    index = StationIndex()
+    index.upsert(make_station("NDLS", 77.2207, 28.6425))
+    
+    found = index.query_radius(77.2207, 28.6500, 1.0)
+    
+    assert len(found) == 1
+    station, distance = found[0]
+    assert station["code"] == "NDLS"
+    assert distance == pytest.approx(haversine_distance(28.6500, 77.2207, 28.6425, 77.2207))
+
+# Test incremental updates
+def test_upsert_moves_station():
+    index = StationIndex()
+    index.upsert(make_station("NDLS", 77.2207, 28.6425))
+    index.upsert(make_station("NDLS", 72.8213, 18.9712))
+    
+    assert len(index) == 1
+    assert index.query_radius(77.2207, 28.6425, 1.0) == []
+    assert len(index.query_radius(72.8213, 18.9712, 1.0)) == 1
+
+def test_remove_station():
+    index = StationIndex()
+    index.upsert(make_station("NDLS", 77.2207, 28.6425))
+    index.remove("NDLS")
+    index.remove("MISSING")
+    
+    assert len(index) == 0
+    assert index.query_radius(77.2207, 28.6425, 1.0) == []
+
+def test_query_across_antimeridian():
+    index = StationIndex(cell_size=1.0)
+    index.upsert(make_station("EAST", 179.995, 0.0))
+    
+    found = index.query_radius(-179.995, 0.0, 2.0)
+    
+    assert [station["code"] for station, _ in found] == ["EAST"]
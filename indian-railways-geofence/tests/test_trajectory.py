@@ -0,0 +1,50 @@
+import pytest
+import numpy as np
+from datetime import datetime, timedelta
+from app.utils.distance import destination_point
+from app.utils.trajectory import segment_distances, douglas_peucker, simplify_track, zoom_tolerance
+
+# Test point to segment distances
+def test_segment_distance_is_cross_track_inside_the_segment():
+    start, end = [77.0, 28.0], [77.1, 28.0]
+    lat, lon = destination_point(28.0, 77.05, 0, 0.5)
+    
+    distances = segment_distances(start, end, np.array([[lon, lat]]))
+    
+    assert distances[0] == pytest.approx(0.5, abs=0.002)  # the great circle bulges ~1 m north
+
+def test_segment_distance_is_measured_to_the_nearest_end_outside():
+    start, end = [77.0, 28.0], [77.1, 28.0]
+    lat, lon = destination_point(28.0, 77.1, 90, 2.0)
+    
+    distances = segment_distances(start, end, np.array([[lon, lat], [76.9, 28.0]]))
+    
+    assert distances[0] == pytest.approx(2.0, rel=1e-3)
+    assert distances[1] == pytest.approx(segment_distances(start, start, np.array([[76.9, 28.0]]))[0])
+
+# Test Douglas-Peucker
+def test_straight_line_collapses_to_its_endpoints():
+    coordinates = [[77.0 + i * 0.001, 28.0] for i in range(100)]
+    
+    assert douglas_peucker(coordinates, 0.01) == [0, 99]
+
+def test_simplified_track_stays_within_tolerance():
+    rng = np.random.default_rng(7)
+    start = datetime(2024, 1, 1)
+    coordinates = np.cumsum(rng.normal(0, 0.0005, size=(500, 2)), axis=0) + [77.2, 28.6]
+    fixes = [(start + timedelta(seconds=5 * i), lon, lat) for i, (lon, lat) in enumerate(coordinates)]
+    tolerance = 0.05
+    
+    simplified = simplify_track(fixes, tolerance)
+    kept = douglas_peucker(coordinates, tolerance)
+    
+    assert len(simplified) < len(fixes) / 2
+    assert simplified[0] == fixes[0] and simplified[-1] == fixes[-1]
+    for first, last in zip(kept, kept[1:]):
+        if last - first > 1:
+            between = coordinates[first + 1:last]
+            assert segment_distances(coordinates[first], coordinates[last], between).max() <= tolerance
+
+def test_zoom_tolerance_halves_per_zoom_level():
+    assert zoom_tolerance(10, 0) == pytest.approx(0.152874, rel=1e-4)
+    assert zoom_tolerance(11, 28.6) == pytest.approx(zoom_tolerance(10, 28.6) / 2)